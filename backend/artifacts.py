@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import glob
+import gzip
+import re
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+try:
+    import brotli  # 可选依赖：未安装时只提供 gzip 版本
+except ImportError:
+    brotli = None
+
+# 值得预压缩的产物（PLY 中的浮点数据通常也能压缩 10%~30%）
+_COMPRESSIBLE_SUFFIXES = {".ply", ".json", ".txt", ".log", ""}
+# 压缩后至少要比原文件小这么多才会使用
+_MIN_RATIO = 0.95
+_SUFFIX = {"br": ".br", "gzip": ".gz"}
+# point_cloud/iteration_N/ 下的产物写入后不再变化，配合 URL 中的版本号可长期缓存
+_IMMUTABLE_RE = re.compile(r"^point_cloud/iteration_\d+/")
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 {编码: q 值}。"""
+    result: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        m = re.search(r"q\s*=\s*([0-9.]+)", params)
+        if m:
+            try:
+                q = float(m.group(1))
+            except ValueError:
+                q = 0.0
+        result[token] = q
+    return result
+
+
+class ArtifactStore:
+    """
+    为 viewer 提供输出产物（PLY、cameras.json 等）的服务层。
+    每个产物版本（大小 + mtime）只压缩一次，gzip / brotli 变体保存在 cache_dir 下，
+    压缩在后台线程中进行；压缩完成前请求按原始内容返回。
+    """
+
+    def __init__(self, output_dir: Path, cache_dir: Path):
+        self.output_dir = output_dir
+        self.cache_dir = cache_dir
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-compress")
+        self._pending: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def encodings(self) -> Tuple[str, ...]:
+        return ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def resolve(self, job_id: str, rel: str) -> Optional[Path]:
+        """返回产物路径；不存在或越出该任务输出目录时返回 None。"""
+        job_dir = (self.output_dir / job_id).resolve()
+        if job_dir.parent != self.output_dir.resolve():
+            return None
+        path = (job_dir / rel).resolve()
+        if job_dir not in path.parents or not path.is_file():
+            return None
+        return path
+
+    @staticmethod
+    def version(path: Path) -> str:
+        st = path.stat()
+        return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+    def url(self, job_id: str, rel: str) -> Optional[str]:
+        """带版本号的产物 URL（内容变化后 URL 随之变化，因此可以长期缓存）。"""
+        path = self.resolve(job_id, rel)
+        if path is None:
+            return None
+        return f"/artifacts/{job_id}/{rel}?v={self.version(path)}"
+
+    @staticmethod
+    def is_immutable(rel: str) -> bool:
+        return bool(_IMMUTABLE_RE.match(rel))
+
+    def select(self, job_id: str, rel: str, path: Path, accept_encoding: Optional[str]) -> Tuple[Path, Optional[str]]:
+        """按 Accept-Encoding 选择要发送的表示，返回 (文件, Content-Encoding)；缺少变体时安排后台压缩。"""
+        if path.suffix.lower() not in _COMPRESSIBLE_SUFFIXES:
+            return path, None
+        accepted = parse_accept_encoding(accept_encoding)
+        version = self.version(path)
+        missing = False
+        for enc in sorted(self.encodings, key=lambda e: -accepted.get(e, accepted.get("*", 0.0))):
+            if accepted.get(enc, accepted.get("*", 0.0)) <= 0:
+                continue
+            variant = self._variant_path(job_id, rel, version, enc)
+            if variant.exists():
+                return variant, enc
+            if not self._skip_marker(job_id, rel, version, enc).exists():
+                missing = True
+        if missing:
+            self.schedule(job_id, rel)
+        return path, None
+
+    def schedule(self, job_id: str, rel: str) -> None:
+        """在后台为产物生成所有缺少的压缩变体（重复调用只会执行一次）。"""
+        key = (job_id, rel)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._compress, job_id, rel)
+
+    def remove_job(self, job_id: str) -> None:
+        shutil.rmtree(self.cache_dir / job_id, ignore_errors=True)
+
+    # --- 内部实现 ---
+    def _variant_path(self, job_id: str, rel: str, version: str, enc: str) -> Path:
+        return self.cache_dir / job_id / f"{rel}.{version}{_SUFFIX[enc]}"
+
+    def _skip_marker(self, job_id: str, rel: str, version: str, enc: str) -> Path:
+        # 压缩收益不足时留下标记，之后不再尝试
+        return self.cache_dir / job_id / f"{rel}.{version}{_SUFFIX[enc]}.skip"
+
+    def _compress(self, job_id: str, rel: str) -> None:
+        try:
+            path = self.resolve(job_id, rel)
+            if path is None:
+                return
+            version = self.version(path)
+            size = path.stat().st_size
+            for enc in self.encodings:
+                target = self._variant_path(job_id, rel, version, enc)
+                skip = self._skip_marker(job_id, rel, version, enc)
+                if target.exists() or skip.exists():
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                # 清理该产物旧版本的变体
+                for old in target.parent.glob(f"{glob.escape(Path(rel).name)}.*{_SUFFIX[enc]}*"):
+                    old.unlink()
+                tmp = target.with_name(f".{uuid.uuid4().hex}.tmp")
+                self._write_variant(path, tmp, enc)
+                if tmp.stat().st_size < size * _MIN_RATIO:
+                    tmp.replace(target)
+                else:
+                    tmp.unlink()
+                    skip.touch()
+        except Exception as e:
+            print(f"[artifacts] compressing {job_id}/{rel} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard((job_id, rel))
+
+    @staticmethod
+    def _write_variant(src: Path, dst: Path, enc: str) -> None:
+        with src.open("rb") as r, dst.open("wb") as w:
+            if enc == "gzip":
+                # mtime=0 使同样的输入得到逐字节相同的输出
+                with gzip.GzipFile(fileobj=w, mode="wb", compresslevel=6, mtime=0) as gz:
+                    shutil.copyfileobj(r, gz, 1024 * 1024)
+            else:
+                compressor = brotli.Compressor(quality=5)
+                for chunk in iter(lambda: r.read(1024 * 1024), b""):
+                    w.write(compressor.process(chunk))
+                w.write(compressor.finish())
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Tuple
+
+if TYPE_CHECKING:
+    from fastapi import UploadFile
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+# 未完成的分块上传保留的时间（秒），超过后在 gc() 中清理；
+# 入库（或被再次上传）不足这一时间的 blob 也不会被 gc() 删除，即使还没有链接到任何任务目录
+PARTIAL_TTL = 7 * 24 * 3600
+
+
+class ChunkOffsetError(Exception):
+    """分块的起始偏移与服务端已接收的字节数不一致（客户端应从 received 处续传）。"""
+
+    def __init__(self, received: int):
+        super().__init__(f"expected offset {received}")
+        self.received = received
+
+
+def is_sha256(value: str) -> bool:
+    return bool(_SHA256_RE.match(value or ""))
+
+
+class BlobStore:
+    """
+    按 SHA-256 内容寻址的上传文件存储（默认 data/blobs）。
+    - 同样的文件只保存一份，任务输入目录中的文件是指向 blob 的硬链接（跨文件系统时退化为复制）；
+    - 分块上传写入 partial/<sha>.part，按已接收字节数续传，完整后校验哈希再入库；
+    - gc() 删除已没有任何任务引用（硬链接数为 1）且入库超过 PARTIAL_TTL 的 blob；
+      入库到 link() 之间（如分块上传完成到 finalize、并发上传）的 blob 因此不会被误删。
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._partial = root / "partial"
+        self._tmp = root / "tmp"
+        self._partial.mkdir(parents=True, exist_ok=True)
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    # --- 查询 ---
+    def path(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha
+
+    def has(self, sha: str) -> bool:
+        return is_sha256(sha) and self.path(sha).is_file()
+
+    def received(self, sha: str, size: int) -> int:
+        """已接收的字节数（blob 已存在时为完整大小）。"""
+        if self.has(sha):
+            return size
+        try:
+            return self._partial_path(sha).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def touch(self, sha: str) -> None:
+        """重新计时一个已存在的 blob（即将被 link() 引用时调用），使 gc() 在 PARTIAL_TTL 内不会删除它。"""
+        try:
+            os.utime(self.path(sha))
+        except FileNotFoundError:
+            pass
+
+    # --- 写入 ---
+    async def put_upload(self, f: UploadFile) -> Tuple[str, int]:
+        """边读边计算哈希地保存一个上传文件，返回 (sha256, 大小)。"""
+        h = hashlib.sha256()
+        size = 0
+        tmp = self._tmp / uuid.uuid4().hex
+        with tmp.open("wb") as w:
+            while True:
+                chunk = await f.read(1024 * 1024)
+                if not chunk:
+                    break
+                h.update(chunk)
+                size += len(chunk)
+                w.write(chunk)
+        await f.close()
+        sha = h.hexdigest()
+        self._commit(tmp, sha)
+        return sha, size
+
+    def write_chunk(self, sha: str, size: int, offset: int, data: bytes) -> int:
+        """
+        追加一个分块，返回已接收的字节数。offset 必须等于当前已接收字节数，否则抛出 ChunkOffsetError；
+        接收完整后校验哈希，不一致时丢弃已接收的数据并抛出 ValueError。
+        """
+        if not is_sha256(sha):
+            raise ValueError("invalid sha256")
+        with self._lock_for(sha):
+            if self.has(sha):
+                return size
+            part = self._partial_path(sha)
+            current = part.stat().st_size if part.exists() else 0
+            if offset != current:
+                raise ChunkOffsetError(current)
+            if current + len(data) > size:
+                raise ValueError("chunk exceeds declared file size")
+            with part.open("ab") as w:
+                w.write(data)
+            current += len(data)
+            if current == size:
+                if self._hash_file(part) != sha:
+                    part.unlink()
+                    raise ValueError("sha256 mismatch, upload discarded")
+                self._commit(part, sha)
+            return current
+
+    def link(self, sha: str, dest: Path) -> Path:
+        """把 blob 放到 dest（硬链接，失败时复制）。"""
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.exists():
+            dest.unlink()
+        try:
+            os.link(self.path(sha), dest)
+        except OSError:
+            shutil.copyfile(self.path(sha), dest)
+        return dest
+
+    def gc(self) -> int:
+        """删除不再被任何任务目录引用的 blob 以及过期的未完成上传，返回删除的文件数。"""
+        removed = 0
+        now = time.time()
+        for sub in self.root.iterdir():
+            if sub in (self._partial, self._tmp) or not sub.is_dir():
+                continue
+            for blob in sub.iterdir():
+                try:
+                    st = blob.stat()
+                    if st.st_nlink <= 1 and now - st.st_mtime > PARTIAL_TTL:
+                        blob.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        for part in list(self._partial.iterdir()) + list(self._tmp.iterdir()):
+            try:
+                if now - part.stat().st_mtime > PARTIAL_TTL:
+                    part.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    # --- 内部实现 ---
+    def _partial_path(self, sha: str) -> Path:
+        return self._partial / f"{sha}.part"
+
+    def _lock_for(self, sha: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(sha, threading.Lock())
+
+    def _commit(self, src: Path, sha: str) -> None:
+        target = self.path(sha)
+        if target.exists():
+            src.unlink()
+            # 重新计时，使 gc() 在调用方 link() 之前不会删除这个（可能暂无引用的）blob
+            self.touch(sha)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # blob 与各任务输入目录中的文件是同一个 inode，设为只读以免被原地修改
+        os.chmod(src, 0o444)
+        os.replace(src, target)
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 已完成项目卡片使用的占位缩略图
+_THUMBNAIL = "https://images.unsplash.com/photo-1621569898825-3e7916518775?w=500&auto=format&fit=crop"
+
+
+class ProjectCatalog:
+    """
+    持久化的项目目录（SQLite），替代每次 /projects 请求都遍历 OUTPUT_DIR 的做法。
+    - 任务状态变化时由任务队列调用 upsert() 更新；
+    - reconcile() 只在 OUTPUT_DIR 自身的 mtime 变化时才列目录，并且只探测新增/消失的条目；
+    - 每次内容变化都会递增 version，用于生成 ETag。
+    """
+
+    def __init__(self, db_path: Path, output_dir: Path):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS projects (
+                job_id TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (name TEXT PRIMARY KEY)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if self._meta("catalog_id") is None:
+            self._set_meta("catalog_id", uuid.uuid4().hex[:12])
+            self._set_meta("version", "0")
+
+    # --- 元数据 ---
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _bump(self) -> None:
+        self._set_meta("version", str(int(self._meta("version") or 0) + 1))
+
+    # --- 写入 ---
+    def upsert(self, record: dict) -> None:
+        """写入/合并一条项目记录（通常来自任务队列的状态变化）。"""
+        job_id = record["job_id"]
+        with self._lock:
+            self._write(job_id, record)
+
+    def remove(self, job_id: str) -> None:
+        with self._lock:
+            cur = self._db.execute("DELETE FROM projects WHERE job_id = ?", (job_id,))
+            if cur.rowcount:
+                self._bump()
+
+    def _write(self, job_id: str, record: dict) -> None:
+        row = self._db.execute("SELECT data FROM projects WHERE job_id = ?", (job_id,)).fetchone()
+        data = json.loads(row[0]) if row else {}
+        merged = {**data, **record}
+        # 排队位置/队列状态是动态值，由 /result 实时计算，不写入目录
+        merged.pop("queue_position", None)
+        merged.pop("queue_state", None)
+        if row and merged == data:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO projects (job_id, stage, data, updated) VALUES (?, ?, ?, ?)",
+            (job_id, str(merged.get("stage", "")), json.dumps(merged), time.time()),
+        )
+        self._bump()
+
+    # --- 与目录树同步 ---
+    def reconcile(self) -> None:
+        """若 OUTPUT_DIR 有条目增删（目录 mtime 改变），只重新探测受影响的任务。"""
+        try:
+            mtime = str(self.output_dir.stat().st_mtime_ns)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._meta("dir_mtime") == mtime:
+                return
+            names = {p.name for p in self.output_dir.iterdir()}
+            known = {r[0] for r in self._db.execute("SELECT name FROM entries")}
+            changed = names ^ known
+            # job 目录 <job_id>/ 与压缩包 <job_id>.zip 都归属同一个任务
+            job_ids = {n[:-4] if n.endswith(".zip") else n for n in changed}
+            for job_id in sorted(job_ids):
+                self._probe(job_id)
+            self._db.executemany("DELETE FROM entries WHERE name = ?", [(n,) for n in known - names])
+            self._db.executemany("INSERT OR IGNORE INTO entries (name) VALUES (?)", [(n,) for n in names - known])
+            self._set_meta("dir_mtime", mtime)
+
+    def _probe(self, job_id: str) -> None:
+        job_dir = self.output_dir / job_id
+        if not job_dir.is_dir():
+            # 输出目录已被删除：项目从目录中移除
+            cur = self._db.execute("DELETE FROM projects WHERE job_id = ?", (job_id,))
+            if cur.rowcount:
+                self._bump()
+            return
+
+        # 检查最终的点云文件是否存在，如果有则表示成功
+        ply_exists = (job_dir / "point_cloud" / "iteration_30000" / "point_cloud.ply").exists()
+        status_data = {}
+        status_file = job_dir / "status.json"
+        if status_file.exists():
+            try:
+                status_data = json.loads(status_file.read_text(encoding="utf-8"))
+            except Exception:
+                pass
+
+        if ply_exists:
+            self._write(job_id, {
+                "job_id": job_id,
+                "scene": status_data.get("scene", job_id),
+                "stage": "Done",
+                "done": True,
+                "zip_url": f"/download/{job_id}",
+                "thumbnail": _THUMBNAIL,
+            })
+        elif status_data.get("exit_code", 0) != 0:
+            self._write(job_id, {
+                "job_id": job_id,
+                "scene": status_data.get("scene", job_id),
+                "stage": "Failed",
+                "done": True,
+                "error": "Training failed",
+            })
+
+    # --- 查询 ---
+    def query(
+        self, stages: Sequence[str] = (), offset: int = 0, limit: Optional[int] = None
+    ) -> Tuple[List[Dict], int, str]:
+        """按 job_id 降序分页查询，返回 (记录列表, 总数, etag)。"""
+        where, args = "", []
+        if stages:
+            where = "WHERE stage COLLATE NOCASE IN (%s)" % ",".join("?" * len(stages))
+            args = list(stages)
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM projects {where}", args).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT data FROM projects {where} ORDER BY job_id DESC LIMIT ? OFFSET ?",
+                args + [-1 if limit is None else int(limit), int(offset)],
+            ).fetchall()
+            version = f"{self._meta('catalog_id')}-{self._meta('version')}"
+        query_key = json.dumps([sorted(s.lower() for s in stages), offset, limit])
+        etag = '"%s-%s"' % (version, hashlib.sha1(query_key.encode("utf-8")).hexdigest()[:8])
+        return [json.loads(r[0]) for r in rows], total, etag
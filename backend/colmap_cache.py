@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# 缓存的 convert.py 输出（相对数据集根目录）
+_CACHED_DIRS = ("images", "sparse/0")
+_META = "meta.json"
+
+
+def _link_tree(src: Path, dst: Path) -> int:
+    """把 src 目录树以硬链接（跨文件系统时复制）的方式放到 dst，返回文件总字节数。"""
+    total = 0
+    for root, _, files in os.walk(src):
+        target_dir = dst / Path(root).relative_to(src)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            s, d = Path(root) / name, target_dir / name
+            try:
+                os.link(s, d)
+            except OSError:
+                shutil.copy2(s, d)
+            total += s.stat().st_size
+    return total
+
+
+class ColmapCache:
+    """
+    按输入图片集指纹缓存 COLMAP 结果（去畸变后的 images/ 与 sparse/0），默认位于 data/colmap_cache。
+    指纹由 input 目录下每个文件的相对路径 + 内容哈希以及 convert.py 的相机模型参数组成；
+    总大小超过 budget_bytes 时按最近使用时间淘汰（LRU）。
+    """
+
+    def __init__(self, root: Path, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        # (st_dev, st_ino, size, mtime_ns) -> sha256，避免重复哈希同一文件（blob 硬链接的 inode 相同）
+        self._hashes: Dict[Tuple[int, int, int, int], str] = {}
+        root.mkdir(parents=True, exist_ok=True)
+
+    def fingerprint(self, images_dir: Path, camera: str) -> Optional[str]:
+        if not images_dir.is_dir():
+            return None
+        h = hashlib.sha256(f"camera={camera}\n".encode("utf-8"))
+        files = sorted(p for p in images_dir.rglob("*") if p.is_file())
+        if not files:
+            return None
+        for p in files:
+            h.update(f"{p.relative_to(images_dir).as_posix()}\0{self._file_hash(p)}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def restore(self, fp: str, dataset_root: Path) -> bool:
+        """若缓存命中，把 images/ 与 sparse/0 放到 dataset_root 下并返回 True。"""
+        entry = self.root / fp
+        with self._lock:
+            meta = self._read_meta(entry)
+            if meta is None:
+                return False
+            meta["last_used"] = time.time()
+            (entry / _META).write_text(json.dumps(meta), encoding="utf-8")
+            for rel in _CACHED_DIRS:
+                target = dataset_root / rel
+                if target.exists():
+                    shutil.rmtree(target)
+                _link_tree(entry / rel, target)
+        return True
+
+    def store(self, fp: str, dataset_root: Path) -> None:
+        """把刚完成的 convert.py 输出放入缓存，然后按磁盘预算淘汰最久未使用的条目。"""
+        if not all((dataset_root / rel).is_dir() for rel in _CACHED_DIRS):
+            return
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        size = sum(_link_tree(dataset_root / rel, tmp / rel) for rel in _CACHED_DIRS)
+        now = time.time()
+        (tmp / _META).write_text(json.dumps({"size": size, "created": now, "last_used": now}), encoding="utf-8")
+        with self._lock:
+            entry = self.root / fp
+            if entry.exists():
+                # 并发的同指纹任务已经写入
+                shutil.rmtree(tmp, ignore_errors=True)
+                return
+            os.replace(tmp, entry)
+            self._evict(keep=fp)
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        for entry in self.root.iterdir():
+            if entry.name.startswith(".tmp-"):
+                continue
+            meta = self._read_meta(entry)
+            if meta is None:
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            entries.append((meta.get("last_used", 0), entry, meta.get("size", 0)))
+        total = sum(e[2] for e in entries)
+        for _, entry, size in sorted(entries, key=lambda e: e[0]):
+            if total <= self.budget_bytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    @staticmethod
+    def _read_meta(entry: Path) -> Optional[dict]:
+        try:
+            return json.loads((entry / _META).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _file_hash(self, path: Path) -> str:
+        st = path.stat()
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        sha = self._hashes.get(key)
+        if sha is None:
+            h = hashlib.sha256()
+            with path.open("rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+            sha = self._hashes[key] = h.hexdigest()
+        return sha
@@ -28,6 +28,31 @@ GS_EDITOR_URL: str = os.getenv("GS_EDITOR_URL", "/gs_editor/dist/index.html")
 #     {py} {gs}/train.py -s {work}/gs_data -m {out}'
 RECON_CMD_TEMPLATE: str | None = os.getenv("GS_RECON_CMD", None)
 
+# 任务调度：同时运行的重建任务数上限，以及持久化任务队列所用的 SQLite 数据库
+MAX_CONCURRENT_JOBS: int = int(os.getenv("MAX_CONCURRENT_JOBS", 1))
+JOB_DB_PATH: Path = Path(os.getenv("JOB_DB_PATH", str(DATA_DIR / "jobs.db")))
+# 项目目录（/projects 的索引），与 OUTPUT_DIR 增量同步
+CATALOG_DB_PATH: Path = Path(os.getenv("CATALOG_DB_PATH", str(DATA_DIR / "catalog.db")))
+
+# 上传文件的内容寻址存储（按 SHA-256 去重）与分块上传会话
+BLOB_DIR: Path = Path(os.getenv("BLOB_DIR", str(DATA_DIR / "blobs")))
+UPLOAD_SESSION_DIR: Path = DATA_DIR / "upload_sessions"
+UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+
+# COLMAP 结果缓存：相同图片集（+ 相机模型）的任务直接复用去畸变后的 images/ 与 sparse/0；
+# COLMAP_CACHE_BYTES 为磁盘预算，超出时按 LRU 淘汰，设为 0 关闭缓存
+COLMAP_CAMERA: str = os.getenv("COLMAP_CAMERA", "OPENCV")
+COLMAP_CACHE_DIR: Path = Path(os.getenv("COLMAP_CACHE_DIR", str(DATA_DIR / "colmap_cache")))
+COLMAP_CACHE_BYTES: int = int(os.getenv("COLMAP_CACHE_BYTES", 20 * 1024 ** 3))
+
+# viewer 产物（PLY / cameras.json）的 gzip / brotli 预压缩变体
+ARTIFACT_CACHE_DIR: Path = Path(os.getenv("ARTIFACT_CACHE_DIR", str(DATA_DIR / "artifact_cache")))
+
+# 训练使用常驻进程（gaussian-splatting/train_worker.py）复用已导入的 torch/CUDA 扩展；设为 0 则每个任务单独启动 train.py
+TRAIN_WORKER: bool = os.getenv("GS_TRAIN_WORKER", "1").lower() not in ("0", "false", "no")
+# 常驻训练进程的查看器（network_gui）端口：第 i 个进程监听 TRAIN_VIEWER_PORT + i
+TRAIN_VIEWER_PORT: int = int(os.getenv("TRAIN_VIEWER_PORT", 6009))
+
 # Server
 HOST: str = os.getenv("HOST", "0.0.0.0")
 PORT: int = int(os.getenv("PORT", 8000))
@@ -36,7 +61,7 @@ PORT: int = int(os.getenv("PORT", 8000))
 ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "*").split(",")]
 
 # Ensure directories
-for d in (UPLOAD_DIR, OUTPUT_DIR, LOG_DIR):
+for d in (UPLOAD_DIR, OUTPUT_DIR, LOG_DIR, UPLOAD_SESSION_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
 
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Dict, Set, Tuple
+
+
+class EventHub:
+    """
+    进程内的轻量通知中心：工作线程在任务状态或日志变化时调用 publish(job_id)，
+    SSE 连接所在的事件循环通过 wait(job_id) 被唤醒，从而无需轮询即可推送增量。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def publish(self, job_id: str) -> None:
+        """线程安全：唤醒所有正在等待该任务的连接。"""
+        with self._lock:
+            waiters = list(self._waiters.get(job_id, ()))
+        for loop, ev in waiters:
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:
+                # 事件循环已关闭，连接会在 finally 中自行注销
+                pass
+
+    async def wait(self, job_id: str, timeout: float) -> bool:
+        """等待该任务的下一次通知；超时返回 False（调用方可借此发送心跳）。"""
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(job_id, set()).add(entry)
+        try:
+            await asyncio.wait_for(entry[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(job_id)
+                if waiters is not None:
+                    waiters.discard(entry)
+                    if not waiters:
+                        del self._waiters[job_id]
+
+
+HUB = EventHub()
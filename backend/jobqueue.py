@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .events import HUB
+
+# 队列中任务的状态
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+
+
+class JobQueue:
+    """
+    持久化的有界任务队列。
+    任务记录保存在 SQLite 中（默认 data/jobs.db），由固定数量的工作线程按
+    优先级（大者优先）+ 提交顺序（FIFO）依次执行。服务重启后，未完成的任务会重新排队。
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        runner: Callable[[str, dict], None],
+        max_workers: int = 1,
+        listener: Optional[Callable[[Dict], None]] = None,
+    ):
+        self.db_path = db_path
+        self.runner = runner
+        # 任务记录每次变化后都会以最新记录调用 listener（例如同步到项目目录）
+        self.listener = listener
+        self.max_workers = max(1, int(max_workers))
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._threads: List[threading.Thread] = []
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 所有数据库访问都在 self._lock 下进行，因此可以在线程间共享同一个连接
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT UNIQUE NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                info TEXT NOT NULL,
+                created REAL NOT NULL
+            )"""
+        )
+
+    # --- 生命周期 ---
+    def start(self) -> None:
+        """恢复上次中断的任务并启动工作线程（重复调用无副作用）。"""
+        with self._lock:
+            if self._threads:
+                return
+            # 上次服务退出时仍在运行的任务：重新放回队列（按原顺序）
+            rows = self._db.execute("SELECT job_id, info FROM jobs WHERE state = ?", (RUNNING,)).fetchall()
+            resumed = [r[0] for r in rows]
+            for job_id, info in rows:
+                data = json.loads(info)
+                data.update({"stage": "queued", "done": False, "resumed": True})
+                self._db.execute(
+                    "UPDATE jobs SET state = ?, info = ? WHERE job_id = ?",
+                    (QUEUED, json.dumps(data), job_id),
+                )
+            for i in range(self.max_workers):
+                th = threading.Thread(target=self._worker, name=f"recon-worker-{i}", daemon=True)
+                th.start()
+                self._threads.append(th)
+            self._cond.notify_all()
+        for job_id in resumed:
+            self._changed(job_id)
+
+    # --- 提交与查询 ---
+    def submit(self, job_id: str, payload: dict, info: dict, priority: int = 0) -> None:
+        """提交一个任务。payload 为执行所需参数，info 为对外展示的任务记录。"""
+        data = dict(info)
+        data.update({"job_id": job_id, "stage": "queued", "done": False})
+        with self._lock:
+            # 同名任务重新提交时，覆盖旧记录并排到队尾
+            self._db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self._db.execute(
+                "INSERT INTO jobs (job_id, priority, state, payload, info, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, int(priority), QUEUED, json.dumps(payload), json.dumps(data), time.time()),
+            )
+            self._cond.notify()
+        self._changed(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """返回任务记录（附带 queue_state / queue_position），不存在时返回 None。"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT seq, priority, state, info FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return self._decorate(*row)
+
+    def jobs(self) -> List[Dict]:
+        """返回队列数据库中记录的全部任务。"""
+        with self._lock:
+            rows = self._db.execute("SELECT seq, priority, state, info FROM jobs ORDER BY seq").fetchall()
+            return [self._decorate(*r) for r in rows]
+
+    def is_active(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row is not None and row[0] in (QUEUED, RUNNING)
+
+    def update(self, job_id: str, **fields) -> None:
+        """合并更新任务记录中的字段（任务已被删除时忽略）。"""
+        with self._lock:
+            row = self._db.execute("SELECT info FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            data = json.loads(row[0])
+            data.update(fields)
+            self._db.execute("UPDATE jobs SET info = ? WHERE job_id = ?", (json.dumps(data), job_id))
+        self._changed(job_id)
+
+    def remove(self, job_id: str) -> None:
+        """删除任务记录。排队中的任务不会再被执行；正在运行的任务无法中断，只是不再被追踪。"""
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    # --- 内部实现 ---
+    def _changed(self, job_id: str) -> None:
+        HUB.publish(job_id)
+        if self.listener is not None:
+            data = self.get(job_id)
+            if data is not None:
+                self.listener(data)
+
+    def _decorate(self, seq: int, priority: int, state: str, info: str) -> Dict:
+        data = json.loads(info)
+        data["queue_state"] = state
+        data["queue_position"] = None
+        if state == QUEUED:
+            # 排在自己前面的任务数 + 1（1 表示下一个执行）
+            ahead = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = ? AND (priority > ? OR (priority = ? AND seq < ?))",
+                (QUEUED, priority, priority, seq),
+            ).fetchone()[0]
+            data["queue_position"] = ahead + 1
+        return data
+
+    def _claim(self) -> Optional[tuple]:
+        row = self._db.execute(
+            "SELECT job_id, payload FROM jobs WHERE state = ? ORDER BY priority DESC, seq ASC LIMIT 1",
+            (QUEUED,),
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE jobs SET state = ? WHERE job_id = ?", (RUNNING, row[0]))
+        return row[0], json.loads(row[1])
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                claimed = self._claim()
+                while claimed is None:
+                    self._cond.wait()
+                    claimed = self._claim()
+            job_id, payload = claimed
+            try:
+                self.runner(job_id, payload)
+            except Exception:
+                traceback.print_exc()
+                self.update(job_id, done=True, stage="Failed", error="internal error", exit_code=-1)
+            finally:
+                with self._lock:
+                    self._db.execute(
+                        "UPDATE jobs SET state = ? WHERE job_id = ? AND state = ?",
+                        (FINISHED, job_id, RUNNING),
+                    )
@@ -1,30 +1,38 @@
 from __future__ import annotations
 
+import os
 import traceback
 import shutil
 from pathlib import Path
 from typing import List, Optional
 import threading
 import json
+import mimetypes
 import time
 import urllib.parse
+import uuid
 import socket
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, APIRouter
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, APIRouter, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 
 from pathlib import Path as _Path
 
 from . import config as C
 from . import reconstruction as R
-from .utils import make_job_id, save_upload_files, zip_dir, extract_zip
+from .artifacts import ArtifactStore
+from .blobstore import BlobStore, ChunkOffsetError, is_sha256
+from .catalog import ProjectCatalog
+from .events import HUB
+from .jobqueue import JobQueue
+from .utils import make_job_id, save_upload_files, extract_zip, parse_range, iter_open_file
+from .zipstream import ZipStream, select_files
 
 app = FastAPI(title="3DGS Online Reconstructor", version="0.1.2")
 
-JOBS: dict[str, dict] = {}
-
 # CORS
 if C.ALLOWED_ORIGINS == ["*"]:
     app.add_middleware(
@@ -66,72 +74,34 @@ def health():
     }
 
 # --- 1. 项目端点 ---
-# 列出所有正在运行和已完成的项目
+# 列出所有排队中、运行中和已完成的项目。
+# 数据来自持久化的项目目录（由任务状态变化维护，并与 OUTPUT_DIR 增量同步），支持：
+#   ?stage=Done,Failed  按阶段过滤；?offset=&limit=  分页（总数见 X-Total-Count）；
+#   If-None-Match       内容未变化时返回 304，轮询几乎零开销。
 @app.get("/projects")
-def list_projects():
-    project_list = []
-    seen_ids = set()
-    
-     # 首先，从内存中的 JOBS 字典中添加所有当前正在运行的作业
-    for job_id, job_data in JOBS.items():
-        project_list.append(job_data)
-        seen_ids.add(job_id)
-
-    # 扫描输出目录以查找不在内存中的已完成作业
-    if C.OUTPUT_DIR.exists():
-        for job_dir in C.OUTPUT_DIR.iterdir():
-            if job_dir.is_dir() and job_dir.name not in seen_ids:
-                job_id = job_dir.name
-                # 检查最终的点云文件是否存在，如果有则表示成功
-                ply_exists = (job_dir / "point_cloud" / "iteration_30000" / "point_cloud.ply").exists()
-                
-                status_file = job_dir / "status.json"
-                status_data = {}
-                if status_file.exists():
-                    try: status_data = json.loads(status_file.read_text(encoding="utf-8"))
-                    except: pass
-
-                if ply_exists:
-                    # 如果成功，创建一个“完成”的项目条目
-                    zip_path = C.OUTPUT_DIR / f"{job_id}.zip"
-                    zip_url = f"/outputs/{job_id}.zip" if zip_path.exists() else None
-                    project_list.append({
-                        "job_id": job_id,
-                        "scene": status_data.get("scene", job_id),
-                        "stage": "Done",
-                        "done": True,
-                        "zip_url": zip_url,
-                        "thumbnail": "https://images.unsplash.com/photo-1621569898825-3e7916518775?w=500&auto=format&fit=crop"
-                    })
-                elif status_data.get("exit_code", 0) != 0:
-                    # 如果状态指示失败，则创建一个“失败”的项目条目
-                     project_list.append({
-                        "job_id": job_id,
-                        "scene": status_data.get("scene", job_id),
-                        "stage": "Failed",
-                        "done": True,
-                        "error": "Training failed"
-                    })
-
-    # 返回按 job_id 降序排序的项目列表
-    return sorted(project_list, key=lambda x: x["job_id"], reverse=True)
+def list_projects(request: Request, stage: Optional[str] = None, offset: int = 0, limit: Optional[int] = None):
+    CATALOG.reconcile()
+    stages = [s.strip() for s in stage.split(",") if s.strip()] if stage else []
+    projects, total, etag = CATALOG.query(stages, offset=max(0, offset), limit=limit)
+    headers = {"ETag": etag, "X-Total-Count": str(total), "Cache-Control": "no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=projects, headers=headers)
 
 
 # --- 2. Viewer 的辅助函数 ---
+# viewer 加载的产物（相对输出目录）
+_VIEWER_PLY = "point_cloud/iteration_30000/point_cloud.ply"
+_VIEWER_CAMERAS = "cameras.json"
+
 #查找生成的点云文件的路径
 def _find_point_cloud(out_dir: Path) -> str | None:
-    target = out_dir / "point_cloud" / "iteration_30000" / "point_cloud.ply"
-    if target.exists():
-        # Returns relative path like "/outputs/truck/..."
-        return f"/outputs/{out_dir.name}/" + str(target.relative_to(out_dir)).replace("\\", "/")
-    return None
+    # Returns versioned path like "/artifacts/truck/point_cloud/...?v=..."
+    return ARTIFACTS.url(out_dir.name, _VIEWER_PLY)
 
 #查找 cameras.json 文件的路径
 def _find_cameras(out_dir: Path) -> str | None:
-    target = out_dir / "cameras.json"
-    if target.exists():
-        return f"/outputs/{out_dir.name}/" + str(target.relative_to(out_dir)).replace("\\", "/")
-    return None
+    return ARTIFACTS.url(out_dir.name, _VIEWER_CAMERAS)
 
 # 为 3D viewer 生成 URL 的端点
 @app.get("/viewer/{job_id}")
@@ -160,28 +130,127 @@ def viewer(job_id: str):
 
     return {"job_id": job_id, "editor_url": full_url}
 
-#获取特定作业的详细结果/状态的端点
-@app.get("/result/{job_id}")
-def result(job_id: str):
-    # 在内存字典中检查作业状态
-    data = JOBS.get(job_id)
+def _read_progress(job_id: str) -> dict | None:
+    """读取 train.py / convert.py 写出的进度文件 progress.json（不存在或正在替换时返回 None）。"""
+    progress_file = C.OUTPUT_DIR / job_id / "progress.json"
+    try:
+        return json.loads(progress_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+# 读取作业状态：优先使用任务队列中的记录（包含排队位置 queue_position），否则回退到磁盘上的 status.json
+def _job_status(job_id: str) -> dict | None:
+    data = QUEUE.get(job_id)
     if not data: # 如果未找到，则检查磁盘上的状态文件
         status_file = C.OUTPUT_DIR / job_id / "status.json"
         if status_file.exists():
             try:
                 disk_status = json.loads(status_file.read_text(encoding="utf-8"))
-                zip_path = (C.OUTPUT_DIR / job_id).parent / f"{job_id}.zip"
-                disk_status["zip_url"] = f"/outputs/{zip_path.name}" if zip_path.exists() else None
+                disk_status["zip_url"] = f"/download/{job_id}" if disk_status.get("stage") == "done" else None
                 disk_status["job_id"] = job_id
+                disk_status["progress_detail"] = _read_progress(job_id)
                 return disk_status
             except: pass
+        return None
+    data["progress_detail"] = _read_progress(job_id)
+    return data
+
+#获取特定作业的详细结果/状态的端点
+@app.get("/result/{job_id}")
+def result(job_id: str):
+    data = _job_status(job_id)
+    if data is None:
         return {"error": "job not found"}
     return data
 
+
+# --- 流式推送：任务状态 + 增量日志（Server-Sent Events） ---
+# 不在队列中的历史任务，其 status.json 进入这些阶段即视为结束
+_FINAL_DISK_STAGES = ("done", "convert_failed", "train_failed")
+_LOG_CHUNK = 256 * 1024
+
+def _read_log_delta(log_file: Path, offset: int) -> tuple[list[str], int, bool]:
+    """从字节偏移 offset 起读取完整的新日志行，返回 (行列表, 新偏移, 是否已读到文件末尾)。"""
+    try:
+        size = log_file.stat().st_size
+    except FileNotFoundError:
+        return [], offset, True
+    if offset > size:
+        # 日志被删除重建（同名任务重新提交），从头开始
+        offset = 0
+    if offset == size:
+        return [], offset, True
+    with log_file.open("rb") as f:
+        f.seek(offset)
+        data = f.read(_LOG_CHUNK)
+    # 只发送到最后一个换行符（含 tqdm 的 \r）为止，保证偏移始终落在行边界上
+    cut = max(data.rfind(b"\n"), data.rfind(b"\r")) + 1
+    if cut == 0:
+        if len(data) < _LOG_CHUNK:
+            return [], offset, True
+        cut = len(data)
+    text = data[:cut].decode("utf-8", errors="replace")
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    new_offset = offset + cut
+    return lines, new_offset, new_offset >= size
+
+def _sse(event: str, data: str, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    body = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"{head}event: {event}\n{body}\n"
+
+# 推送阶段变化与增量日志。offset（或浏览器自动携带的 Last-Event-ID）为日志的字节偏移，
+# 断线重连后只会收到尚未收到的部分，流量为 O(新增字节) 而不是 O(日志大小)。
+@app.get("/events/{job_id}")
+async def job_events(job_id: str, request: Request, offset: int = 0):
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        offset = int(last_event_id)
+    log_file = C.LOG_DIR / f"{job_id}.log"
+    if _job_status(job_id) is None and not log_file.exists():
+        raise HTTPException(404, "job not found")
+
+    async def stream():
+        pos = max(0, offset)
+        last_status = None
+        idle = 0
+        yield "retry: 2000\n\n"
+        while True:
+            status = _job_status(job_id) or {}
+            encoded = json.dumps(status, ensure_ascii=False)
+            if encoded != last_status:
+                last_status = encoded
+                idle = 0
+                yield _sse("status", encoded)
+
+            lines, pos, drained = _read_log_delta(log_file, pos)
+            if lines:
+                idle = 0
+                yield _sse("log", "\n".join(lines), event_id=pos)
+
+            finished = status.get("done") if "queue_state" in status else status.get("stage") in _FINAL_DISK_STAGES
+            if finished and drained:
+                yield _sse("end", json.dumps({"offset": pos}))
+                return
+            if await request.is_disconnected():
+                return
+            if drained and not await HUB.wait(job_id, timeout=1.0):
+                idle += 1
+                if idle >= 15:
+                    # 心跳注释行，防止代理关闭空闲连接
+                    idle = 0
+                    yield ": ping\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
 #删除项目及其所有关联文件的端
 @app.delete("/delete/{job_id}")
 def delete_project(job_id: str):
-    if job_id in JOBS: del JOBS[job_id]
+    QUEUE.remove(job_id)
+    CATALOG.remove(job_id)
     try:
         # 从磁盘中删除所有关联的目录和文件
         if (C.UPLOAD_DIR / job_id).exists(): shutil.rmtree(C.UPLOAD_DIR / job_id)
@@ -190,33 +259,68 @@ def delete_project(job_id: str):
         if zip_file.exists(): zip_file.unlink()
         log_file = C.LOG_DIR / f"{job_id}.log"
         if log_file.exists(): log_file.unlink()
+        ARTIFACTS.remove_job(job_id)
+        # 释放已不被任何任务引用的上传 blob
+        BLOBS.gc()
         return {"status": "deleted", "job_id": job_id}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 # --- 3. 重建逻辑 ---
-def _async_reconstruct(job_id, scene, upload_type, img_dir, work_dir, out_dir, log_file):
-    JOBS[job_id] = {"job_id": job_id, "scene": scene, "stage": "running", "done": False, "log_url": f"/logs/{log_file.name}"}
+# 由任务队列的工作线程调用；payload 为提交时保存的路径参数（重启后可据此恢复任务）
+def _async_reconstruct(job_id: str, payload: dict):
+    img_dir = Path(payload["img_dir"])
+    work_dir = Path(payload["work_dir"])
+    out_dir = Path(payload["out_dir"])
+    log_file = Path(payload["log_file"])
+    QUEUE.update(job_id, stage="running", done=False)
     try:
         result = R.reconstruct(images_dir=img_dir, work_dir=work_dir, out_dir=out_dir, log_file=log_file)
-        zip_path = zip_dir(out_dir, out_dir.parent / f"{job_id}.zip")
-        JOBS[job_id].update({
-            "done": True, 
-            "stage": "Done", 
-            "exit_code": result.get("exit_code", -1), 
-            "zip_url": f"/outputs/{zip_path.name}",
-            "command": result.get("command")
-        })
+        # 不再预先打包：压缩包由 /download/{job_id} 按需流式生成
+        QUEUE.update(
+            job_id,
+            done=True,
+            stage="Done",
+            exit_code=result.get("exit_code", -1),
+            zip_url=f"/download/{job_id}",
+            command=result.get("command"),
+            train_startup_saved_sec=result.get("train_startup_saved_sec"),
+        )
+        # 预先生成 viewer 所需产物的压缩变体
+        for rel in (_VIEWER_PLY, _VIEWER_CAMERAS):
+            if ARTIFACTS.resolve(job_id, rel) is not None:
+                ARTIFACTS.schedule(job_id, rel)
     except Exception as e:
-        JOBS[job_id].update({"done": True, "stage": "Failed", "error": str(e), "exit_code": -1})
+        QUEUE.update(job_id, done=True, stage="Failed", error=str(e), exit_code=-1)
 
-#用于从上传的文件开始新重建作业reconstruction的端点
-@app.post("/reconstruct_stream")
-async def reconstruct_stream(
-    files: List[UploadFile] = File(...),
-    scene_name: Optional[str] = Form(None),
-    upload_type: str = Form("files"),
-):
+
+# viewer 产物服务：预压缩变体 + Range + 强 ETag
+ARTIFACTS = ArtifactStore(C.OUTPUT_DIR, C.ARTIFACT_CACHE_DIR)
+
+# 项目目录：/projects 的持久化索引
+CATALOG = ProjectCatalog(C.CATALOG_DB_PATH, C.OUTPUT_DIR)
+
+# 有界的工作线程池 + 持久化队列（data/jobs.db），并发数由 MAX_CONCURRENT_JOBS 控制；
+# 任务记录的每次变化都同步到项目目录
+QUEUE = JobQueue(C.JOB_DB_PATH, runner=_async_reconstruct, max_workers=C.MAX_CONCURRENT_JOBS, listener=CATALOG.upsert)
+
+
+@app.on_event("startup")
+def _start_queue():
+    # 把队列中已有的任务同步进项目目录，再启动工作线程并重新排队上次服务退出时未完成的任务
+    for job_data in QUEUE.jobs():
+        CATALOG.upsert(job_data)
+    QUEUE.start()
+    # 预先启动常驻训练进程，第一个任务也无需等待 torch/CUDA 扩展的导入
+    if R.TRAINERS is not None:
+        R.TRAINERS.prewarm()
+
+# 上传文件的内容寻址存储：任务输入目录中的文件是 blob 的硬链接
+BLOBS = BlobStore(C.BLOB_DIR)
+
+
+def _new_job(scene_name: Optional[str]) -> tuple[str, dict]:
+    """根据场景名生成 job_id 并返回各目录路径；同名任务仍在排队或运行时返回 409。"""
     # 清理场景名称以用作作业 ID 或生成一个唯一的 ID
     if scene_name:
         import re
@@ -224,23 +328,34 @@ async def reconstruct_stream(
         job_id = cleaned
     else:
         job_id = make_job_id("recon")
-    
+
+    # 同名任务仍在排队或运行时，拒绝覆盖其输入目录
+    if QUEUE.is_active(job_id):
+        raise HTTPException(409, f"job {job_id} is already queued or running")
+
     # 定义作业文件的路径
     job_root = C.UPLOAD_DIR / job_id
-    img_dir = job_root / "input"
-    work_dir = job_root / "work"
-    out_dir = C.OUTPUT_DIR / job_id
-    log_file = C.LOG_DIR / f"{job_id}.log"
+    paths = {
+        "job_root": job_root,
+        "img_dir": job_root / "input",
+        "work_dir": job_root / "work",
+        "out_dir": C.OUTPUT_DIR / job_id,
+        "log_file": C.LOG_DIR / f"{job_id}.log",
+    }
+    return job_id, paths
 
-    # 处理文件上传：保存单个文件或解压缩 zip 存档
-    if upload_type == "zip":
-        tmp = await save_upload_files(files, job_root)
-        extract_zip(tmp[0], img_dir)
-    else:
-        await save_upload_files(files, img_dir)
 
-    th = threading.Thread(target=_async_reconstruct, args=(job_id, scene_name or job_id, upload_type, img_dir, work_dir, out_dir, log_file), daemon=True)
-    th.start()
+def _enqueue_job(job_id: str, paths: dict, scene_name: Optional[str], upload_type: str, priority: int) -> dict:
+    # 放入持久化队列，由工作线程池按优先级 + FIFO 顺序执行
+    log_file = paths["log_file"]
+    payload = {
+        "img_dir": str(paths["img_dir"]),
+        "work_dir": str(paths["work_dir"]),
+        "out_dir": str(paths["out_dir"]),
+        "log_file": str(log_file),
+    }
+    info = {"scene": scene_name or job_id, "upload_type": upload_type, "log_url": f"/logs/{log_file.name}"}
+    QUEUE.submit(job_id, payload, info, priority=priority)
 
     return {
         "job_id": job_id,
@@ -248,15 +363,216 @@ async def reconstruct_stream(
         "upload_type": upload_type,
         "log_url": f"/logs/{log_file.name}",
         "status_url": f"/result/{job_id}",
+        "queue_position": (QUEUE.get(job_id) or {}).get("queue_position"),
     }
 
 
+#用于从上传的文件开始新重建作业reconstruction的端点
+@app.post("/reconstruct_stream")
+async def reconstruct_stream(
+    files: List[UploadFile] = File(...),
+    scene_name: Optional[str] = Form(None),
+    upload_type: str = Form("files"),
+    priority: int = Form(0),
+):
+    job_id, paths = _new_job(scene_name)
+
+    # 处理文件上传：保存单个文件或解压缩 zip 存档（内容存入 blob 仓库去重）
+    if upload_type == "zip":
+        tmp = await save_upload_files(files, paths["job_root"], store=BLOBS)
+        extract_zip(tmp[0], paths["img_dir"])
+    else:
+        await save_upload_files(files, paths["img_dir"], store=BLOBS)
+
+    return _enqueue_job(job_id, paths, scene_name, upload_type, priority)
+
+
+# --- 分块上传：init -> chunk（可续传）-> finalize ---
+# 客户端先提交每个文件的 (name, size, sha256)，服务器已有的内容无需再上传
+def _session_file(upload_id: str) -> Path:
+    import re
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        raise HTTPException(404, "upload session not found")
+    return C.UPLOAD_SESSION_DIR / f"{upload_id}.json"
+
+
+def _load_session(upload_id: str) -> dict:
+    session_file = _session_file(upload_id)
+    if not session_file.exists():
+        raise HTTPException(404, "upload session not found")
+    return json.loads(session_file.read_text(encoding="utf-8"))
+
+
+def _session_progress(session: dict) -> dict:
+    sizes = {f["sha256"]: f["size"] for f in session["files"]}
+    return {
+        "upload_id": session["upload_id"],
+        "chunk_size": C.UPLOAD_CHUNK_SIZE,
+        "missing": [sha for sha in sizes if not BLOBS.has(sha)],
+        "received": {sha: BLOBS.received(sha, size) for sha, size in sizes.items()},
+    }
+
+
+@app.post("/upload/init")
+async def upload_init(request: Request):
+    body = await request.json()
+    files = []
+    for f in body.get("files") or []:
+        sha, size = str(f.get("sha256", "")).lower(), f.get("size")
+        if not is_sha256(sha) or not isinstance(size, int) or size < 0:
+            raise HTTPException(400, "each file needs name, size and sha256")
+        # name may include path on some browsers; keep basename only
+        files.append({"name": Path(str(f.get("name") or "upload.bin")).name, "size": size, "sha256": sha})
+    if not files:
+        raise HTTPException(400, "no files")
+    session = {
+        "upload_id": uuid.uuid4().hex,
+        "scene_name": body.get("scene_name"),
+        "upload_type": body.get("upload_type") or "files",
+        "priority": int(body.get("priority") or 0),
+        "files": files,
+        "created": time.time(),
+    }
+    _session_file(session["upload_id"]).write_text(json.dumps(session), encoding="utf-8")
+    # 已存在的 blob 无需再上传，在 finalize 链接之前保护它们不被 gc() 删除
+    for f in files:
+        BLOBS.touch(f["sha256"])
+    return _session_progress(session)
+
+
+@app.put("/upload/{upload_id}/chunk")
+async def upload_chunk(upload_id: str, sha256: str, request: Request, offset: int = 0):
+    session = _load_session(upload_id)
+    size = {f["sha256"]: f["size"] for f in session["files"]}.get(sha256)
+    if size is None:
+        raise HTTPException(404, "file not part of this upload")
+    data = await request.body()
+    if len(data) > C.UPLOAD_CHUNK_SIZE:
+        raise HTTPException(413, f"chunk larger than {C.UPLOAD_CHUNK_SIZE} bytes")
+    try:
+        received = await run_in_threadpool(BLOBS.write_chunk, sha256, size, offset, data)
+    except ChunkOffsetError as e:
+        # 客户端应从 received 处继续上传
+        return JSONResponse(status_code=409, content={"error": "offset mismatch", "received": e.received})
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"sha256": sha256, "received": received, "complete": received == size}
+
+
+@app.get("/upload/{upload_id}/status")
+def upload_status(upload_id: str):
+    return _session_progress(_load_session(upload_id))
+
+
+@app.post("/upload/{upload_id}/finalize")
+def upload_finalize(upload_id: str):
+    session = _load_session(upload_id)
+    progress = _session_progress(session)
+    if progress["missing"]:
+        return JSONResponse(status_code=409, content={"error": "upload incomplete", **progress})
+
+    scene_name, upload_type = session.get("scene_name"), session["upload_type"]
+    job_id, paths = _new_job(scene_name)
+    if upload_type == "zip":
+        archive = session["files"][0]
+        extract_zip(BLOBS.link(archive["sha256"], paths["job_root"] / archive["name"]), paths["img_dir"])
+    else:
+        for f in session["files"]:
+            BLOBS.link(f["sha256"], paths["img_dir"] / f["name"])
+    _session_file(upload_id).unlink()
+
+    return _enqueue_job(job_id, paths, scene_name, upload_type, session.get("priority", 0))
+
+
+# --- 下载：按需流式生成的 zip（支持 Range 断点续传） ---
+@app.api_route("/download/{job_id}", methods=["GET", "HEAD"])
+def download(job_id: str, request: Request, include: str = "final", paths: Optional[str] = None):
+    """
+    include=final（默认，最终点云 + cameras.json 等）或 all（整个输出目录）；
+    paths 为逗号分隔的相对路径/通配符，给出时只打包匹配的文件。
+    """
+    out_dir = C.OUTPUT_DIR / job_id
+    if out_dir.resolve().parent != C.OUTPUT_DIR.resolve() or not out_dir.is_dir():
+        raise HTTPException(404, "job not found")
+    try:
+        files = select_files(out_dir, include, paths.split(",") if paths else None)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if not files:
+        raise HTTPException(404, "no matching files")
+
+    archive = ZipStream(files)
+    headers = {"ETag": archive.etag, "Content-Disposition": f'attachment; filename="{job_id}.zip"'}
+    return _ranged_response(request, archive.size, archive.iter_bytes, "application/zip", headers)
+
+
+def _ranged_response(request: Request, size: int, body, media_type: str, headers: dict) -> Response:
+    """
+    按 Range / If-Range 请求头返回 200、206 或 416。
+    body(start, end) 生成 [start, end) 范围的字节；headers 中应已包含 ETag。
+    """
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    byte_range = None
+    # If-Range 与当前 ETag 不一致（内容已变化）时返回完整内容
+    if request.headers.get("if-range") in (None, headers.get("ETag")):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    start, end = byte_range or (0, size)
+    headers["Content-Length"] = str(end - start)
+    status = 206 if byte_range else 200
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(body(start, end), status_code=status, media_type=media_type, headers=headers)
+
+
+# --- 产物：viewer 加载的 PLY / cameras.json 等（预压缩 + Range + 强 ETag） ---
+@app.api_route("/artifacts/{job_id}/{rel:path}", methods=["GET", "HEAD"])
+def artifact(job_id: str, rel: str, request: Request, v: Optional[str] = None):
+    path = ARTIFACTS.resolve(job_id, rel)
+    if path is None:
+        raise HTTPException(404, "artifact not found")
+    version = ARTIFACTS.version(path)
+    body, encoding = ARTIFACTS.select(job_id, rel, path, request.headers.get("accept-encoding"))
+    # 先打开选中的文件：之后后台压缩清理旧版本变体时，已打开的文件仍可完整读出
+    try:
+        f = body.open("rb")
+    except FileNotFoundError:
+        # 变体在 select() 之后刚被清理，退回原始文件
+        body, encoding = path, None
+        f = body.open("rb")
+    etag = f'"{version}-{encoding or "identity"}"'
+    # 只有带当前版本号的 iteration_N 产物 URL 才允许长期缓存
+    immutable = ARTIFACTS.is_immutable(rel) and v == version
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "public, max-age=31536000, immutable" if immutable else "no-cache",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        f.close()
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    response = _ranged_response(
+        request, os.fstat(f.fileno()).st_size, lambda start, end: iter_open_file(f, start, end), media_type, headers
+    )
+    if not isinstance(response, StreamingResponse):
+        # HEAD / 416：不发送内容
+        f.close()
+    return response
+
+
 # --- 4. 捕获所有路由 ---
 _frontend_dist = C.BASE_DIR / "frontend-react" / "dist"
 
 @app.get("/{full_path:path}")
 async def serve_react_app(full_path: str):
-    if full_path.startswith(("api/", "outputs", "logs", "uploads", "reconstruct", "projects", "status", "result", "health", "viewer", "gs_editor")):
+    if full_path.startswith(("api/", "outputs", "logs", "uploads", "reconstruct", "upload/", "download", "artifacts", "projects", "status", "result", "events", "health", "viewer", "gs_editor")):
         return JSONResponse(status_code=404, content={"detail": "Not Found"})
     
     file_path = _frontend_dist / full_path
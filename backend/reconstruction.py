@@ -7,15 +7,31 @@ from pathlib import Path
 from typing import Dict, Optional
 
 from . import config as C
+from .colmap_cache import ColmapCache
+from .events import HUB
+from .trainer import TrainWorkerPool
 from .utils import write_status
 
+# 常驻训练进程池（每个重建工作线程对应一个进程），GS_TRAIN_WORKER=0 时不使用
+TRAINERS: Optional[TrainWorkerPool] = TrainWorkerPool(C.MAX_CONCURRENT_JOBS) if C.TRAIN_WORKER else None
+# 跨任务共享的 COLMAP 结果缓存，COLMAP_CACHE_BYTES=0 时不使用
+COLMAP_CACHE: Optional[ColmapCache] = (
+    ColmapCache(C.COLMAP_CACHE_DIR, C.COLMAP_CACHE_BYTES) if C.COLMAP_CACHE_BYTES > 0 else None
+)
 
-def _run(cmd: str, cwd: Optional[Path], log_file: Path, header: str) -> int:
-    """运行一个 shell 命令，并将 stdout/stderr 追加到 log_file，返回退出代码。"""
+
+def _log_header(cmd: str, cwd: Optional[Path], log_file: Path, header: str) -> None:
     log_file.parent.mkdir(parents=True, exist_ok=True)
     with log_file.open("a", encoding="utf-8") as lf:
         lf.write(f"\n===== {header} =====\n")
         lf.write(f"CMD: {cmd}\nCWD: {cwd}\n\n")
+
+
+def _run(cmd: str, cwd: Optional[Path], log_file: Path, header: str) -> int:
+    """运行一个 shell 命令，并将 stdout/stderr 追加到 log_file，返回退出代码。
+    每写入一行就 flush 并通知 SSE 订阅者（日志文件名即 job_id），以便实时推送增量日志。"""
+    job_id = log_file.stem
+    _log_header(cmd, cwd, log_file, header)
     import subprocess
 
     proc = subprocess.Popen(
@@ -31,12 +47,36 @@ def _run(cmd: str, cwd: Optional[Path], log_file: Path, header: str) -> int:
     with log_file.open("a", encoding="utf-8") as lf:
         for line in proc.stdout:
             lf.write(line)
+            lf.flush()
+            HUB.publish(job_id)
     proc.wait()
     with log_file.open("a", encoding="utf-8") as lf:
         lf.write(f"\nEXIT_CODE: {proc.returncode}\n")
+    HUB.publish(job_id)
     return proc.returncode
 
 
+def _run_train_worker(args: list, log_file: Path) -> tuple[int, float]:
+    """在常驻训练进程中运行 train.py，返回 (退出代码, 本次节省的启动时间秒数)。"""
+    job_id = log_file.stem
+    cmd = "train_worker: train.py " + " ".join(shlex.quote(str(a)) for a in args)
+    _log_header(cmd, C.GAUSSIAN_SPLATTING_DIR, log_file, "TRAIN")
+    assert TRAINERS is not None
+    try:
+        result = TRAINERS.run(job_id, args, log_file)
+    except Exception as e:
+        with log_file.open("a", encoding="utf-8") as lf:
+            lf.write(f"\n[train-worker] {e}\n")
+        result = {"exit_code": -1, "startup_saved_sec": 0.0}
+    saved = float(result.get("startup_saved_sec") or 0.0)
+    with log_file.open("a", encoding="utf-8") as lf:
+        if result.get("reused"):
+            lf.write(f"\n[train-worker] reused warm process, startup saved: {saved:.1f}s\n")
+        lf.write(f"\nEXIT_CODE: {result['exit_code']}\n")
+    HUB.publish(job_id)
+    return result["exit_code"], saved
+
+
 def reconstruct(
     images_dir: Path,
     work_dir: Path, 
@@ -86,8 +126,19 @@ def reconstruct(
     # 检查现在根目录下是否有所需的 COLMAP 输出
     sparse0 = dataset_root / "sparse" / "0"
     
+    # 相同图片集 + 相机模型的 COLMAP 结果可直接复用
+    fingerprint = None
+    if not sparse0.exists() and COLMAP_CACHE is not None:
+        fingerprint = COLMAP_CACHE.fingerprint(images_dir, C.COLMAP_CAMERA)
+        if fingerprint and COLMAP_CACHE.restore(fingerprint, dataset_root):
+            with log_file.open("a") as f: f.write(f"\n[INFO] Restored COLMAP results from cache ({fingerprint[:12]}).\n")
+
     # --- STEP 1: CONVERT (COLMAP) ---
-    if sparse0.exists():
+    if sparse0.exists() and fingerprint:
+        write_status(status_path, {"stage": "convert", "message": "Reused cached COLMAP", "progress": 100})
+        code_convert = 0
+        cmd_convert = f"(cached {fingerprint[:12]})"
+    elif sparse0.exists():
         # 如果数据已存在，则跳过 convert.py 步骤
         msg = "Found existing COLMAP data (sparse/0). Skipping convert.py."
         print(msg)
@@ -101,7 +152,11 @@ def reconstruct(
         write_status(status_path, {"stage": "convert", "message": "Running COLMAP...", "progress": 0})
         
         # IMPORTANT: Use xvfb-run -a to prevent Qt crash on headless servers
-        cmd_convert = f"xvfb-run -a {shlex.quote(C.PYTHON_EXE)} convert.py -s {shlex.quote(str(dataset_root))}"
+        # 细分步骤进度（extract/match/map/undistort）写入 out_dir/progress.json，训练阶段沿用同一文件
+        cmd_convert = (
+            f"xvfb-run -a {shlex.quote(C.PYTHON_EXE)} convert.py -s {shlex.quote(str(dataset_root))}"
+            f" --camera {shlex.quote(C.COLMAP_CAMERA)} --progress_file {shlex.quote(str(out_dir / 'progress.json'))}"
+        )
         
         code_convert = _run(cmd_convert, cwd=C.GAUSSIAN_SPLATTING_DIR, log_file=log_file, header="CONVERT")
 
@@ -116,19 +171,30 @@ def reconstruct(
                 "out_dir": str(out_dir),
                 "log_file": str(log_file),
             }
+        if fingerprint:
+            try:
+                COLMAP_CACHE.store(fingerprint, dataset_root)
+            except Exception as e:
+                with log_file.open("a") as f: f.write(f"\n[WARN] Could not cache COLMAP results: {e}\n")
 
      # --- 步骤 2: 训练 (3DGS) ---
     write_status(status_path, {"stage": "train", "message": "Training 3DGS...", "progress": 0})
     
-    cmd_train = f"{shlex.quote(C.PYTHON_EXE)} train.py -s {shlex.quote(str(dataset_root))} -m {shlex.quote(str(out_dir))}"
-    
-    code_train = _run(cmd_train, cwd=C.GAUSSIAN_SPLATTING_DIR, log_file=log_file, header="TRAIN")
+    train_args = ["-s", str(dataset_root), "-m", str(out_dir), "--progress_file", str(out_dir / "progress.json")]
+    startup_saved = 0.0
+    if TRAINERS is not None:
+        code_train, startup_saved = _run_train_worker(train_args, log_file)
+        cmd_train = "train_worker: train.py " + " ".join(shlex.quote(a) for a in train_args)
+    else:
+        cmd_train = f"{shlex.quote(C.PYTHON_EXE)} train.py " + " ".join(shlex.quote(a) for a in train_args)
+        code_train = _run(cmd_train, cwd=C.GAUSSIAN_SPLATTING_DIR, log_file=log_file, header="TRAIN")
     write_status(status_path, {"stage": "done" if code_train == 0 else "train_failed", "exit_code": code_train})
 
     return {
         "exit_code": code_train,
         "stage": "train" if code_train != 0 else "done",
         "command": cmd_train,
+        "train_startup_saved_sec": startup_saved,
         "dataset_root": str(dataset_root),
         "out_dir": str(out_dir),
         "log_file": str(log_file),
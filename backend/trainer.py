@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+import queue
+import select
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import config as C
+from .events import HUB
+
+
+class TrainWorker:
+    """
+    常驻训练进程（gaussian-splatting/train_worker.py）的客户端。
+    进程只在第一次使用时启动并导入 torch / CUDA 扩展等，之后的任务复用同一进程，
+    省去每个任务的 shell + 解释器启动和导入开销。任务失败后进程会自行退出，下次使用时重新启动。
+    """
+
+    def __init__(self, index: int = 0):
+        self.index = index
+        self.proc: Optional[subprocess.Popen] = None
+        # 从启动进程到收到 ready 的耗时，即每次复用所节省的启动时间
+        self.startup_sec: Optional[float] = None
+
+    def ensure_started(self) -> bool:
+        """确保进程在运行；返回 True 表示复用了已有进程。"""
+        if self.proc is not None and self.proc.poll() is None:
+            return True
+        t0 = time.time()
+        worker_log = (C.LOG_DIR / f"train_worker_{self.index}.log").open("a", encoding="utf-8")
+        self.proc = subprocess.Popen(
+            # 每个进程使用各自的查看器端口，避免多个进程争用同一端口
+            [C.PYTHON_EXE, "train_worker.py", "--port", str(C.TRAIN_VIEWER_PORT + self.index)],
+            cwd=str(C.GAUSSIAN_SPLATTING_DIR),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=worker_log,
+            text=True,
+            bufsize=1,
+        )
+        worker_log.close()
+        ready = self._read_reply(None)
+        if ready is None or ready.get("event") != "ready":
+            self._reap()
+            raise RuntimeError("training worker failed to start, see logs/train_worker_%d.log" % self.index)
+        self.startup_sec = time.time() - t0
+        return False
+
+    def run(self, job_id: str, args: List[str], log_file: Path) -> Dict:
+        """在常驻进程中运行一次 train.py（args 为其命令行参数），日志追加到 log_file。"""
+        reused = self.ensure_started()
+        assert self.proc is not None and self.proc.stdin is not None
+        job = {"job_id": job_id, "args": [str(a) for a in args], "log_file": str(log_file)}
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+
+        reply = self._read_reply(job_id)
+        if reply is None:
+            # 进程异常退出（如被 OOM killer 杀死）
+            code = self._reap()
+            return {"exit_code": code if code else -1, "reused": reused, "startup_saved_sec": 0.0}
+        if reply.get("exit_code", 1) != 0:
+            # 失败后进程会自行退出，等待其结束，下次重新启动
+            self._reap()
+        return {
+            "exit_code": int(reply.get("exit_code", 1)),
+            "reused": reused,
+            "startup_saved_sec": self.startup_sec if reused else 0.0,
+            "elapsed_sec": reply.get("elapsed_sec"),
+        }
+
+    def _read_reply(self, job_id: Optional[str]) -> Optional[Dict]:
+        assert self.proc is not None and self.proc.stdout is not None
+        while True:
+            # 任务运行期间日志由子进程直接写入文件，这里定期通知 SSE 订阅者读取增量
+            ready, _, _ = select.select([self.proc.stdout], [], [], 0.5)
+            if job_id is not None:
+                HUB.publish(job_id)
+            if ready:
+                line = self.proc.stdout.readline()
+                if not line:
+                    return None
+                line = line.strip()
+                if line:
+                    return json.loads(line)
+
+    def _reap(self) -> Optional[int]:
+        if self.proc is None:
+            return None
+        try:
+            code = self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            code = self.proc.wait()
+        self.proc = None
+        return code
+
+
+class TrainWorkerPool:
+    """固定大小的训练进程池，每个重建工作线程同一时间独占一个进程。"""
+
+    def __init__(self, size: int):
+        self._idle: "queue.LifoQueue[TrainWorker]" = queue.LifoQueue()
+        for i in range(max(1, int(size))):
+            self._idle.put(TrainWorker(i))
+
+    def run(self, job_id: str, args: List[str], log_file: Path) -> Dict:
+        worker = self._idle.get()
+        try:
+            return worker.run(job_id, args, log_file)
+        finally:
+            self._idle.put(worker)
+
+    def prewarm(self) -> None:
+        """在后台线程中预先启动所有进程，使第一个任务也无需等待导入。"""
+        def _warm():
+            workers = [self._idle.get() for _ in range(self._idle.qsize())]
+            try:
+                for w in workers:
+                    try:
+                        w.ensure_started()
+                    except Exception as e:
+                        print(f"[train-worker] prewarm failed: {e}")
+            finally:
+                for w in workers:
+                    self._idle.put(w)
+
+        threading.Thread(target=_warm, name="train-worker-prewarm", daemon=True).start()
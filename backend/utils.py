@@ -3,17 +3,20 @@ from __future__ import annotations
 
 import io
 import os
-import shutil
+import re
 import uuid
 import zipfile
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
 import json
 import time
 
 from fastapi import UploadFile
 
+from .blobstore import BlobStore
+from .events import HUB
+
 
 def make_job_id(prefix: str = "job") -> str:
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
@@ -21,13 +24,20 @@ def make_job_id(prefix: str = "job") -> str:
     return f"{prefix}-{ts}-{u8}"
 
 
-async def save_upload_files(files: List[UploadFile], dest_dir: Path) -> List[Path]:
+async def save_upload_files(
+    files: List[UploadFile], dest_dir: Path, store: Optional[BlobStore] = None
+) -> List[Path]:
+    """保存上传的文件；给定 store 时内容存入 blob 仓库（去重），dest_dir 中为其硬链接。"""
     dest_dir.mkdir(parents=True, exist_ok=True)
     saved: List[Path] = []
     for f in files:
         # name may include path on some browsers; keep basename only
         name = Path(f.filename or "upload.bin").name
         out_path = dest_dir / name
+        if store is not None:
+            sha, _ = await store.put_upload(f)
+            saved.append(store.link(sha, out_path))
+            continue
         with out_path.open("wb") as w:
             while True:
                 chunk = await f.read(1024 * 1024)
@@ -39,11 +49,46 @@ async def save_upload_files(files: List[UploadFile], dest_dir: Path) -> List[Pat
     return saved
 
 
-def zip_dir(src_dir: Path, out_zip_path: Path) -> Path:
-    out_zip_path.parent.mkdir(parents=True, exist_ok=True)
-    base = out_zip_path.with_suffix("")
-    shutil.make_archive(str(base), "zip", root_dir=str(src_dir))
-    return base.with_suffix(".zip")
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段的 Range 请求头（bytes=a-b / a- / -n），返回半开区间 [start, end)。
+    没有 Range、格式不支持（如多段）时返回 None（按完整响应处理）；范围无法满足时抛出 ValueError。
+    """
+    if not header:
+        return None
+    m = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header)
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if not m.group(1):
+        suffix = int(m.group(2))
+        if suffix == 0 or size == 0:
+            raise ValueError("unsatisfiable range")
+        return max(0, size - suffix), size
+    start = int(m.group(1))
+    end = min(int(m.group(2)) + 1, size) if m.group(2) else size
+    if start >= size or end <= start:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+def iter_file(path: Path, start: int, end: int, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """按块读取文件的 [start, end) 字节范围。"""
+    return iter_open_file(path.open("rb"), start, end, chunk_size)
+
+
+def iter_open_file(f: BinaryIO, start: int, end: int, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """按块读取已打开文件的 [start, end) 字节范围，读完（或生成器被关闭）时关闭文件。"""
+    try:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                raise IOError(f"{f.name} shrank while streaming")
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
 
 
 def extract_zip(zip_path: Path, dest_dir: Path) -> List[Path]:
@@ -79,4 +124,6 @@ def write_status(status_path: Path, data: dict) -> None:
     tmp = status_path.with_suffix(".tmp")
     with tmp.open("w", encoding="utf-8") as f:
         json.dump(data, f)
-    tmp.replace(status_path)
\ No newline at end of file
+    tmp.replace(status_path)
+    # status.json 位于 OUTPUT_DIR/<job_id>/ 下，通知订阅该任务的 SSE 连接
+    HUB.publish(status_path.parent.name)
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import re
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .utils import iter_file
+
+# 已经是压缩格式或体积很大的文件直接存储（不 deflate）
+_STORED_SUFFIXES = {".ply", ".pth", ".zip", ".png", ".jpg", ".jpeg", ".npy"}
+# 小于该大小且可压缩的文件在内存中 deflate（长度在生成响应前即可确定）
+_DEFLATE_MAX = 4 * 1024 * 1024
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+# 可选的打包范围
+PRESETS = ("final", "all")
+
+# (path, size, mtime_ns) -> crc32；断点续传（Range）时避免重复读取已计算过的文件
+_CRC_CACHE: Dict[Tuple[str, int, int], int] = {}
+_CRC_LOCK = threading.Lock()
+
+
+def _dos_datetime(ts: float) -> Tuple[int, int]:
+    t = time.localtime(max(ts, 315532800))  # zip 不支持 1980 年之前的时间
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class _Entry:
+    def __init__(self, path: Path, arcname: str):
+        st = path.stat()
+        self.path = path
+        self.name = arcname.encode("utf-8")
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.mode = st.st_mode
+        self.dos_time, self.dos_date = _dos_datetime(st.st_mtime)
+        self.deflated: Optional[bytes] = None
+        self.crc: Optional[int] = None
+        if self.size <= _DEFLATE_MAX and path.suffix.lower() not in _STORED_SUFFIXES:
+            data = path.read_bytes()
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            self.deflated = compressor.compress(data) + compressor.flush()
+            self.crc = zlib.crc32(data)
+        else:
+            with _CRC_LOCK:
+                self.crc = _CRC_CACHE.get(self._key)
+        # 只有大文件需要 zip64
+        self.zip64 = self.size >= _ZIP64_LIMIT
+        self.offset = 0
+
+    @property
+    def _key(self) -> Tuple[str, int, int]:
+        return (str(self.path), self.size, self.mtime_ns)
+
+    @property
+    def stored(self) -> bool:
+        return self.deflated is None
+
+    @property
+    def compressed_size(self) -> int:
+        return self.size if self.stored else len(self.deflated)
+
+    @property
+    def flags(self) -> int:
+        # bit 11: 文件名为 UTF-8；bit 3: 存储的大文件在数据之后附带 data descriptor（边读边算 CRC）
+        return 0x0800 | (0x0008 if self.stored else 0)
+
+    @property
+    def version(self) -> int:
+        return 45 if self.zip64 else 20
+
+    def set_crc(self, crc: int) -> None:
+        self.crc = crc
+        with _CRC_LOCK:
+            _CRC_CACHE[self._key] = crc
+
+    def ensure_crc(self) -> int:
+        if self.crc is None:
+            crc = 0
+            for chunk in iter_file(self.path, 0, self.size):
+                crc = zlib.crc32(chunk, crc)
+            self.set_crc(crc)
+        return self.crc
+
+    def local_header(self) -> bytes:
+        if self.stored:
+            # 使用 data descriptor 时头部的 CRC 与大小为 0
+            crc, csize, usize = 0, 0, 0
+        else:
+            crc, csize, usize = self.crc, self.compressed_size, self.size
+        extra = b""
+        if self.zip64:
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            csize = usize = _ZIP64_LIMIT
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, self.version, self.flags, 0 if self.stored else 8,
+            self.dos_time, self.dos_date, crc, csize, usize, len(self.name), len(extra),
+        ) + self.name + extra
+
+    def descriptor_size(self) -> int:
+        if not self.stored:
+            return 0
+        return 24 if self.zip64 else 16
+
+    def descriptor(self) -> bytes:
+        if not self.stored:
+            return b""
+        if self.zip64:
+            return struct.pack("<IIQQ", 0x08074B50, self.ensure_crc(), self.size, self.size)
+        return struct.pack("<IIII", 0x08074B50, self.ensure_crc(), self.size, self.size)
+
+    def central_header(self) -> bytes:
+        csize, usize, offset = self.compressed_size, self.size, self.offset
+        extra_fields = []
+        if usize >= _ZIP64_LIMIT:
+            extra_fields.append(usize)
+            usize = _ZIP64_LIMIT
+        if csize >= _ZIP64_LIMIT:
+            extra_fields.append(csize)
+            csize = _ZIP64_LIMIT
+        if offset >= _ZIP64_LIMIT:
+            extra_fields.append(offset)
+            offset = _ZIP64_LIMIT
+        extra = b""
+        if extra_fields:
+            extra = struct.pack("<HH", 0x0001, 8 * len(extra_fields)) + struct.pack("<%dQ" % len(extra_fields), *extra_fields)
+        version = 45 if extra_fields else self.version
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version, self.flags,
+            0 if self.stored else 8, self.dos_time, self.dos_date, self.ensure_crc(), csize, usize,
+            len(self.name), len(extra), 0, 0, 0, (self.mode & 0xFFFF) << 16, offset,
+        ) + self.name + extra
+
+
+class ZipStream:
+    """
+    按需生成 zip 下载流，不在磁盘上生成压缩包。
+    布局（每个条目的头部、数据、descriptor 以及中央目录的长度）在生成响应前即可确定，
+    因此可以给出 Content-Length 并支持 Range 断点续传；同样的文件集合总是生成逐字节相同的输出。
+    """
+
+    def __init__(self, files: Sequence[Tuple[Path, str]]):
+        self.entries = [_Entry(path, arcname) for path, arcname in files]
+        pos = 0
+        for e in self.entries:
+            e.offset = pos
+            pos += len(e.local_header()) + e.compressed_size + e.descriptor_size()
+        self.cd_offset = pos
+        self.cd_size = sum(46 + len(e.name) + self._central_extra_size(e) for e in self.entries)
+        self.size = self.cd_offset + self.cd_size + len(self._end_records())
+
+    @staticmethod
+    def _central_extra_size(e: _Entry) -> int:
+        n = (e.size >= _ZIP64_LIMIT) + (e.compressed_size >= _ZIP64_LIMIT) + (e.offset >= _ZIP64_LIMIT)
+        return 4 + 8 * n if n else 0
+
+    @property
+    def etag(self) -> str:
+        h = hashlib.sha1()
+        for e in self.entries:
+            h.update(e.name + b"\0%d\0%d\n" % (e.size, e.mtime_ns))
+        return '"%s"' % h.hexdigest()
+
+    def _end_records(self) -> bytes:
+        count, cd_size, cd_offset = len(self.entries), self.cd_size, self.cd_offset
+        out = b""
+        if count >= 0xFFFF or cd_size >= _ZIP64_LIMIT or cd_offset >= _ZIP64_LIMIT:
+            zip64_eocd_offset = cd_offset + cd_size
+            out += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset)
+            out += struct.pack("<IIQI", 0x07064B50, 0, zip64_eocd_offset, 1)
+            count, cd_size, cd_offset = min(count, 0xFFFF), min(cd_size, _ZIP64_LIMIT), min(cd_offset, _ZIP64_LIMIT)
+        out += struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+        return out
+
+    def _segments(self) -> Iterator[Tuple[int, object]]:
+        """依次给出 (长度, 内容)：内容为 bytes、_Entry（文件数据）或可调用对象（需要 CRC 时才生成的 bytes）。"""
+        for e in self.entries:
+            yield len(e.local_header()), e.local_header()
+            yield e.compressed_size, (e if e.stored else e.deflated)
+            if e.stored:
+                yield e.descriptor_size(), e.descriptor
+        yield self.cd_size, lambda: b"".join(e.central_header() for e in self.entries)
+        yield len(self._end_records()), self._end_records
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """生成 [start, end) 范围内的字节（end 默认为末尾）。"""
+        end = self.size if end is None else end
+        pos = 0
+        for length, content in self._segments():
+            seg_start, seg_end = pos, pos + length
+            pos = seg_end
+            if seg_end <= start or length == 0:
+                continue
+            if seg_start >= end:
+                break
+            lo, hi = max(start, seg_start) - seg_start, min(end, seg_end) - seg_start
+            if isinstance(content, _Entry):
+                if lo == 0 and hi == length and content.crc is None:
+                    # 完整地读取一遍文件时顺便计算 CRC，供之后的 descriptor / 中央目录使用
+                    crc = 0
+                    for chunk in iter_file(content.path, 0, length):
+                        crc = zlib.crc32(chunk, crc)
+                        yield chunk
+                    content.set_crc(crc)
+                else:
+                    yield from iter_file(content.path, lo, hi)
+            else:
+                data = content() if callable(content) else content
+                yield data[lo:hi]
+
+
+def final_iteration_dir(out_dir: Path) -> Optional[Path]:
+    """返回迭代次数最大且包含 point_cloud.ply 的 point_cloud/iteration_N 目录。"""
+    best = None
+    for d in (out_dir / "point_cloud").glob("iteration_*"):
+        m = re.fullmatch(r"iteration_(\d+)", d.name)
+        if m and (d / "point_cloud.ply").exists() and (best is None or int(m.group(1)) > best[0]):
+            best = (int(m.group(1)), d)
+    return best[1] if best else None
+
+
+def select_files(out_dir: Path, include: str = "final", paths: Optional[List[str]] = None) -> List[Tuple[Path, str]]:
+    """
+    选择要打包的文件，返回 (路径, zip 内名称) 列表。
+    - include=final：最后一次迭代的 point_cloud.ply 以及 cameras.json / cfg_args / exposure.json；
+    - include=all：输出目录中的全部文件；
+    - paths：相对输出目录的路径或通配符（如 "point_cloud/*/point_cloud.ply"），给出时忽略 include。
+    """
+    root = out_dir.resolve()
+    all_files = sorted(p for p in root.rglob("*") if p.is_file() and not p.name.endswith(".tmp"))
+    if paths:
+        patterns = [p.strip().lstrip("/") for p in paths if p.strip()]
+        chosen = [p for p in all_files if any(fnmatch.fnmatchcase(p.relative_to(root).as_posix(), pat) for pat in patterns)]
+    elif include == "all":
+        chosen = all_files
+    elif include == "final":
+        chosen = [root / name for name in ("cameras.json", "cfg_args", "exposure.json") if (root / name).is_file()]
+        final_dir = final_iteration_dir(root)
+        if final_dir is not None:
+            chosen.insert(0, final_dir / "point_cloud.ply")
+    else:
+        raise ValueError(f"unknown include preset: {include}")
+    return [(p, p.relative_to(root).as_posix()) for p in chosen]
@@ -6,6 +6,55 @@ import {
 
 // --- Configuration ---
 const API_BASE_URL = ""; 
+// 日志窗口最多保留的行数
+const MAX_LOG_LINES = 5000;
+
+// --- 分块上传 ---
+// 先把每个文件的 SHA-256 提交给服务器，只上传服务器还没有的内容；断线后从已接收的字节处续传
+const sha256Hex = async (file) => {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+};
+
+const uploadChunked = async (name, files, uploadType) => {
+  const entries = [];
+  for (const file of files) entries.push({ file, name: file.name, size: file.size, sha256: await sha256Hex(file) });
+
+  const initRes = await fetch(`${API_BASE_URL}/upload/init`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ scene_name: name, upload_type: uploadType, files: entries.map(({ name, size, sha256 }) => ({ name, size, sha256 })) }),
+  });
+  if (!initRes.ok) throw new Error(initRes.statusText);
+  const session = await initRes.json();
+
+  const missing = new Set(session.missing);
+  for (const entry of entries) {
+    if (!missing.has(entry.sha256)) continue;
+    missing.delete(entry.sha256); // 相同内容只上传一次
+    let offset = session.received[entry.sha256] || 0;
+    let retries = 0;
+    do {
+      try {
+        const chunk = entry.file.slice(offset, offset + session.chunk_size);
+        const res = await fetch(`${API_BASE_URL}/upload/${session.upload_id}/chunk?sha256=${entry.sha256}&offset=${offset}`, { method: 'PUT', body: chunk });
+        const data = await res.json();
+        if (!res.ok && res.status !== 409) throw new Error(data.detail || res.statusText);
+        offset = data.received; // 409 时服务器返回应续传的位置
+        retries = 0;
+      } catch (error) {
+        if (++retries > 5) throw error;
+        await new Promise(r => setTimeout(r, 1000 * retries));
+        const statusRes = await fetch(`${API_BASE_URL}/upload/${session.upload_id}/status`).catch(() => null);
+        if (statusRes && statusRes.ok) offset = (await statusRes.json()).received[entry.sha256] || 0;
+      }
+    } while (offset < entry.size);
+  }
+
+  const res = await fetch(`${API_BASE_URL}/upload/${session.upload_id}/finalize`, { method: 'POST' });
+  if (!res.ok) throw new Error(res.statusText);
+  return res.json();
+};
 
 
 // --- UI 组件 ---
@@ -160,24 +209,22 @@ const LogModal = ({ isOpen, onClose, project }) => {
     const [logs, setLogs] = useState([]);
     const logEndRef = useRef(null);
 
-    // Effect：当模态框打开且有项目时，定期获取日志
+    // Effect：当模态框打开且有项目时，通过 SSE 订阅增量日志（断线后浏览器会携带 Last-Event-ID 自动续传）
     useEffect(() => {
-        if (!isOpen || !project?.log_url) return;
-        const fetchLogs = async () => {
-            try {
-                const res = await fetch(`${API_BASE_URL}${project.log_url}`);
-                if (res.ok) {
-                    const text = await res.text();
-                    setLogs(text.split('\n'));
-                }
-            } catch (e) {
-                console.error("Failed to fetch logs", e);
-            }
-        };
-        fetchLogs();
-        const interval = setInterval(fetchLogs, 2000);
-        return () => clearInterval(interval);
-    }, [isOpen, project]);
+        if (!isOpen || !project?.job_id) return;
+        setLogs([]);
+        const source = new EventSource(`${API_BASE_URL}/events/${project.job_id}`);
+        source.addEventListener('log', (e) => {
+            const lines = e.data.split('\n');
+            setLogs(prev => {
+                const next = prev.concat(lines);
+                return next.length > MAX_LOG_LINES ? next.slice(-MAX_LOG_LINES) : next;
+            });
+        });
+        source.addEventListener('end', () => source.close());
+        source.onerror = (e) => console.error("Log stream interrupted", e);
+        return () => source.close();
+    }, [isOpen, project?.job_id]);
 
     useEffect(() => {
         if (logEndRef.current) logEndRef.current.scrollIntoView({ behavior: "smooth" });
@@ -427,10 +474,17 @@ export default function App() {
     for (let i = 0; i < files.length; i++) formData.append("files", files[i]);
 
     try {
-        // 发送 POST 请求到后端
-        const response = await fetch(`${API_BASE_URL}/reconstruct_stream`, { method: 'POST', body: formData });
-        if (!response.ok) { alert("上传失败: " + response.statusText); return; }
-        const data = await response.json();
+        let data;
+        if (uploadType !== 'zip' && window.crypto?.subtle) {
+            // 图片/文件夹：去重 + 可续传的分块上传
+            try { data = await uploadChunked(name, files, uploadType); }
+            catch (error) { alert("上传失败: " + error.message); return; }
+        } else {
+            // 发送 POST 请求到后端
+            const response = await fetch(`${API_BASE_URL}/reconstruct_stream`, { method: 'POST', body: formData });
+            if (!response.ok) { alert("上传失败: " + response.statusText); return; }
+            data = await response.json();
+        }
         
         // 根据后端返回的数据创建一个新的项目对象
         const newProject = {
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import os
 import time
 from typing import List, Optional
@@ -50,6 +51,31 @@ def submit_job(files: List[str], scene_name: str, upload_type: str):
     return md, job_id, log_url, status_url, None
 
 
+def _iter_sse(url: str, offset: int = 0):
+    """逐个产出后端 SSE 事件 (event, data, id)；offset 为日志的字节偏移，用于断线续传。"""
+    with requests.get(url, params={"offset": offset}, stream=True, timeout=(5, 60)) as resp:
+        resp.raise_for_status()
+        event, data, event_id = "message", [], None
+        for raw in resp.iter_lines(decode_unicode=True):
+            if raw is None:
+                continue
+            if raw == "":
+                if data:
+                    yield event, "\n".join(data), event_id
+                event, data, event_id = "message", [], None
+            elif raw.startswith(":"):
+                continue
+            else:
+                field, _, value = raw.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+                elif field == "id":
+                    event_id = value
+
+
 with gr.Blocks(title="3DGS Online") as demo:
     gr.Markdown("# 3DGS 在线重建")
     with gr.Row():
@@ -106,51 +132,54 @@ with gr.Blocks(title="3DGS Online") as demo:
         if not job_id:
             yield md + "\n无法解析任务ID。", "失败", "(失败)", "失败", gr.update(visible=False), ""
             return
+        log_cache: List[str] = []
+        js: dict = {}
+        stage = None
+        offset = 0
+        events_url = f"{BACKEND_URL}/events/{job_id}"
+        # 订阅后端的 SSE 推送：status 事件携带阶段变化，log 事件只包含新增日志行；断线后按字节偏移续传
         while True:
             try:
-                r = requests.get(status_url, timeout=3)
-                js = r.json() if r.status_code == 200 else {"stage": "unknown"}
-            except Exception:
-                js = {"stage": "unknown"}
-            stage = js.get("stage")
-            if not hasattr(run_stream, "_log_pos"):
-                run_stream._log_pos = 0
-                run_stream._log_cache = []
-            try:
-                log_resp = requests.get(log_url, timeout=3)
-                if log_resp.status_code == 200:
-                    all_lines = log_resp.text.splitlines()
-                    new_lines = all_lines[run_stream._log_pos :]
-                    run_stream._log_pos = len(all_lines)
-                    run_stream._log_cache.extend(new_lines)
-                    if len(run_stream._log_cache) > 2000:
-                        run_stream._log_cache = run_stream._log_cache[-2000:]
-                    log_text = "\n".join(run_stream._log_cache[-400:])
+                for event, data, event_id in _iter_sse(events_url, offset):
+                    if event == "status":
+                        js = json.loads(data)
+                        stage = js.get("stage")
+                    elif event == "log":
+                        log_cache.extend(data.split("\n"))
+                        if len(log_cache) > 2000:
+                            log_cache = log_cache[-2000:]
+                        if event_id is not None:
+                            offset = int(event_id)
+                    elif event == "end":
+                        break
+                    else:
+                        continue
+                    log_text = "\n".join(log_cache[-400:])
+                    yield md, (f"进行中…阶段: {stage}" if stage else "进行中…"), log_text, "尚未完成", gr.update(visible=False), job_id
                 else:
-                    log_text = f"日志获取失败: {log_resp.status_code}"
-            except Exception as e:
-                log_text = f"日志获取异常: {e}"
-            if js.get("done"):
-                zip_url = js.get("zip_url")
-                point_cloud_url = js.get("point_cloud_url")
-                cameras_url = js.get("cameras_url")
-                final_md = md + (
-                    f"\n- 压缩包：{BACKEND_URL}{zip_url}" if zip_url else ""
-                ) + (
-                    f"\n- 点云：{BACKEND_URL}{point_cloud_url}" if point_cloud_url else ""
-                ) + (
-                    f"\n- 相机：{BACKEND_URL}{cameras_url}" if cameras_url else ""
-                )
-                result_md = "\n".join([
-                    f"1. {job_id}.zip: {BACKEND_URL}{zip_url}" if zip_url else f"1. {job_id}.zip: (未生成)",
-                    f"2. point_cloud.ply: {BACKEND_URL}{point_cloud_url}" if point_cloud_url else "2. point_cloud.ply: (未找到)",
-                    f"3. cameras.json: {BACKEND_URL}{cameras_url}" if cameras_url else "3. cameras.json: (未找到)",
-                    f"4. {job_id}.log: {log_url}",
-                ])
-                yield final_md, "完成", log_text, result_md, gr.update(visible=True), job_id
+                    raise ConnectionError("stream closed")
                 break
-            yield md, (f"进行中…阶段: {stage}" if stage else "进行中…"), log_text, "尚未完成", gr.update(visible=False), job_id
-            time.sleep(2)
+            except Exception:
+                time.sleep(2)
+
+        log_text = "\n".join(log_cache[-400:])
+        zip_url = js.get("zip_url")
+        point_cloud_url = js.get("point_cloud_url")
+        cameras_url = js.get("cameras_url")
+        final_md = md + (
+            f"\n- 压缩包：{BACKEND_URL}{zip_url}" if zip_url else ""
+        ) + (
+            f"\n- 点云：{BACKEND_URL}{point_cloud_url}" if point_cloud_url else ""
+        ) + (
+            f"\n- 相机：{BACKEND_URL}{cameras_url}" if cameras_url else ""
+        )
+        result_md = "\n".join([
+            f"1. {job_id}.zip: {BACKEND_URL}{zip_url}" if zip_url else f"1. {job_id}.zip: (未生成)",
+            f"2. point_cloud.ply: {BACKEND_URL}{point_cloud_url}" if point_cloud_url else "2. point_cloud.ply: (未找到)",
+            f"3. cameras.json: {BACKEND_URL}{cameras_url}" if cameras_url else "3. cameras.json: (未找到)",
+            f"4. {job_id}.log: {log_url}",
+        ])
+        yield final_md, "完成", log_text, result_md, gr.update(visible=True), job_id
 
     btn.click(
         fn=run_stream,
@@ -17,6 +17,10 @@ class GroupParams:
     pass
 
 class ParamGroup:
+    # Optional help strings and allowed values, by parameter name
+    help_texts = {}
+    choices = {}
+
     def __init__(self, parser: ArgumentParser, name : str, fill_none = False):
         group = parser.add_argument_group(name)
         for key, value in vars(self).items():
@@ -26,16 +30,19 @@ class ParamGroup:
                 key = key[1:]
             t = type(value)
             value = value if not fill_none else None 
+            kwargs = dict(help=self.help_texts.get(key))
+            if t != bool and key in self.choices:
+                kwargs["choices"] = self.choices[key]
             if shorthand:
                 if t == bool:
-                    group.add_argument("--" + key, ("-" + key[0:1]), default=value, action="store_true")
+                    group.add_argument("--" + key, ("-" + key[0:1]), default=value, action="store_true", **kwargs)
                 else:
-                    group.add_argument("--" + key, ("-" + key[0:1]), default=value, type=t)
+                    group.add_argument("--" + key, ("-" + key[0:1]), default=value, type=t, **kwargs)
             else:
                 if t == bool:
-                    group.add_argument("--" + key, default=value, action="store_true")
+                    group.add_argument("--" + key, default=value, action="store_true", **kwargs)
                 else:
-                    group.add_argument("--" + key, default=value, type=t)
+                    group.add_argument("--" + key, default=value, type=t, **kwargs)
 
     def extract(self, args):
         group = GroupParams()
@@ -55,6 +62,13 @@ class ModelParams(ParamGroup):
         self._white_background = False
         self.train_test_exp = False
         self.data_device = "cuda"
+        self.load_workers = 8
+        self.dataset_cache = ""
+        self.compact_data = False
+        self.lazy_images = False
+        self.image_cache_mb = 4096
+        self.prefetch_views = 4
+        self.prefetch_depth = 2
         self.eval = False
         super().__init__(parser, "Loading Parameters", sentinel)
 
@@ -69,9 +83,23 @@ class PipelineParams(ParamGroup):
         self.compute_cov3D_python = False
         self.debug = False
         self.antialiasing = False
+        self.torch_rasterizer = False
         super().__init__(parser, "Pipeline Parameters")
 
 class OptimizationParams(ParamGroup):
+    help_texts = {
+        "features_rest_moments": "Storage type of the Adam moments of the higher-order SH coefficients (f_rest). "
+                                 "Only the moments change: parameters and gradients stay float32. bfloat16 saves "
+                                 "180 of about 730 bytes of parameters plus Adam state per Gaussian, about 25%%. "
+                                 "float16 is not offered (it underflows the squared gradients), nor are 8-bit "
+                                 "moments or reduced-precision parameters (the rasterizer takes float32 SH "
+                                 "coefficients). Any value other than float32 trains with MaskedAdam, as "
+                                 "torch.optim.Adam keeps its moments in the parameter's dtype; without a "
+                                 "visibility mask (--optimizer_type default) its steps update every row, like "
+                                 "torch.optim.Adam.",
+    }
+    choices = {"features_rest_moments": ("float32", "bfloat16")}
+
     def __init__(self, parser):
         self.iterations = 30_000
         self.position_lr_init = 0.00016
@@ -97,6 +125,7 @@ class OptimizationParams(ParamGroup):
         self.depth_l1_weight_final = 0.01
         self.random_background = False
         self.optimizer_type = "default"
+        self.features_rest_moments = "float32"
         super().__init__(parser, "Optimization Parameters")
 
 def get_combined_args(parser : ArgumentParser):
@@ -13,6 +13,7 @@ import os
 import logging
 from argparse import ArgumentParser
 import shutil
+from utils.progress_utils import ProgressWriter
 
 # This Python script is based on the shell converter script provided in the MipNerF 360 repository.
 parser = ArgumentParser("Colmap converter")
@@ -23,15 +24,24 @@ parser.add_argument("--camera", default="OPENCV", type=str)
 parser.add_argument("--colmap_executable", default="", type=str)
 parser.add_argument("--resize", action="store_true")
 parser.add_argument("--magick_executable", default="", type=str)
+parser.add_argument("--progress_file", default="", type=str)
 args = parser.parse_args()
 colmap_command = '"{}"'.format(args.colmap_executable) if len(args.colmap_executable) > 0 else "colmap"
 magick_command = '"{}"'.format(args.magick_executable) if len(args.magick_executable) > 0 else "magick"
 use_gpu = 1 if not args.no_gpu else 0
 
+steps = ([] if args.skip_matching else ["extract", "match", "map"]) + ["undistort"] + (["resize"] if args.resize else [])
+progress = ProgressWriter(args.progress_file)
+def report_step(step, **fields):
+    index = steps.index(step)
+    progress.update(force=True, stage="convert", step=step, step_index=index, steps=len(steps),
+                    percent=round(100.0 * index / len(steps), 1), **fields)
+
 if not args.skip_matching:
     os.makedirs(args.source_path + "/distorted/sparse", exist_ok=True)
 
     ## Feature extraction
+    report_step("extract")
     feat_extracton_cmd = colmap_command + " feature_extractor "\
         "--database_path " + args.source_path + "/distorted/database.db \
         --image_path " + args.source_path + "/input \
@@ -43,6 +53,7 @@ if not args.skip_matching:
         exit(exit_code)
 
     ## Feature matching
+    report_step("match")
     feat_matching_cmd = colmap_command + " exhaustive_matcher \
         --database_path " + args.source_path + "/distorted/database.db"
     exit_code = os.system(feat_matching_cmd)
@@ -53,6 +64,7 @@ if not args.skip_matching:
     ### Bundle adjustment
     # The default Mapper tolerance is unnecessarily large,
     # decreasing it speeds up bundle adjustment steps.
+    report_step("map")
     mapper_cmd = (colmap_command + " mapper \
         --database_path " + args.source_path + "/distorted/database.db \
         --image_path "  + args.source_path + "/input \
@@ -65,6 +77,7 @@ if not args.skip_matching:
 
 ### Image undistortion
 ## We need to undistort our images into ideal pinhole intrinsics.
+report_step("undistort")
 img_undist_cmd = (colmap_command + " image_undistorter \
     --image_path " + args.source_path + "/input \
     --input_path " + args.source_path + "/distorted/sparse/0 \
@@ -94,8 +107,9 @@ if(args.resize):
     os.makedirs(args.source_path + "/images_8", exist_ok=True)
     # Get the list of files in the source directory
     files = os.listdir(args.source_path + "/images")
+    report_step("resize", done_files=0, total_files=len(files))
     # Copy each file from the source directory to the destination directory
-    for file in files:
+    for i, file in enumerate(files):
         source_file = os.path.join(args.source_path, "images", file)
 
         destination_file = os.path.join(args.source_path, "images_2", file)
@@ -118,5 +132,7 @@ if(args.resize):
         if exit_code != 0:
             logging.error(f"12.5% resize failed with code {exit_code}. Exiting.")
             exit(exit_code)
+        progress.update(done_files=i + 1)
 
+progress.update(force=True, stage="convert", step="done", step_index=len(steps), steps=len(steps), percent=100.0)
 print("Done.")
@@ -11,45 +11,64 @@
 
 import torch
 import math
-from diff_gaussian_rasterization import GaussianRasterizationSettings, GaussianRasterizer
+from gaussian_renderer import torch_rasterizer
 from scene.gaussian_model import GaussianModel
 from utils.sh_utils import eval_sh
 
+try:
+    import diff_gaussian_rasterization
+    CUDA_RASTERIZER_AVAILABLE = True
+except ImportError:
+    CUDA_RASTERIZER_AVAILABLE = False
+
 def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor, scaling_modifier = 1.0, separate_sh = False, override_color = None, use_trained_exp=False):
     """
     Render the scene. 
     
-    Background tensor (bg_color) must be on GPU!
+    Background tensor (bg_color) must be on the device of the Gaussians!
+    Uses the PyTorch rasterizer if requested, if the CUDA one is not installed, or if the
+    Gaussians are not on the GPU.
     """
+
+    if pipe.torch_rasterizer or not CUDA_RASTERIZER_AVAILABLE or not pc.get_xyz.is_cuda:
+        backend = torch_rasterizer
+    else:
+        backend = diff_gaussian_rasterization
  
     # Create zero tensor. We will use it to make pytorch return gradients of the 2D (screen-space) means
-    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True, device="cuda") + 0
+    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True, device=pc.get_xyz.device) + 0
     try:
         screenspace_points.retain_grad()
     except:
         pass
 
+    # Camera matrices on the device of the Gaussians (a no-op when they already are)
+    device = pc.get_xyz.device
+    viewmatrix = viewpoint_camera.world_view_transform.to(device)
+    projmatrix = viewpoint_camera.full_proj_transform.to(device)
+    campos = viewpoint_camera.camera_center.to(device)
+
     # Set up rasterization configuration
     tanfovx = math.tan(viewpoint_camera.FoVx * 0.5)
     tanfovy = math.tan(viewpoint_camera.FoVy * 0.5)
 
-    raster_settings = GaussianRasterizationSettings(
+    raster_settings = backend.GaussianRasterizationSettings(
         image_height=int(viewpoint_camera.image_height),
         image_width=int(viewpoint_camera.image_width),
         tanfovx=tanfovx,
         tanfovy=tanfovy,
         bg=bg_color,
         scale_modifier=scaling_modifier,
-        viewmatrix=viewpoint_camera.world_view_transform,
-        projmatrix=viewpoint_camera.full_proj_transform,
+        viewmatrix=viewmatrix,
+        projmatrix=projmatrix,
         sh_degree=pc.active_sh_degree,
-        campos=viewpoint_camera.camera_center,
+        campos=campos,
         prefiltered=False,
         debug=pipe.debug,
         antialiasing=pipe.antialiasing
     )
 
-    rasterizer = GaussianRasterizer(raster_settings=raster_settings)
+    rasterizer = backend.GaussianRasterizer(raster_settings=raster_settings)
 
     means3D = pc.get_xyz
     means2D = screenspace_points
@@ -73,8 +92,8 @@ def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor,
     colors_precomp = None
     if override_color is None:
         if pipe.convert_SHs_python:
-            shs_view = pc.get_features.transpose(1, 2).view(-1, 3, (pc.max_sh_degree+1)**2)
-            dir_pp = (pc.get_xyz - viewpoint_camera.camera_center.repeat(pc.get_features.shape[0], 1))
+            shs_view = pc.get_features.transpose(1, 2).view(-1, 3, pc.get_features.shape[1])
+            dir_pp = (pc.get_xyz - campos.repeat(pc.get_features.shape[0], 1))
             dir_pp_normalized = dir_pp/dir_pp.norm(dim=1, keepdim=True)
             sh2rgb = eval_sh(pc.active_sh_degree, shs_view, dir_pp_normalized)
             colors_precomp = torch.clamp_min(sh2rgb + 0.5, 0.0)
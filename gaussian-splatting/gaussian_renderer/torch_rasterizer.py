@@ -0,0 +1,237 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+from typing import NamedTuple
+import torch
+import torch.nn as nn
+from utils.sh_utils import eval_sh
+
+# Tile size of the CUDA rasterizer
+BLOCK_X = 16
+BLOCK_Y = 16
+# Bound on the elements of the [tiles, pixels, Gaussians] blending tensors of one chunk of tiles
+CHUNK_ELEMENTS = 1 << 22
+
+class GaussianRasterizationSettings(NamedTuple):
+    image_height: int
+    image_width: int
+    tanfovx : float
+    tanfovy : float
+    bg : torch.Tensor
+    scale_modifier : float
+    viewmatrix : torch.Tensor
+    projmatrix : torch.Tensor
+    sh_degree : int
+    campos : torch.Tensor
+    prefiltered : bool
+    debug : bool
+    antialiasing : bool
+
+class GaussianRasterizer(nn.Module):
+    """
+    PyTorch reference implementation of diff_gaussian_rasterization.GaussianRasterizer:
+    same settings, inputs and outputs (color, radii, inverse depth), on any device, with
+    gradients through autograd. It follows the CUDA rasterizer step by step: preprocessing
+    (frustum culling, EWA projection, optional antialiasing filter, screen-space radius and
+    tile rectangle), per-tile depth sorting and front-to-back alpha blending with the same
+    thresholds. Tiles are blended in chunks of at most CHUNK_ELEMENTS pixel/Gaussian pairs.
+    As with the CUDA version, means2D only receives gradients: the gradient of the NDC
+    position of each Gaussian.
+    Meant for previews, thumbnails and tests without a GPU, not for training speed.
+    """
+
+    def __init__(self, raster_settings):
+        super().__init__()
+        self.raster_settings = raster_settings
+
+    def markVisible(self, positions):
+        # Mark visible points (based on frustum culling for camera) with a boolean
+        with torch.no_grad():
+            viewmatrix = self.raster_settings.viewmatrix.to(positions)
+            p_view = _transform_points(positions, viewmatrix)
+            return p_view[:, 2] > 0.2
+
+    def forward(self, means3D, means2D, opacities, shs = None, colors_precomp = None, scales = None, rotations = None, cov3D_precomp = None, dc = None):
+        raster_settings = self.raster_settings
+
+        if ((shs is None and dc is None) and colors_precomp is None) or ((shs is not None or dc is not None) and colors_precomp is not None):
+            raise Exception('Please provide exactly one of either SHs or precomputed colors!')
+
+        if ((scales is None or rotations is None) and cov3D_precomp is None) or ((scales is not None or rotations is not None) and cov3D_precomp is not None):
+            raise Exception('Please provide exactly one of either scale/rotation pair or precomputed 3D covariance!')
+
+        device, dtype = means3D.device, means3D.dtype
+        viewmatrix = raster_settings.viewmatrix.to(device, dtype)
+        projmatrix = raster_settings.projmatrix.to(device, dtype)
+        campos = raster_settings.campos.to(device, dtype)
+        bg = raster_settings.bg.to(device, dtype)
+        H, W = raster_settings.image_height, raster_settings.image_width
+        grid_x, grid_y = (W + BLOCK_X - 1) // BLOCK_X, (H + BLOCK_Y - 1) // BLOCK_Y
+
+        # Preprocessing: projection, 2D covariance, radius and tile rectangle of each Gaussian
+        p_view = _transform_points(means3D, viewmatrix)
+        p_hom = torch.cat((means3D, torch.ones_like(means3D[:, :1])), dim=1) @ projmatrix
+        p_proj = p_hom[:, :3] / (p_hom[:, 3:] + 0.0000001)
+        in_frustum = p_view[:, 2] > 0.2
+
+        if cov3D_precomp is None:
+            cov3D = _covariance_3d(scales * raster_settings.scale_modifier, rotations)
+        else:
+            c = cov3D_precomp
+            cov3D = torch.stack((c[:, 0], c[:, 1], c[:, 2],
+                                 c[:, 1], c[:, 3], c[:, 4],
+                                 c[:, 2], c[:, 4], c[:, 5]), dim=1).view(-1, 3, 3)
+
+        # Keep culled Gaussians away from z = 0 so they produce finite (unused) values
+        safe_view = torch.where(in_frustum[:, None], p_view, torch.ones_like(p_view))
+        cov_a, cov_b, cov_c = _covariance_2d(safe_view, cov3D, viewmatrix, W, H, raster_settings.tanfovx, raster_settings.tanfovy)
+
+        # Low-pass filter of the CUDA rasterizer (every Gaussian covers at least a pixel)
+        h_var = 0.3
+        det_cov = cov_a * cov_c - cov_b * cov_b
+        cov_a = cov_a + h_var
+        cov_c = cov_c + h_var
+        det = cov_a * cov_c - cov_b * cov_b
+        opacity = opacities.view(-1)
+        if raster_settings.antialiasing:
+            opacity = opacity * torch.sqrt(torch.clamp_min(det_cov / det, 0.000025))
+        safe_det = torch.where(det == 0, torch.ones_like(det), det)
+        conic = torch.stack((cov_c / safe_det, -cov_b / safe_det, cov_a / safe_det), dim=1)
+
+        point_image = torch.stack((_ndc2pix(p_proj[:, 0] + means2D[:, 0], W),
+                                   _ndc2pix(p_proj[:, 1] + means2D[:, 1], H)), dim=1)
+
+        with torch.no_grad():
+            mid = 0.5 * (cov_a + cov_c)
+            lambda_max = mid + torch.sqrt(torch.clamp_min(mid * mid - det, 0.1))
+            radius = torch.ceil(3.0 * torch.sqrt(lambda_max))
+            rect_min_x = torch.floor((point_image[:, 0] - radius) / BLOCK_X).clamp(0, grid_x).long()
+            rect_min_y = torch.floor((point_image[:, 1] - radius) / BLOCK_Y).clamp(0, grid_y).long()
+            rect_max_x = torch.floor((point_image[:, 0] + radius + BLOCK_X - 1) / BLOCK_X).clamp(0, grid_x).long()
+            rect_max_y = torch.floor((point_image[:, 1] + radius + BLOCK_Y - 1) / BLOCK_Y).clamp(0, grid_y).long()
+            visible = in_frustum & (det != 0) & ((rect_max_x - rect_min_x) * (rect_max_y - rect_min_y) > 0)
+            radii = torch.where(visible, radius, torch.zeros_like(radius)).int()
+
+        if colors_precomp is None:
+            sh = shs if dc is None else (dc if shs is None else torch.cat((dc, shs), dim=1))
+            dirs = means3D - campos
+            dirs = dirs / dirs.norm(dim=1, keepdim=True)
+            colors = torch.clamp_min(eval_sh(raster_settings.sh_degree, sh.transpose(1, 2), dirs) + 0.5, 0.0)
+        else:
+            colors = colors_precomp
+
+        # Duplicate each visible Gaussian for every tile its rectangle touches, sorted by tile then depth
+        with torch.no_grad():
+            idx = visible.nonzero().squeeze(1)
+            span_x = (rect_max_x - rect_min_x)[idx]
+            counts = span_x * (rect_max_y - rect_min_y)[idx]
+            gauss = idx.repeat_interleave(counts)
+            owner = torch.arange(idx.shape[0], device=device).repeat_interleave(counts)
+            local = torch.arange(gauss.shape[0], device=device) - (torch.cumsum(counts, 0) - counts)[owner]
+            tile = (rect_min_y[idx][owner] + local // span_x[owner]) * grid_x + rect_min_x[idx][owner] + local % span_x[owner]
+            by_depth = torch.sort(p_view[gauss, 2], stable=True).indices
+            by_tile = torch.sort(tile[by_depth], stable=True).indices
+            gauss = gauss[by_depth[by_tile]]
+            tile_counts = torch.bincount(tile, minlength=grid_x * grid_y)
+            tile_starts = torch.cumsum(tile_counts, 0) - tile_counts
+
+        inv_depth = 1.0 / p_view[:, 2:3]
+        features = torch.cat((colors, inv_depth), dim=1)
+        blended = []
+        for start, end in _tile_chunks(tile_counts.tolist()):
+            blended.append(self._blend_tiles(start, end, grid_x, gauss, tile_counts, tile_starts, point_image, conic, opacity, features, bg))
+        blended = torch.cat(blended, dim=0)
+
+        # [tiles, pixels, channels] to [channels, height, width]
+        channels = blended.shape[-1]
+        image = blended.view(grid_y, grid_x, BLOCK_Y, BLOCK_X, channels).permute(4, 0, 2, 1, 3)
+        image = image.reshape(channels, grid_y * BLOCK_Y, grid_x * BLOCK_X)[:, :H, :W]
+        return image[:-1], radii, image[-1:]
+
+    @staticmethod
+    def _blend_tiles(start, end, grid_x, gauss, tile_counts, tile_starts, point_image, conic, opacity, features, bg):
+        device = point_image.device
+        tiles = torch.arange(start, end, device=device)
+        counts = tile_counts[start:end]
+        K = int(counts.max()) if end > start else 0
+
+        pixel = torch.arange(BLOCK_X * BLOCK_Y, device=device)
+        pix_x = ((tiles % grid_x) * BLOCK_X)[:, None] + pixel % BLOCK_X
+        pix_y = ((tiles // grid_x) * BLOCK_Y)[:, None] + pixel // BLOCK_X
+        if K == 0:
+            color = bg.expand(tiles.shape[0], pixel.shape[0], -1)
+            return torch.cat((color, torch.zeros_like(color[..., :1])), dim=-1)
+
+        slot = torch.arange(K, device=device)
+        present = slot < counts[:, None]
+        g = gauss[(tile_starts[start:end, None] + slot).clamp(max=gauss.shape[0] - 1)]
+
+        xy, con = point_image[g], conic[g]
+        d_x = xy[:, None, :, 0] - pix_x[:, :, None].to(xy.dtype)
+        d_y = xy[:, None, :, 1] - pix_y[:, :, None].to(xy.dtype)
+        power = -0.5 * (con[:, None, :, 0] * d_x * d_x + con[:, None, :, 2] * d_y * d_y) - con[:, None, :, 1] * d_x * d_y
+        alpha = torch.clamp_max(opacity[g][:, None, :] * torch.exp(torch.clamp_max(power, 0.0)), 0.99)
+        skip = (power > 0) | (alpha < 1.0 / 255.0) | ~present[:, None, :]
+        alpha = torch.where(skip, torch.zeros_like(alpha), alpha)
+
+        # A pixel stops at the first Gaussian that would take its transmittance below 1e-4
+        with torch.no_grad():
+            done = torch.cumprod(1 - alpha, dim=-1) < 0.0001
+        alpha = torch.where(done, torch.zeros_like(alpha), alpha)
+        transmittance = torch.cumprod(1 - alpha, dim=-1)
+        weights = alpha * torch.cat((torch.ones_like(transmittance[..., :1]), transmittance[..., :-1]), dim=-1)
+
+        blended = torch.einsum("tpk,tkc->tpc", weights, features[g])
+        color = blended[..., :-1] + transmittance[..., -1:] * bg
+        return torch.cat((color, blended[..., -1:]), dim=-1)
+
+def _tile_chunks(tile_counts):
+    """Ranges of consecutive tiles whose padded [tiles, pixels, Gaussians] tensors stay within CHUNK_ELEMENTS."""
+    pixels = BLOCK_X * BLOCK_Y
+    start, widest = 0, 0
+    for i, count in enumerate(tile_counts):
+        widest_with = max(widest, count)
+        if i > start and (i - start + 1) * pixels * widest_with > CHUNK_ELEMENTS:
+            yield start, i
+            start, widest_with = i, count
+        widest = widest_with
+    if start < len(tile_counts):
+        yield start, len(tile_counts)
+
+def _transform_points(points, matrix):
+    # Row vectors times the transposed 4x4 matrices stored by the cameras
+    return points @ matrix[:3, :3] + matrix[3, :3]
+
+def _ndc2pix(v, S):
+    return ((v + 1.0) * S - 1.0) * 0.5
+
+def _covariance_3d(scales, rotations):
+    r, x, y, z = rotations.unbind(dim=1)
+    R = torch.stack((1 - 2 * (y * y + z * z), 2 * (x * y - r * z), 2 * (x * z + r * y),
+                     2 * (x * y + r * z), 1 - 2 * (x * x + z * z), 2 * (y * z - r * x),
+                     2 * (x * z - r * y), 2 * (y * z + r * x), 1 - 2 * (x * x + y * y)), dim=1).view(-1, 3, 3)
+    M = R * scales[:, None, :]
+    return M @ M.transpose(1, 2)
+
+def _covariance_2d(p_view, cov3D, viewmatrix, width, height, tanfovx, tanfovy):
+    """Upper triangle (a, b, c) of the screen-space covariance J W Sigma W^T J^T."""
+    focal_x = width / (2.0 * tanfovx)
+    focal_y = height / (2.0 * tanfovy)
+    limx, limy = 1.3 * tanfovx, 1.3 * tanfovy
+    tz = p_view[:, 2]
+    tx = torch.clamp(p_view[:, 0] / tz, -limx, limx) * tz
+    ty = torch.clamp(p_view[:, 1] / tz, -limy, limy) * tz
+    zeros = torch.zeros_like(tz)
+    J = torch.stack((focal_x / tz, zeros, -(focal_x * tx) / (tz * tz),
+                     zeros, focal_y / tz, -(focal_y * ty) / (tz * tz)), dim=1).view(-1, 2, 3)
+    T = J @ viewmatrix[:3, :3].transpose(0, 1)
+    cov = T @ cov3D @ T.transpose(1, 2)
+    return cov[:, 0, 0], cov[:, 0, 1], cov[:, 1, 1]
@@ -75,8 +75,8 @@ def render_video(model_path, iteration, views, gaussians, pipeline, background,
     # 渲染每一帧
     for idx, pose in enumerate(tqdm(render_poses, desc="Rendering video")):
         # 更新视图的变换矩阵
-        view.world_view_transform = torch.tensor(getWorld2View2(pose[:3, :3].T, pose[:3, 3], view.trans, view.scale)).transpose(0, 1).cuda()
-        view.full_proj_transform = (view.world_view_transform.unsqueeze(0).bmm(view.projection_matrix.unsqueeze(0))).squeeze(0)
+        view.world_view_transform = torch.tensor(getWorld2View2(pose[:3, :3].T, pose[:3, 3], view.trans, view.scale)).transpose(0, 1).to(gaussians.get_xyz.device)
+        view.full_proj_transform = (view.world_view_transform.unsqueeze(0).bmm(view.projection_matrix.to(gaussians.get_xyz.device).unsqueeze(0))).squeeze(0)
         view.camera_center = view.world_view_transform.inverse()[3, :3]
         
         # 渲染当前视角
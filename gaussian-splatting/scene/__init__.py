@@ -17,6 +17,8 @@ from scene.dataset_readers import sceneLoadTypeCallbacks
 from scene.gaussian_model import GaussianModel
 from arguments import ModelParams
 from utils.camera_utils import cameraList_from_camInfos, camera_to_JSON
+from utils.image_cache import ImageCache
+from utils.dataset_cache import DatasetCache
 
 class Scene:
 
@@ -68,11 +70,15 @@ class Scene:
 
         self.cameras_extent = scene_info.nerf_normalization["radius"]
 
+        # Lazy cameras share one cache, so resident image memory is bounded by its budget
+        self.image_cache = ImageCache(args.image_cache_mb * 1024 * 1024) if args.lazy_images else None
+        dataset_cache = DatasetCache(args.dataset_cache) if args.dataset_cache else None
+
         for resolution_scale in resolution_scales:
             print("Loading Training Cameras")
-            self.train_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.train_cameras, resolution_scale, args, scene_info.is_nerf_synthetic, False)
+            self.train_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.train_cameras, resolution_scale, args, scene_info.is_nerf_synthetic, False, self.image_cache, dataset_cache)
             print("Loading Test Cameras")
-            self.test_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.test_cameras, resolution_scale, args, scene_info.is_nerf_synthetic, True)
+            self.test_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.test_cameras, resolution_scale, args, scene_info.is_nerf_synthetic, True, self.image_cache, dataset_cache)
 
         if self.loaded_iter:
             self.gaussians.load_ply(os.path.join(self.model_path,
@@ -13,15 +13,29 @@ import torch
 from torch import nn
 import numpy as np
 from utils.graphics_utils import getWorld2View2, getProjectionMatrix
-from utils.general_utils import PILtoTorch
+from utils.general_utils import PILtoTorch, ImageArrayToTorch
 import cv2
 
+def _to_unit_float(image):
+    # Divide by a tensor on the same device: CUDA turns division by a Python scalar into a
+    # multiplication by its reciprocal, which would not be bit-identical to PILtoTorch on the CPU
+    return image / torch.tensor(255.0, device=image.device)
+
 class Camera(nn.Module):
     def __init__(self, resolution, colmap_id, R, T, FoVx, FoVy, depth_params, image, invdepthmap,
                  image_name, uid,
                  trans=np.array([0.0, 0.0, 0.0]), scale=1.0, data_device = "cuda",
-                 train_test_exp = False, is_test_dataset = False, is_test_view = False
+                 train_test_exp = False, is_test_dataset = False, is_test_view = False,
+                 image_loader = None, image_cache = None, has_depth = False, compact_data = False
                  ):
+        """
+        With an image_cache, the camera is lazy: image and invdepthmap are ignored, and
+        original_image / alpha_mask / invdepthmap / depth_mask are built on first access
+        from image_loader() -> (image, invdepthmap) and kept in the shared cache.
+        has_depth tells a lazy camera whether image_loader returns a depth map.
+        With compact_data, the image and alpha mask are kept as 8-bit integers and
+        converted to float by the original_image / alpha_mask properties.
+        """
         super(Camera, self).__init__()
 
         self.uid = uid
@@ -31,6 +45,12 @@ class Camera(nn.Module):
         self.FoVx = FoVx
         self.FoVy = FoVy
         self.image_name = image_name
+        self.resolution = resolution
+        self.depth_params = depth_params
+        self.train_test_exp = train_test_exp
+        self.is_test_dataset = is_test_dataset
+        self.is_test_view = is_test_view
+        self.compact_data = compact_data
 
         try:
             self.data_device = torch.device(data_device)
@@ -39,43 +59,22 @@ class Camera(nn.Module):
             print(f"[Warning] Custom device {data_device} failed, fallback to default cuda device" )
             self.data_device = torch.device("cuda")
 
-        resized_image_rgb = PILtoTorch(image, resolution)
-        gt_image = resized_image_rgb[:3, ...]
-        self.alpha_mask = None
-        if resized_image_rgb.shape[0] == 4:
-            self.alpha_mask = resized_image_rgb[3:4, ...].to(self.data_device)
-        else: 
-            self.alpha_mask = torch.ones_like(resized_image_rgb[0:1, ...].to(self.data_device))
+        if image_cache is None:
+            has_depth = invdepthmap is not None
+        self.depth_reliable = has_depth
+        if has_depth and depth_params is not None:
+            if depth_params["scale"] < 0.2 * depth_params["med_scale"] or depth_params["scale"] > 5 * depth_params["med_scale"]:
+                self.depth_reliable = False
 
-        if train_test_exp and is_test_view:
-            if is_test_dataset:
-                self.alpha_mask[..., :self.alpha_mask.shape[-1] // 2] = 0
-            else:
-                self.alpha_mask[..., self.alpha_mask.shape[-1] // 2:] = 0
-
-        self.original_image = gt_image.clamp(0.0, 1.0).to(self.data_device)
-        self.image_width = self.original_image.shape[2]
-        self.image_height = self.original_image.shape[1]
-
-        self.invdepthmap = None
-        self.depth_reliable = False
-        if invdepthmap is not None:
-            self.depth_mask = torch.ones_like(self.alpha_mask)
-            self.invdepthmap = cv2.resize(invdepthmap, resolution)
-            self.invdepthmap[self.invdepthmap < 0] = 0
-            self.depth_reliable = True
-
-            if depth_params is not None:
-                if depth_params["scale"] < 0.2 * depth_params["med_scale"] or depth_params["scale"] > 5 * depth_params["med_scale"]:
-                    self.depth_reliable = False
-                    self.depth_mask *= 0
-                
-                if depth_params["scale"] > 0:
-                    self.invdepthmap = self.invdepthmap * depth_params["scale"] + depth_params["offset"]
-
-            if self.invdepthmap.ndim != 2:
-                self.invdepthmap = self.invdepthmap[..., 0]
-            self.invdepthmap = torch.from_numpy(self.invdepthmap[None]).to(self.data_device)
+        self.image_loader = image_loader
+        self.image_cache = image_cache
+        if image_cache is None:
+            self._tensors = self._prepare_data(image, invdepthmap)
+            self.image_width = self._tensors["original_image"].shape[2]
+            self.image_height = self._tensors["original_image"].shape[1]
+        else:
+            # PILtoTorch resizes to exactly this size
+            self.image_width, self.image_height = resolution
 
         self.zfar = 100.0
         self.znear = 0.01
@@ -83,10 +82,96 @@ class Camera(nn.Module):
         self.trans = trans
         self.scale = scale
 
-        self.world_view_transform = torch.tensor(getWorld2View2(R, T, trans, scale)).transpose(0, 1).cuda()
-        self.projection_matrix = getProjectionMatrix(znear=self.znear, zfar=self.zfar, fovX=self.FoVx, fovY=self.FoVy).transpose(0,1).cuda()
+        # The matrices go to the render device, not data_device: images may be kept on the
+        # CPU (--data_device cpu) while the CUDA rasterizer renders
+        render_device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.world_view_transform = torch.tensor(getWorld2View2(R, T, trans, scale)).transpose(0, 1).to(render_device)
+        self.projection_matrix = getProjectionMatrix(znear=self.znear, zfar=self.zfar, fovX=self.FoVx, fovY=self.FoVy).transpose(0,1).to(render_device)
         self.full_proj_transform = (self.world_view_transform.unsqueeze(0).bmm(self.projection_matrix.unsqueeze(0))).squeeze(0)
         self.camera_center = self.world_view_transform.inverse()[3, :3]
+
+    def _prepare_data(self, image, invdepthmap):
+        if isinstance(image, np.ndarray):
+            # Already resized by the dataset cache
+            resized_image_rgb = ImageArrayToTorch(image, normalize=not self.compact_data)
+        else:
+            resized_image_rgb = PILtoTorch(image, self.resolution, normalize=not self.compact_data)
+        gt_image = resized_image_rgb[:3, ...]
+        if resized_image_rgb.shape[0] == 4:
+            alpha_mask = resized_image_rgb[3:4, ...].to(self.data_device)
+        elif self.compact_data:
+            alpha_mask = torch.full_like(resized_image_rgb[0:1, ...].to(self.data_device), 255)
+        else: 
+            alpha_mask = torch.ones_like(resized_image_rgb[0:1, ...].to(self.data_device))
+
+        if self.train_test_exp and self.is_test_view:
+            if self.is_test_dataset:
+                alpha_mask[..., :alpha_mask.shape[-1] // 2] = 0
+            else:
+                alpha_mask[..., alpha_mask.shape[-1] // 2:] = 0
+
+        data = {
+            "original_image": gt_image.to(self.data_device) if self.compact_data else gt_image.clamp(0.0, 1.0).to(self.data_device),
+            "alpha_mask": alpha_mask,
+            "invdepthmap": None,
+            "depth_mask": None,
+        }
+        if invdepthmap is not None:
+            depth_mask = torch.ones_like(alpha_mask, dtype=torch.float32)
+            invdepthmap = cv2.resize(invdepthmap, self.resolution)
+            invdepthmap[invdepthmap < 0] = 0
+
+            if self.depth_params is not None:
+                if not self.depth_reliable:
+                    depth_mask *= 0
+                if self.depth_params["scale"] > 0:
+                    invdepthmap = invdepthmap * self.depth_params["scale"] + self.depth_params["offset"]
+
+            if invdepthmap.ndim != 2:
+                invdepthmap = invdepthmap[..., 0]
+            data["invdepthmap"] = torch.from_numpy(invdepthmap[None]).to(self.data_device)
+            data["depth_mask"] = depth_mask
+        return data
+
+    def _load_data(self):
+        image, invdepthmap = self.image_loader()
+        return self._prepare_data(image, invdepthmap)
+
+    def load_data(self):
+        """Return the tensors of this view, decoding them if a lazy camera is not cached."""
+        if self.image_cache is None:
+            return self._tensors
+        return self.image_cache.get(self, self._load_data)
+
+    def as_float(self, name, tensor):
+        """
+        The value of the property `name` from the stored tensor of the same name (a
+        load_data() entry), computed on the tensor's device: compact cameras store the
+        image and alpha mask as 8-bit integers, so they can be moved before conversion.
+        """
+        if not self.compact_data or tensor is None:
+            return tensor
+        if name == "original_image":
+            return _to_unit_float(tensor).clamp(0.0, 1.0)
+        if name == "alpha_mask":
+            return _to_unit_float(tensor)
+        return tensor
+
+    @property
+    def original_image(self):
+        return self.as_float("original_image", self.load_data()["original_image"])
+
+    @property
+    def alpha_mask(self):
+        return self.as_float("alpha_mask", self.load_data()["alpha_mask"])
+
+    @property
+    def invdepthmap(self):
+        return self.load_data()["invdepthmap"]
+
+    @property
+    def depth_mask(self):
+        return self.load_data()["depth_mask"]
         
 class MiniCam:
     def __init__(self, width, height, fovy, fovx, znear, zfar, world_view_transform, full_proj_transform):
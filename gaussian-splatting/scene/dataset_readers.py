@@ -20,6 +20,7 @@ import numpy as np
 import json
 from pathlib import Path
 from plyfile import PlyData, PlyElement
+from utils.ply_utils import ply_dtype, read_ply, write_ply
 from utils.sh_utils import SH2RGB
 from scene.gaussian_model import BasicPointCloud
 
@@ -118,8 +119,10 @@ def readColmapCameras(cam_extrinsics, cam_intrinsics, depths_params, images_fold
     return cam_infos
 
 def fetchPly(path):
-    plydata = PlyData.read(path)
-    vertices = plydata['vertex']
+    try:
+        vertices = read_ply(path)
+    except ValueError:
+        vertices = PlyData.read(path)['vertex'].data
     positions = np.vstack([vertices['x'], vertices['y'], vertices['z']]).T
     colors = np.vstack([vertices['red'], vertices['green'], vertices['blue']]).T / 255.0
     normals = np.vstack([vertices['nx'], vertices['ny'], vertices['nz']]).T
@@ -127,20 +130,18 @@ def fetchPly(path):
 
 def storePly(path, xyz, rgb):
     # Define the dtype for the structured array
-    dtype = [('x', 'f4'), ('y', 'f4'), ('z', 'f4'),
-            ('nx', 'f4'), ('ny', 'f4'), ('nz', 'f4'),
-            ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
-    
-    normals = np.zeros_like(xyz)
-
-    elements = np.empty(xyz.shape[0], dtype=dtype)
-    attributes = np.concatenate((xyz, normals, rgb), axis=1)
-    elements[:] = list(map(tuple, attributes))
-
-    # Create the PlyData object and write to file
-    vertex_element = PlyElement.describe(elements, 'vertex')
-    ply_data = PlyData([vertex_element])
-    ply_data.write(path)
+    properties = [('x', 'f4'), ('y', 'f4'), ('z', 'f4'),
+                  ('nx', 'f4'), ('ny', 'f4'), ('nz', 'f4'),
+                  ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+
+    # Fill the structured array column by column (normals stay zero)
+    elements = np.zeros(xyz.shape[0], dtype=ply_dtype(properties))
+    for i, name in enumerate(('x', 'y', 'z')):
+        elements[name] = xyz[:, i]
+    for i, name in enumerate(('red', 'green', 'blue')):
+        elements[name] = rgb[:, i]
+
+    write_ply(path, properties, xyz.shape[0], [elements])
 
 def readColmapSceneInfo(path, images, depths, eval, train_test_exp, llffhold=8):
     try:
@@ -16,11 +16,12 @@ from torch import nn
 import os
 import json
 from utils.system_utils import mkdir_p
-from plyfile import PlyData, PlyElement
+from utils.ply_utils import write_ply, load_gaussian_arrays, CHUNK_ROWS
 from utils.sh_utils import RGB2SH
-from simple_knn._C import distCUDA2
 from utils.graphics_utils import BasicPointCloud
 from utils.general_utils import strip_symmetric, build_scaling_rotation
+from scene.gaussian_store import GaussianStore, owned_tensor
+from utils.masked_adam import MaskedAdam
 
 try:
     from diff_gaussian_rasterization import SparseGaussianAdam
@@ -61,23 +62,29 @@ class GaussianModel:
         self.xyz_gradient_accum = torch.empty(0)
         self.denom = torch.empty(0)
         self.optimizer = None
+        self.store = None
         self.percent_dense = 0
         self.spatial_lr_scale = 0
+        self._activation_cache = {}
+        self.activation_cache_stats = {"hits": 0, "misses": 0}
         self.setup_functions()
 
     def capture(self):
+        # Parameters and moments may be views into capacity buffers; save only their rows
+        opt_dict = self.optimizer.state_dict()
+        opt_dict["state"] = {k: {f: owned_tensor(v) for f, v in state.items()} for k, state in opt_dict["state"].items()}
         return (
             self.active_sh_degree,
-            self._xyz,
-            self._features_dc,
-            self._features_rest,
-            self._scaling,
-            self._rotation,
-            self._opacity,
+            owned_tensor(self._xyz),
+            owned_tensor(self._features_dc),
+            owned_tensor(self._features_rest),
+            owned_tensor(self._scaling),
+            owned_tensor(self._rotation),
+            owned_tensor(self._opacity),
             self.max_radii2D,
             self.xyz_gradient_accum,
             self.denom,
-            self.optimizer.state_dict(),
+            opt_dict,
             self.spatial_lr_scale,
         )
     
@@ -97,15 +104,59 @@ class GaussianModel:
         self.training_setup(training_args)
         self.xyz_gradient_accum = xyz_gradient_accum
         self.denom = denom
+        moment_dtypes = [group.get("moment_dtype") for group in self.optimizer.param_groups]
         self.optimizer.load_state_dict(opt_dict)
+        # Moment storage follows the current settings, not the ones of the checkpoint
+        for group, moment_dtype in zip(self.optimizer.param_groups, moment_dtypes):
+            group["moment_dtype"] = moment_dtype
+        if not isinstance(self.optimizer, MaskedAdam):
+            # Per-row step counts of a MaskedAdam checkpoint
+            for state in self.optimizer.state.values():
+                if torch.is_tensor(state.get("step")) and state["step"].dim() > 0:
+                    state["step"] = state["step"].max().cpu()
+        # Checkpoints written with a zero-width _features_rest at degree 0
+        self._grow_sh_bands()
+
+    def _activated(self, name, params, activation):
+        """
+        activation(*params), computed once per parameter change: an entry is reused while the
+        parameters are the same objects with the same version counters (every in-place update,
+        e.g. an optimizer step, bumps them). A value computed with autograd serves gradient
+        computations only until a backward pass has gone through its graph; it keeps serving
+        no_grad code (densification) after that.
+        """
+        versions = tuple(p._version for p in params)
+        needs_graph = torch.is_grad_enabled() and any(p.requires_grad for p in params)
+        entry = self._activation_cache.get(name)
+        if (entry is not None and entry[1] == versions and all(a is b for a, b in zip(entry[0], params))
+                and (entry[3] or not needs_graph)):
+            self.activation_cache_stats["hits"] += 1
+            return entry[2]
+
+        self.activation_cache_stats["misses"] += 1
+        value = activation(*params)
+        if value.requires_grad:
+            # The hook only refers to the cache, so a replaced entry is freed right away
+            cache, value_id = self._activation_cache, id(value)
+            def on_backward(grad):
+                current = cache.get(name)
+                if current is not None and id(current[2]) == value_id:
+                    current[3] = False
+            value.register_hook(on_backward)
+        self._activation_cache[name] = [params, versions, value, value.requires_grad]
+        return value
+
+    def invalidate_activations(self):
+        """Drop the cached activations, for parameter writes that bypass the version counters (custom kernels)."""
+        self._activation_cache.clear()
 
     @property
     def get_scaling(self):
-        return self.scaling_activation(self._scaling)
+        return self._activated("scaling", (self._scaling,), self.scaling_activation)
     
     @property
     def get_rotation(self):
-        return self.rotation_activation(self._rotation)
+        return self._activated("rotation", (self._rotation,), self.rotation_activation)
     
     @property
     def get_xyz(self):
@@ -113,9 +164,7 @@ class GaussianModel:
     
     @property
     def get_features(self):
-        features_dc = self._features_dc
-        features_rest = self._features_rest
-        return torch.cat((features_dc, features_rest), dim=1)
+        return self._activated("features", (self._features_dc, self._features_rest), lambda dc, rest: torch.cat((dc, rest), dim=1))
     
     @property
     def get_features_dc(self):
@@ -127,7 +176,7 @@ class GaussianModel:
     
     @property
     def get_opacity(self):
-        return self.opacity_activation(self._opacity)
+        return self._activated("opacity", (self._opacity,), self.opacity_activation)
     
     @property
     def get_exposure(self):
@@ -145,6 +194,28 @@ class GaussianModel:
     def oneupSHdegree(self):
         if self.active_sh_degree < self.max_sh_degree:
             self.active_sh_degree += 1
+            self._grow_sh_bands()
+
+    def _sh_rest_size(self):
+        # Band 1 is always allocated (if max_sh_degree has it): at degree 0 the tensor would
+        # otherwise be (N, 0, 3), which the rasterizer and the optimizer paths do not expect
+        degree = min(max(self.active_sh_degree, 1), self.max_sh_degree)
+        return (degree + 1) ** 2 - 1
+
+    def _grow_sh_bands(self):
+        # _features_rest only stores the bands up to active_sh_degree. The inactive bands of
+        # a full-size tensor get no gradient, so they and their moments would stay zero until
+        # activated: adding them as zeros now gives the same training.
+        size = self._sh_rest_size()
+        if self._features_rest.shape[1] >= size:
+            return
+        if self.store is not None:
+            self._features_rest = self.store.widen("f_rest", size)["f_rest"]
+        else:
+            with torch.no_grad():
+                features_rest = torch.zeros((self._features_rest.shape[0], size, 3), dtype=self._features_rest.dtype, device=self._features_rest.device)
+                features_rest[:, :self._features_rest.shape[1]] = self._features_rest
+            self._features_rest = nn.Parameter(features_rest.requires_grad_(True))
 
     def create_from_pcd(self, pcd : BasicPointCloud, cam_infos : int, spatial_lr_scale : float):
         self.spatial_lr_scale = spatial_lr_scale
@@ -156,6 +227,8 @@ class GaussianModel:
 
         print("Number of points at initialisation : ", fused_point_cloud.shape[0])
 
+        # Imported here so that the model (and the renderer) can be used without the CUDA extensions
+        from simple_knn._C import distCUDA2
         dist2 = torch.clamp_min(distCUDA2(torch.from_numpy(np.asarray(pcd.points)).float().cuda()), 0.0000001)
         scales = torch.log(torch.sqrt(dist2))[...,None].repeat(1, 3)
         rots = torch.zeros((fused_point_cloud.shape[0], 4), device="cuda")
@@ -165,7 +238,8 @@ class GaussianModel:
 
         self._xyz = nn.Parameter(fused_point_cloud.requires_grad_(True))
         self._features_dc = nn.Parameter(features[:,:,0:1].transpose(1, 2).contiguous().requires_grad_(True))
-        self._features_rest = nn.Parameter(features[:,:,1:].transpose(1, 2).contiguous().requires_grad_(True))
+        # Higher SH bands are added as the active degree grows (see oneupSHdegree)
+        self._features_rest = nn.Parameter(features[:,:,1:self._sh_rest_size() + 1].transpose(1, 2).contiguous().requires_grad_(True))
         self._scaling = nn.Parameter(scales.requires_grad_(True))
         self._rotation = nn.Parameter(rots.requires_grad_(True))
         self._opacity = nn.Parameter(opacities.requires_grad_(True))
@@ -177,8 +251,8 @@ class GaussianModel:
 
     def training_setup(self, training_args):
         self.percent_dense = training_args.percent_dense
-        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
+        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device=self.get_xyz.device)
+        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device=self.get_xyz.device)
 
         l = [
             {'params': [self._xyz], 'lr': training_args.position_lr_init * self.spatial_lr_scale, "name": "xyz"},
@@ -189,14 +263,31 @@ class GaussianModel:
             {'params': [self._rotation], 'lr': training_args.rotation_lr, "name": "rotation"}
         ]
 
-        if self.optimizer_type == "default":
+        if training_args.features_rest_moments not in ("float32", "bfloat16"):
+            raise ValueError("features_rest_moments must be float32 or bfloat16 (float16 underflows the squared "
+                             "gradients), got {}".format(training_args.features_rest_moments))
+        if training_args.features_rest_moments != "float32":
+            # Adam moments of the SH rest coefficients in bfloat16. torch.optim.Adam keeps its
+            # moments in the parameter's dtype, so MaskedAdam runs instead, also for the default
+            # path, whose unmasked steps update every row like torch.optim.Adam.
+            l[2]["moment_dtype"] = getattr(torch, training_args.features_rest_moments)
+            self.optimizer = MaskedAdam(l, lr=0.0, eps=1e-15)
+            if self.optimizer_type != "masked_adam":
+                print("features_rest_moments {}: training with MaskedAdam instead of the {} optimizer".format(
+                    training_args.features_rest_moments, self.optimizer_type))
+        elif self.optimizer_type == "default":
             self.optimizer = torch.optim.Adam(l, lr=0.0, eps=1e-15)
         elif self.optimizer_type == "sparse_adam":
             try:
                 self.optimizer = SparseGaussianAdam(l, lr=0.0, eps=1e-15)
             except:
-                # A special version of the rasterizer is required to enable sparse adam
-                self.optimizer = torch.optim.Adam(l, lr=0.0, eps=1e-15)
+                # A special version of the rasterizer is required for its fused sparse adam;
+                # without it the same masked update runs in plain PyTorch
+                self.optimizer = MaskedAdam(l, lr=0.0, eps=1e-15)
+        elif self.optimizer_type == "masked_adam":
+            self.optimizer = MaskedAdam(l, lr=0.0, eps=1e-15)
+
+        self.store = GaussianStore(self.optimizer)
 
         self.exposure_optimizer = torch.optim.Adam([self._exposure])
 
@@ -227,7 +318,8 @@ class GaussianModel:
         # All channels except the 3 DC
         for i in range(self._features_dc.shape[1]*self._features_dc.shape[2]):
             l.append('f_dc_{}'.format(i))
-        for i in range(self._features_rest.shape[1]*self._features_rest.shape[2]):
+        # Always the coefficients of max_sh_degree, bands that are not allocated yet are written as zeros
+        for i in range(((self.max_sh_degree + 1) ** 2 - 1) * self._features_rest.shape[2]):
             l.append('f_rest_{}'.format(i))
         l.append('opacity')
         for i in range(self._scaling.shape[1]):
@@ -239,21 +331,27 @@ class GaussianModel:
     def save_ply(self, path):
         mkdir_p(os.path.dirname(path))
 
-        xyz = self._xyz.detach().cpu().numpy()
-        normals = np.zeros_like(xyz)
-        f_dc = self._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        f_rest = self._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        opacities = self._opacity.detach().cpu().numpy()
-        scale = self._scaling.detach().cpu().numpy()
-        rotation = self._rotation.detach().cpu().numpy()
-
-        dtype_full = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
-
-        elements = np.empty(xyz.shape[0], dtype=dtype_full)
-        attributes = np.concatenate((xyz, normals, f_dc, f_rest, opacities, scale, rotation), axis=1)
-        elements[:] = list(map(tuple, attributes))
-        el = PlyElement.describe(elements, 'vertex')
-        PlyData([el]).write(path)
+        num_points = self._xyz.shape[0]
+        properties = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
+        sh_padding = (self.max_sh_degree + 1) ** 2 - 1 - self._features_rest.shape[1]
+
+        # Stream the body in row blocks assembled on the device: one float32 copy per block
+        # instead of a Python tuple per Gaussian
+        def blocks():
+            with torch.no_grad():
+                for start in range(0, num_points, CHUNK_ROWS):
+                    end = min(start + CHUNK_ROWS, num_points)
+                    xyz = self._xyz[start:end]
+                    rows = torch.cat((xyz,
+                                      torch.zeros_like(xyz),
+                                      self._features_dc[start:end].transpose(1, 2).flatten(start_dim=1),
+                                      nn.functional.pad(self._features_rest[start:end].transpose(1, 2), (0, sh_padding)).flatten(start_dim=1),
+                                      self._opacity[start:end],
+                                      self._scaling[start:end],
+                                      self._rotation[start:end]), dim=1)
+                    yield rows.float().cpu().numpy()
+
+        write_ply(path, properties, num_points, blocks())
 
     def reset_opacity(self):
         opacities_new = self.inverse_opacity_activation(torch.min(self.get_opacity, torch.ones_like(self.get_opacity)*0.01))
@@ -261,7 +359,6 @@ class GaussianModel:
         self._opacity = optimizable_tensors["opacity"]
 
     def load_ply(self, path, use_train_test_exp = False):
-        plydata = PlyData.read(path)
         if use_train_test_exp:
             exposure_file = os.path.join(os.path.dirname(path), os.pardir, os.pardir, "exposure.json")
             if os.path.exists(exposure_file):
@@ -273,78 +370,28 @@ class GaussianModel:
                 print(f"No exposure to be loaded at {exposure_file}")
                 self.pretrained_exposures = None
 
-        xyz = np.stack((np.asarray(plydata.elements[0]["x"]),
-                        np.asarray(plydata.elements[0]["y"]),
-                        np.asarray(plydata.elements[0]["z"])),  axis=1)
-        opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
-
-        features_dc = np.zeros((xyz.shape[0], 3, 1))
-        features_dc[:, 0, 0] = np.asarray(plydata.elements[0]["f_dc_0"])
-        features_dc[:, 1, 0] = np.asarray(plydata.elements[0]["f_dc_1"])
-        features_dc[:, 2, 0] = np.asarray(plydata.elements[0]["f_dc_2"])
-
-        extra_f_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("f_rest_")]
-        extra_f_names = sorted(extra_f_names, key = lambda x: int(x.split('_')[-1]))
-        assert len(extra_f_names)==3*(self.max_sh_degree + 1) ** 2 - 3
-        features_extra = np.zeros((xyz.shape[0], len(extra_f_names)))
-        for idx, attr_name in enumerate(extra_f_names):
-            features_extra[:, idx] = np.asarray(plydata.elements[0][attr_name])
+        # Memory-mapped columnar read: one float32 copy per parameter group
+        arrays = load_gaussian_arrays(path)
+        num_points = arrays["xyz"].shape[0]
+        assert arrays["features_rest"].shape[1]==3*(self.max_sh_degree + 1) ** 2 - 3
+        features_dc = arrays["features_dc"].reshape((num_points, 3, 1))
         # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
-        features_extra = features_extra.reshape((features_extra.shape[0], 3, (self.max_sh_degree + 1) ** 2 - 1))
-
-        scale_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("scale_")]
-        scale_names = sorted(scale_names, key = lambda x: int(x.split('_')[-1]))
-        scales = np.zeros((xyz.shape[0], len(scale_names)))
-        for idx, attr_name in enumerate(scale_names):
-            scales[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        rot_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("rot")]
-        rot_names = sorted(rot_names, key = lambda x: int(x.split('_')[-1]))
-        rots = np.zeros((xyz.shape[0], len(rot_names)))
-        for idx, attr_name in enumerate(rot_names):
-            rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        self._xyz = nn.Parameter(torch.tensor(xyz, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._features_dc = nn.Parameter(torch.tensor(features_dc, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(True))
-        self._features_rest = nn.Parameter(torch.tensor(features_extra, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(True))
-        self._opacity = nn.Parameter(torch.tensor(opacities, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._scaling = nn.Parameter(torch.tensor(scales, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._rotation = nn.Parameter(torch.tensor(rots, dtype=torch.float, device="cuda").requires_grad_(True))
+        features_extra = arrays["features_rest"].reshape((num_points, 3, (self.max_sh_degree + 1) ** 2 - 1))
+
+        self._xyz = nn.Parameter(torch.from_numpy(arrays["xyz"]).cuda().requires_grad_(True))
+        self._features_dc = nn.Parameter(torch.from_numpy(features_dc).cuda().transpose(1, 2).contiguous().requires_grad_(True))
+        self._features_rest = nn.Parameter(torch.from_numpy(features_extra).cuda().transpose(1, 2).contiguous().requires_grad_(True))
+        self._opacity = nn.Parameter(torch.from_numpy(arrays["opacity"]).cuda().requires_grad_(True))
+        self._scaling = nn.Parameter(torch.from_numpy(arrays["scaling"]).cuda().requires_grad_(True))
+        self._rotation = nn.Parameter(torch.from_numpy(arrays["rotation"]).cuda().requires_grad_(True))
 
         self.active_sh_degree = self.max_sh_degree
 
     def replace_tensor_to_optimizer(self, tensor, name):
-        optimizable_tensors = {}
-        for group in self.optimizer.param_groups:
-            if group["name"] == name:
-                stored_state = self.optimizer.state.get(group['params'][0], None)
-                stored_state["exp_avg"] = torch.zeros_like(tensor)
-                stored_state["exp_avg_sq"] = torch.zeros_like(tensor)
-
-                del self.optimizer.state[group['params'][0]]
-                group["params"][0] = nn.Parameter(tensor.requires_grad_(True))
-                self.optimizer.state[group['params'][0]] = stored_state
-
-                optimizable_tensors[group["name"]] = group["params"][0]
-        return optimizable_tensors
+        return self.store.replace(tensor, name)
 
     def _prune_optimizer(self, mask):
-        optimizable_tensors = {}
-        for group in self.optimizer.param_groups:
-            stored_state = self.optimizer.state.get(group['params'][0], None)
-            if stored_state is not None:
-                stored_state["exp_avg"] = stored_state["exp_avg"][mask]
-                stored_state["exp_avg_sq"] = stored_state["exp_avg_sq"][mask]
-
-                del self.optimizer.state[group['params'][0]]
-                group["params"][0] = nn.Parameter((group["params"][0][mask].requires_grad_(True)))
-                self.optimizer.state[group['params'][0]] = stored_state
-
-                optimizable_tensors[group["name"]] = group["params"][0]
-            else:
-                group["params"][0] = nn.Parameter(group["params"][0][mask].requires_grad_(True))
-                optimizable_tensors[group["name"]] = group["params"][0]
-        return optimizable_tensors
+        return self.store.keep(mask)
 
     def prune_points(self, mask):
         valid_points_mask = ~mask
@@ -364,26 +411,7 @@ class GaussianModel:
         self.tmp_radii = self.tmp_radii[valid_points_mask]
 
     def cat_tensors_to_optimizer(self, tensors_dict):
-        optimizable_tensors = {}
-        for group in self.optimizer.param_groups:
-            assert len(group["params"]) == 1
-            extension_tensor = tensors_dict[group["name"]]
-            stored_state = self.optimizer.state.get(group['params'][0], None)
-            if stored_state is not None:
-
-                stored_state["exp_avg"] = torch.cat((stored_state["exp_avg"], torch.zeros_like(extension_tensor)), dim=0)
-                stored_state["exp_avg_sq"] = torch.cat((stored_state["exp_avg_sq"], torch.zeros_like(extension_tensor)), dim=0)
-
-                del self.optimizer.state[group['params'][0]]
-                group["params"][0] = nn.Parameter(torch.cat((group["params"][0], extension_tensor), dim=0).requires_grad_(True))
-                self.optimizer.state[group['params'][0]] = stored_state
-
-                optimizable_tensors[group["name"]] = group["params"][0]
-            else:
-                group["params"][0] = nn.Parameter(torch.cat((group["params"][0], extension_tensor), dim=0).requires_grad_(True))
-                optimizable_tensors[group["name"]] = group["params"][0]
-
-        return optimizable_tensors
+        return self.store.append(tensors_dict)
 
     def densification_postfix(self, new_xyz, new_features_dc, new_features_rest, new_opacities, new_scaling, new_rotation, new_tmp_radii):
         d = {"xyz": new_xyz,
@@ -402,21 +430,21 @@ class GaussianModel:
         self._rotation = optimizable_tensors["rotation"]
 
         self.tmp_radii = torch.cat((self.tmp_radii, new_tmp_radii))
-        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device="cuda")
+        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device=self.get_xyz.device)
+        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device=self.get_xyz.device)
+        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device=self.get_xyz.device)
 
-    def densify_and_split(self, grads, grad_threshold, scene_extent, N=2):
+    def densify_and_split(self, grads, grad_threshold, scene_extent, N=2, defer_prune=False):
         n_init_points = self.get_xyz.shape[0]
         # Extract points that satisfy the gradient condition
-        padded_grad = torch.zeros((n_init_points), device="cuda")
+        padded_grad = torch.zeros((n_init_points), device=grads.device)
         padded_grad[:grads.shape[0]] = grads.squeeze()
         selected_pts_mask = torch.where(padded_grad >= grad_threshold, True, False)
         selected_pts_mask = torch.logical_and(selected_pts_mask,
                                               torch.max(self.get_scaling, dim=1).values > self.percent_dense*scene_extent)
 
         stds = self.get_scaling[selected_pts_mask].repeat(N,1)
-        means =torch.zeros((stds.size(0), 3),device="cuda")
+        means =torch.zeros((stds.size(0), 3),device=stds.device)
         samples = torch.normal(mean=means, std=stds)
         rots = build_rotation(self._rotation[selected_pts_mask]).repeat(N,1,1)
         new_xyz = torch.bmm(rots, samples.unsqueeze(-1)).squeeze(-1) + self.get_xyz[selected_pts_mask].repeat(N, 1)
@@ -429,7 +457,9 @@ class GaussianModel:
 
         self.densification_postfix(new_xyz, new_features_dc, new_features_rest, new_opacity, new_scaling, new_rotation, new_tmp_radii)
 
-        prune_filter = torch.cat((selected_pts_mask, torch.zeros(N * selected_pts_mask.sum(), device="cuda", dtype=bool)))
+        prune_filter = torch.cat((selected_pts_mask, torch.zeros(N * selected_pts_mask.sum(), device=selected_pts_mask.device, dtype=bool)))
+        if defer_prune:
+            return prune_filter
         self.prune_points(prune_filter)
 
     def densify_and_clone(self, grads, grad_threshold, scene_extent):
@@ -455,19 +485,25 @@ class GaussianModel:
 
         self.tmp_radii = radii
         self.densify_and_clone(grads, max_grad, extent)
-        self.densify_and_split(grads, max_grad, extent)
+        # The split sources are removed together with the pruned points below: one compaction
+        # instead of two. The per-row criteria do not depend on the other rows, so the
+        # surviving Gaussians and their order are the same as pruning after the split.
+        split_filter = self.densify_and_split(grads, max_grad, extent, defer_prune=True)
 
         prune_mask = (self.get_opacity < min_opacity).squeeze()
         if max_screen_size:
             big_points_vs = self.max_radii2D > max_screen_size
             big_points_ws = self.get_scaling.max(dim=1).values > 0.1 * extent
             prune_mask = torch.logical_or(torch.logical_or(prune_mask, big_points_vs), big_points_ws)
-        self.prune_points(prune_mask)
+        self.prune_points(torch.logical_or(prune_mask, split_filter))
         tmp_radii = self.tmp_radii
         self.tmp_radii = None
 
         torch.cuda.empty_cache()
 
     def add_densification_stats(self, viewspace_point_tensor, update_filter):
-        self.xyz_gradient_accum[update_filter] += torch.norm(viewspace_point_tensor.grad[update_filter,:2], dim=-1, keepdim=True)
-        self.denom[update_filter] += 1
+        # Masked updates via torch.where: boolean-mask indexing would sync with the host
+        update_mask = update_filter.unsqueeze(-1)
+        grad_norm = torch.norm(viewspace_point_tensor.grad[:, :2], dim=-1, keepdim=True)
+        self.xyz_gradient_accum += torch.where(update_mask, grad_norm, 0.0)
+        self.denom += update_mask
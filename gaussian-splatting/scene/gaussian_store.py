@@ -0,0 +1,177 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import math
+import torch
+from torch import nn
+
+# Spare capacity allocated when a buffer has to grow, relative to the rows needed
+GROWTH = 1.2
+# Rows moved per step when compacting in place (bounds the scratch memory)
+COMPACT_CHUNK = 1 << 16
+
+def owned_tensor(tensor):
+    """
+    The tensor itself, or a compact copy if it is a view into a larger capacity buffer
+    (torch.save writes the whole underlying storage of a view).
+    """
+    if not torch.is_tensor(tensor) or tensor.untyped_storage().nbytes() <= tensor.numel() * tensor.element_size():
+        return tensor
+    copy = tensor.detach().clone()
+    return nn.Parameter(copy, requires_grad=tensor.requires_grad) if isinstance(tensor, nn.Parameter) else copy
+
+class GaussianStore:
+    """
+    Capacity-managed rows for the per-Gaussian parameters of an optimizer (one parameter
+    per param group) and their per-row optimizer state (the Adam moments).
+
+    Each parameter and moment lives in a backing buffer with spare rows. The nn.Parameter
+    given to the optimizer and the rasterizer, and the moments in the optimizer state, are
+    views of its first rows. Appending writes into the spare rows, and the buffer grows by
+    GROWTH only when it is full. Pruning compacts the kept rows in place. Optimizer state
+    (including the step count) stays in place; only the parameter views are re-created with
+    the new row count. Tensors set from outside (after loading a model or an optimizer state)
+    are adopted into a buffer on the first append or prune.
+    """
+
+    def __init__(self, optimizer):
+        self.optimizer = optimizer
+        self._buffers = {}
+
+    def capacity(self, name):
+        buf = self._buffers.get((name, "param"))
+        return 0 if buf is None else buf.shape[0]
+
+    def append(self, tensors_dict):
+        """Append rows to every group (tensors_dict maps group names to new rows); new moments are zero."""
+        optimizable_tensors = {}
+        with torch.no_grad():
+            for group in self.optimizer.param_groups:
+                assert len(group["params"]) == 1
+                name = group["name"]
+                extension = tensors_dict[name]
+                old = group["params"][0]
+                n, k = old.shape[0], extension.shape[0]
+                state = self.optimizer.state.pop(old, None)
+
+                buf = self._buffer(name, "param", old, n + k)
+                buf[n:n + k].copy_(extension)
+                param = nn.Parameter(buf[:n + k])
+                if state is not None:
+                    for field in self._row_fields(state, n):
+                        moment = self._buffer(name, field, state[field], n + k)
+                        moment[n:n + k].zero_()
+                        state[field] = moment[:n + k]
+                    self.optimizer.state[param] = state
+                group["params"][0] = param
+                optimizable_tensors[name] = param
+        return optimizable_tensors
+
+    def keep(self, mask):
+        """Keep the rows where mask is True, in order, in every group."""
+        keep_idx = mask.nonzero().squeeze(1)
+        m = keep_idx.shape[0]
+        optimizable_tensors = {}
+        with torch.no_grad():
+            for group in self.optimizer.param_groups:
+                name = group["name"]
+                old = group["params"][0]
+                n = old.shape[0]
+                if m == n:
+                    optimizable_tensors[name] = old
+                    continue
+                state = self.optimizer.state.pop(old, None)
+
+                buf = self._buffer(name, "param", old, n)
+                self._compact(buf, keep_idx)
+                param = nn.Parameter(buf[:m])
+                if state is not None:
+                    for field in self._row_fields(state, n):
+                        moment = self._buffer(name, field, state[field], n)
+                        self._compact(moment, keep_idx)
+                        state[field] = moment[:m]
+                    self.optimizer.state[param] = state
+                group["params"][0] = param
+                optimizable_tensors[name] = param
+        return optimizable_tensors
+
+    def replace(self, tensor, name):
+        """Overwrite the values of one group in place and zero its moments."""
+        optimizable_tensors = {}
+        with torch.no_grad():
+            for group in self.optimizer.param_groups:
+                if group["name"] == name:
+                    param = group["params"][0]
+                    assert param.shape == tensor.shape
+                    param.copy_(tensor)
+                    state = self.optimizer.state.get(param, None)
+                    if state is not None:
+                        for field in self._row_fields(state, param.shape[0]):
+                            state[field].zero_()
+                    optimizable_tensors[name] = param
+        return optimizable_tensors
+
+    def widen(self, name, size):
+        """Grow dim 1 of one group (e.g. the SH coefficients) to `size`; new entries and their moments are zero."""
+        optimizable_tensors = {}
+        with torch.no_grad():
+            for group in self.optimizer.param_groups:
+                if group["name"] != name:
+                    continue
+                old = group["params"][0]
+                n = old.shape[0]
+                state = self.optimizer.state.pop(old, None)
+
+                param = nn.Parameter(self._widened(name, "param", old, size))
+                if state is not None:
+                    for field in self._row_fields(state, n):
+                        if state[field].dim() > 1:
+                            state[field] = self._widened(name, field, state[field], size)
+                    self.optimizer.state[param] = state
+                group["params"][0] = param
+                optimizable_tensors[name] = param
+        return optimizable_tensors
+
+    def _widened(self, name, field, tensor, size):
+        n = tensor.shape[0]
+        buf = torch.zeros((math.ceil(n * GROWTH), size) + tuple(tensor.shape[2:]), dtype=tensor.dtype, device=tensor.device)
+        buf[:n, :tensor.shape[1]] = tensor
+        self._buffers[(name, field)] = buf
+        return buf[:n]
+
+    def _buffer(self, name, field, tensor, rows):
+        """Backing buffer whose first tensor.shape[0] rows hold tensor, with room for `rows` rows."""
+        n = tensor.shape[0]
+        buf = self._buffers.get((name, field))
+        if (buf is not None and buf.data_ptr() == tensor.data_ptr() and buf.dtype == tensor.dtype
+                and buf.shape[1:] == tensor.shape[1:]):
+            if buf.shape[0] >= rows:
+                return buf
+            capacity = max(rows, math.ceil(buf.shape[0] * GROWTH))
+        else:
+            # Adopt a tensor that was set from outside
+            capacity = math.ceil(rows * GROWTH)
+        new_buf = torch.empty((capacity,) + tuple(tensor.shape[1:]), dtype=tensor.dtype, device=tensor.device)
+        new_buf[:n].copy_(tensor)
+        self._buffers[(name, field)] = new_buf
+        return new_buf
+
+    @staticmethod
+    def _compact(buf, keep_idx):
+        # keep_idx is increasing, so keep_idx[i] >= i: each chunk reads rows that no earlier
+        # chunk has written, and the gather of one chunk is the only scratch memory
+        for start in range(0, keep_idx.shape[0], COMPACT_CHUNK):
+            idx = keep_idx[start:start + COMPACT_CHUNK]
+            buf[start:start + idx.shape[0]] = buf[idx]
+
+    @staticmethod
+    def _row_fields(state, n):
+        return [k for k, v in state.items() if torch.is_tensor(v) and v.dim() > 0 and v.shape[0] == n]
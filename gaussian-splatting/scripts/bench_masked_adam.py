@@ -0,0 +1,120 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+"""
+Optimizer step time and memory of MaskedAdam against the dense torch.optim.Adam of the
+default path, on the parameter groups of GaussianModel (SH degree 3), for several fractions
+of visible Gaussians, with MaskedAdam choosing between its two masked paths (see
+GATHER_FRACTION) and forced to each of them. Four random visibility masks of that fraction
+are used in turn.
+Each case runs in its own process. "state MB" is the optimizer state; "step MB" is the peak
+memory of the steps on top of the parameters, gradients and state: temporaries, and for
+MaskedAdam the reused buffers of gathered rows (CUDA allocator peak, or peak RSS on the CPU).
+
+    python scripts/bench_masked_adam.py --gaussians 1000000 --visible 0.05 0.25 0.5 1.0
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+from argparse import ArgumentParser, SUPPRESS
+import torch
+from torch import nn
+from utils import masked_adam
+from utils.masked_adam import MaskedAdam
+from bench_ply_save import peak_rss_mb, run_isolated
+
+# MaskedAdam choosing its path, or forced to update in place / to gather the visible rows
+PATHS = {"masked": None, "in-place": 0.0, "gather": 1.0}
+
+# Group name, row shape and learning rate, as in GaussianModel.training_setup
+GROUPS = [("xyz", (3,), 0.00016), ("f_dc", (1, 3), 0.0025), ("f_rest", (15, 3), 0.0025 / 20.0),
+          ("opacity", (1,), 0.025), ("scaling", (3,), 0.005), ("rotation", (4,), 0.001)]
+
+def make_optimizer(name, n, device, seed=0):
+    g = torch.Generator(device=device).manual_seed(seed)
+    groups = []
+    for group, shape, lr in GROUPS:
+        param = nn.Parameter(torch.randn((n,) + shape, generator=g, device=device))
+        param.grad = torch.randn((n,) + shape, generator=g, device=device)
+        groups.append({"params": [param], "lr": lr, "name": group})
+    if name == "adam":
+        return torch.optim.Adam(groups, lr=0.0, eps=1e-15)
+    if PATHS[name] is not None:
+        masked_adam.GATHER_FRACTION = PATHS[name]
+    return MaskedAdam(groups, lr=0.0, eps=1e-15)
+
+def synchronize(device):
+    if device == "cuda":
+        torch.cuda.synchronize()
+
+def run_case(name, n, visible, device, steps):
+    optimizer = make_optimizer(name, n, device)
+    g = torch.Generator(device=device).manual_seed(1)
+    masks = [torch.rand(n, generator=g, device=device) < visible for _ in range(4)]
+
+    def step(i):
+        if name == "adam":
+            optimizer.step()
+        else:
+            optimizer.step(masks[i % len(masks)], n)
+
+    synchronize(device)
+    if device == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+        before = torch.cuda.memory_allocated()
+    else:
+        before = peak_rss_mb()
+    # State allocation, and the capacity estimate of MaskedAdam
+    for i in range(2):
+        step(i)
+    synchronize(device)
+    state_mb = sum(t.numel() * t.element_size() for s in optimizer.state.values() for t in s.values() if torch.is_tensor(t)) / 2**20
+
+    start = time.perf_counter()
+    for i in range(steps):
+        step(i)
+    synchronize(device)
+    elapsed = (time.perf_counter() - start) / steps
+
+    if device == "cuda":
+        step_mb = (torch.cuda.max_memory_allocated() - before) / 2**20 - state_mb
+    else:
+        step_mb = peak_rss_mb() - before - state_mb
+    return dict(ms=elapsed * 1000, state_mb=state_mb, step_mb=step_mb)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="MaskedAdam against dense Adam")
+    parser.add_argument("--gaussians", nargs="+", type=int, default=[1000000])
+    parser.add_argument("--visible", nargs="+", type=float, default=[0.05, 0.25, 0.5, 1.0])
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--paths", nargs="+", choices=list(PATHS), default=list(PATHS))
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--case", nargs=5, default=None, help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        name, n, visible, device, steps = args.case
+        print(json.dumps(run_case(name, int(n), float(visible), device, int(steps))))
+        sys.exit(0)
+
+    print(f"{'optimizer':>10} {'gaussians':>10} {'visible':>8} {'ms/step':>9} {'speedup':>8} {'state MB':>9} {'step MB':>8}")
+    for n in args.gaussians:
+        # Dense Adam does the same work whatever the visibility
+        dense = run_isolated(os.path.abspath(__file__), ["adam", n, 1.0, args.device, args.steps])
+        print(f"{'adam':>10} {n:>10} {'-':>8} {dense['ms']:>9.2f} {1.0:>8.2f} {dense['state_mb']:>9.1f} {dense['step_mb']:>8.1f}")
+        for visible in args.visible:
+            for path in args.paths:
+                r = run_isolated(os.path.abspath(__file__), [path, n, visible, args.device, args.steps])
+                print(f"{path:>10} {n:>10} {visible:>8.0%} {r['ms']:>9.2f} {dense['ms'] / r['ms']:>8.2f} {r['state_mb']:>9.1f} {r['step_mb']:>8.1f}")
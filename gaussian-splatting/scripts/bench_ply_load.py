@@ -0,0 +1,127 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+"""
+Load throughput of a Gaussian splat PLY into float32 parameter tensors, for the previous
+GaussianModel.load_ply reader (plyfile, then field-by-field float64 copies) and for the
+memory-mapped reader of utils/ply_utils.py, both full and partial (positions and opacity only,
+as for a preview). Each case runs in its own process. The file has just been written, so it
+is read from the page cache: the numbers measure parsing and copies, not the disk.
+
+    python scripts/bench_ply_load.py --gaussians 100000 1000000 5000000
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import tempfile
+import time
+from argparse import ArgumentParser, SUPPRESS
+import numpy as np
+import torch
+from utils.ply_utils import load_gaussian_arrays
+from bench_ply_save import make_model, peak_rss_mb, run_isolated
+
+def load_ply_plyfile(path, max_sh_degree=3):
+    """GaussianModel.load_ply before the memory-mapped reader, without the copy to the GPU."""
+    from plyfile import PlyData
+
+    plydata = PlyData.read(path)
+
+    xyz = np.stack((np.asarray(plydata.elements[0]["x"]),
+                    np.asarray(plydata.elements[0]["y"]),
+                    np.asarray(plydata.elements[0]["z"])),  axis=1)
+    opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
+
+    features_dc = np.zeros((xyz.shape[0], 3, 1))
+    features_dc[:, 0, 0] = np.asarray(plydata.elements[0]["f_dc_0"])
+    features_dc[:, 1, 0] = np.asarray(plydata.elements[0]["f_dc_1"])
+    features_dc[:, 2, 0] = np.asarray(plydata.elements[0]["f_dc_2"])
+
+    extra_f_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("f_rest_")]
+    extra_f_names = sorted(extra_f_names, key = lambda x: int(x.split('_')[-1]))
+    assert len(extra_f_names)==3*(max_sh_degree + 1) ** 2 - 3
+    features_extra = np.zeros((xyz.shape[0], len(extra_f_names)))
+    for idx, attr_name in enumerate(extra_f_names):
+        features_extra[:, idx] = np.asarray(plydata.elements[0][attr_name])
+    features_extra = features_extra.reshape((features_extra.shape[0], 3, (max_sh_degree + 1) ** 2 - 1))
+
+    scale_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("scale_")]
+    scale_names = sorted(scale_names, key = lambda x: int(x.split('_')[-1]))
+    scales = np.zeros((xyz.shape[0], len(scale_names)))
+    for idx, attr_name in enumerate(scale_names):
+        scales[:, idx] = np.asarray(plydata.elements[0][attr_name])
+
+    rot_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("rot")]
+    rot_names = sorted(rot_names, key = lambda x: int(x.split('_')[-1]))
+    rots = np.zeros((xyz.shape[0], len(rot_names)))
+    for idx, attr_name in enumerate(rot_names):
+        rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
+
+    return [torch.tensor(xyz, dtype=torch.float),
+            torch.tensor(features_dc, dtype=torch.float).transpose(1, 2).contiguous(),
+            torch.tensor(features_extra, dtype=torch.float).transpose(1, 2).contiguous(),
+            torch.tensor(opacities, dtype=torch.float),
+            torch.tensor(scales, dtype=torch.float),
+            torch.tensor(rots, dtype=torch.float)]
+
+def load_ply_mmap(path, groups=None):
+    """Tensors as built by GaussianModel.load_ply, without the copy to the GPU."""
+    arrays = load_gaussian_arrays(path) if groups is None else load_gaussian_arrays(path, groups)
+    n = next(iter(arrays.values())).shape[0]
+    tensors = []
+    for name, array in arrays.items():
+        tensor = torch.from_numpy(array)
+        if name.startswith("features"):
+            tensor = tensor.view(n, 3, -1).transpose(1, 2).contiguous()
+        tensors.append(tensor)
+    return tensors
+
+READERS = {
+    "plyfile": load_ply_plyfile,
+    "mmap": load_ply_mmap,
+    "mmap-partial": lambda path: load_ply_mmap(path, ("xyz", "opacity")),
+}
+
+def run_case(reader, path):
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    tensors = READERS[reader](path)
+    elapsed = time.perf_counter() - start
+    return dict(seconds=elapsed, peak_mb=peak_rss_mb(), load_mb=peak_rss_mb() - before,
+                tensor_mb=sum(t.numel() * t.element_size() for t in tensors) / 2**20)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Gaussian PLY load throughput")
+    parser.add_argument("--gaussians", nargs="+", type=int, default=[100000, 1000000])
+    parser.add_argument("--readers", nargs="+", choices=list(READERS), default=list(READERS))
+    parser.add_argument("--dir", type=str, default=None, help="Directory for the temporary PLY files")
+    parser.add_argument("--case", nargs=2, default=None, help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        reader, path = args.case
+        print(json.dumps(run_case(reader, path)))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        print(f"{'reader':>13} {'gaussians':>10} {'file MB':>9} {'seconds':>9} {'MB/s':>8} {'tensor MB':>10} {'load MB':>9}")
+        for n in args.gaussians:
+            path = os.path.join(directory, "point_cloud_{}.ply".format(n))
+            make_model(n).save_ply(path)
+            file_mb = os.path.getsize(path) / 2**20
+            for reader in args.readers:
+                r = run_isolated(os.path.abspath(__file__), [reader, path])
+                # Throughput over the whole file, so that partial loads compare with full ones
+                print(f"{reader:>13} {n:>10} {file_mb:>9.1f} {r['seconds']:>9.3f} {file_mb / r['seconds']:>8.1f} {r['tensor_mb']:>10.1f} {r['load_mb']:>9.1f}")
+            os.remove(path)
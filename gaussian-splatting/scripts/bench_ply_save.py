@@ -0,0 +1,113 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+"""
+Save time and peak memory of GaussianModel.save_ply against the number of Gaussians, for the
+previous plyfile writer (one Python tuple per Gaussian) and the streaming writer of
+utils/ply_utils.py. Each measurement runs in its own process, so that the peak resident set
+size (ru_maxrss) only covers that save; "save MB" is the peak minus the RSS before the save.
+
+    python scripts/bench_ply_save.py --gaussians 100000 1000000 5000000
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import resource
+import subprocess
+import tempfile
+import time
+from argparse import ArgumentParser, SUPPRESS
+import numpy as np
+import torch
+from torch import nn
+from scene.gaussian_model import GaussianModel
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def make_model(n, sh_degree=3, seed=0):
+    """A CPU GaussianModel with n random Gaussians of the given SH degree."""
+    g = torch.Generator().manual_seed(seed)
+    model = GaussianModel(sh_degree)
+    model.active_sh_degree = sh_degree
+    model._xyz = nn.Parameter(torch.randn(n, 3, generator=g))
+    model._features_dc = nn.Parameter(torch.randn(n, 1, 3, generator=g))
+    model._features_rest = nn.Parameter(torch.randn(n, (sh_degree + 1) ** 2 - 1, 3, generator=g))
+    model._opacity = nn.Parameter(torch.randn(n, 1, generator=g))
+    model._scaling = nn.Parameter(torch.randn(n, 3, generator=g))
+    model._rotation = nn.Parameter(torch.randn(n, 4, generator=g))
+    return model
+
+def save_ply_plyfile(model, path):
+    """GaussianModel.save_ply before the streaming writer."""
+    from plyfile import PlyData, PlyElement
+
+    xyz = model._xyz.detach().cpu().numpy()
+    normals = np.zeros_like(xyz)
+    f_dc = model._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
+    f_rest = model._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
+    opacities = model._opacity.detach().cpu().numpy()
+    scale = model._scaling.detach().cpu().numpy()
+    rotation = model._rotation.detach().cpu().numpy()
+
+    dtype_full = [(attribute, 'f4') for attribute in model.construct_list_of_attributes()]
+
+    elements = np.empty(xyz.shape[0], dtype=dtype_full)
+    attributes = np.concatenate((xyz, normals, f_dc, f_rest, opacities, scale, rotation), axis=1)
+    elements[:] = list(map(tuple, attributes))
+    el = PlyElement.describe(elements, 'vertex')
+    PlyData([el]).write(path)
+
+WRITERS = {
+    "plyfile": save_ply_plyfile,
+    "streaming": lambda model, path: model.save_ply(path),
+}
+
+def run_case(writer, n, directory):
+    model = make_model(n)
+    path = os.path.join(directory, "{}_{}.ply".format(writer, n))
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    WRITERS[writer](model, path)
+    elapsed = time.perf_counter() - start
+    result = dict(seconds=elapsed, peak_mb=peak_rss_mb(), save_mb=peak_rss_mb() - before, file_mb=os.path.getsize(path) / 2**20)
+    os.remove(path)
+    return result
+
+def run_isolated(script, args):
+    """Run `script --case args...` in a fresh interpreter and return the JSON it prints."""
+    out = subprocess.run([sys.executable, script, "--case"] + [str(a) for a in args],
+                         check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="GaussianModel.save_ply time and peak RSS")
+    parser.add_argument("--gaussians", nargs="+", type=int, default=[100000, 1000000])
+    parser.add_argument("--writers", nargs="+", choices=list(WRITERS), default=list(WRITERS))
+    parser.add_argument("--dir", type=str, default=None, help="Directory for the temporary PLY files")
+    parser.add_argument("--case", nargs=3, default=None, help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        writer, n, directory = args.case
+        print(json.dumps(run_case(writer, int(n), directory)))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        print(f"{'writer':>10} {'gaussians':>10} {'file MB':>9} {'seconds':>9} {'MB/s':>8} {'peak MB':>9} {'save MB':>9}")
+        for n in args.gaussians:
+            for writer in args.writers:
+                r = run_isolated(os.path.abspath(__file__), [writer, n, directory])
+                print(f"{writer:>10} {n:>10} {r['file_mb']:>9.1f} {r['seconds']:>9.2f} {r['file_mb'] / r['seconds']:>8.1f} {r['peak_mb']:>9.1f} {r['save_mb']:>9.1f}")
@@ -0,0 +1,133 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+"""
+Startup time of Scene construction against --load_workers. load_workers 1 loads the cameras
+one after the other, as before the thread pool. Without -s, a COLMAP data set of random JPEG
+images is generated first. The table splits the time into reading the data set description
+("read"), building the camera lists ("cameras", decode + resize + upload) and, with a GPU,
+the whole Scene() including the initial point cloud ("scene").
+
+    python scripts/bench_scene_load.py --images 200 --width 1600 --height 1066 --workers 1 4 8
+    python scripts/bench_scene_load.py -s <path to COLMAP or NeRF Synthetic dataset> --workers 1 8
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collections
+import tempfile
+import time
+from argparse import ArgumentParser
+import numpy as np
+import torch
+from PIL import Image
+from arguments import ModelParams
+from scene import Scene, sceneLoadTypeCallbacks
+from scene.gaussian_model import GaussianModel
+from utils.camera_utils import cameraList_from_camInfos
+from utils.read_write_model import Camera as ColmapCamera, Image as ColmapImage, Point3D, write_model
+
+def make_colmap_dataset(path, images, width, height, seed=0):
+    """A COLMAP data set of `images` random JPEG views on a circle, with one PINHOLE camera."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(path, "images"))
+    os.makedirs(os.path.join(path, "sparse", "0"))
+    focal = 0.8 * width
+    cameras = {1: ColmapCamera(id=1, model="PINHOLE", width=width, height=height,
+                               params=np.array([focal, focal, width / 2, height / 2]))}
+    views = {}
+    # Smooth random content, so JPEG decode cost is close to that of photographs
+    base = rng.integers(0, 256, size=(height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+    for i in range(images):
+        name = "{:05d}.jpg".format(i)
+        pixels = np.roll(base, i, axis=1)
+        Image.fromarray(pixels).resize((width, height), Image.BILINEAR).save(os.path.join(path, "images", name), quality=90)
+        angle = 2 * np.pi * i / images
+        half = angle / 2
+        views[i + 1] = ColmapImage(id=i + 1, qvec=np.array([np.cos(half), 0.0, np.sin(half), 0.0]),
+                                   tvec=np.array([0.0, 0.0, 4.0]), camera_id=1, name=name,
+                                   xys=np.zeros((0, 2)), point3D_ids=np.zeros(0, dtype=np.int64))
+    points = {}
+    for i in range(1000):
+        points[i + 1] = Point3D(id=i + 1, xyz=rng.normal(size=3), rgb=rng.integers(0, 256, size=3),
+                                error=0.5, image_ids=np.zeros(0, dtype=np.int64), point2D_idxs=np.zeros(0, dtype=np.int64))
+    write_model(cameras, views, points, os.path.join(path, "sparse", "0"), ext=".bin")
+
+def model_args(source_path, model_path, workers, extra):
+    parser = ArgumentParser()
+    params = ModelParams(parser)
+    return params.extract(parser.parse_args(["-s", source_path, "-m", model_path, "--load_workers", str(workers)] + extra))
+
+def warm_page_cache(path):
+    # Every run then reads the images from memory, whatever its order
+    for root, _, files in os.walk(path):
+        for name in files:
+            with open(os.path.join(root, name), "rb") as f:
+                while f.read(1 << 24):
+                    pass
+
+def time_stages(args):
+    Stages = collections.namedtuple("Stages", ["read", "cameras", "scene", "views"])
+    start = time.perf_counter()
+    if os.path.exists(os.path.join(args.source_path, "sparse")):
+        scene_info = sceneLoadTypeCallbacks["Colmap"](args.source_path, args.images, args.depths, args.eval, args.train_test_exp)
+        is_nerf_synthetic = False
+    else:
+        scene_info = sceneLoadTypeCallbacks["Blender"](args.source_path, args.white_background, args.depths, args.eval)
+        is_nerf_synthetic = True
+    read = time.perf_counter() - start
+
+    start = time.perf_counter()
+    views = len(cameraList_from_camInfos(scene_info.train_cameras, 1.0, args, is_nerf_synthetic, False))
+    views += len(cameraList_from_camInfos(scene_info.test_cameras, 1.0, args, is_nerf_synthetic, True))
+    cameras = time.perf_counter() - start
+
+    scene = float("nan")
+    if torch.cuda.is_available():
+        start = time.perf_counter()
+        Scene(args, GaussianModel(args.sh_degree), shuffle=False)
+        torch.cuda.synchronize()
+        scene = time.perf_counter() - start
+    return Stages(read, cameras, scene, views)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Scene construction startup time")
+    parser.add_argument("--source_path", "-s", type=str, default=None)
+    parser.add_argument("--images", type=int, default=100, help="Views of the generated data set")
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1066)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, os.cpu_count() or 8])
+    parser.add_argument("--data_device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--resolution", "-r", type=int, default=-1)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    extra = ["--data_device", args.data_device, "--resolution", str(args.resolution)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = args.source_path
+        if source_path is None:
+            source_path = os.path.join(directory, "dataset")
+            print("Generating {} views of {}x{}".format(args.images, args.width, args.height))
+            make_colmap_dataset(source_path, args.images, args.width, args.height)
+        warm_page_cache(source_path)
+        model_path = os.path.join(directory, "model")
+        os.makedirs(model_path)
+
+        results = []
+        for workers in args.workers:
+            runs = [time_stages(model_args(source_path, model_path, workers, extra)) for _ in range(args.repeat)]
+            results.append((workers, min(runs, key=lambda r: r.cameras)))
+
+        print(f"\n{'workers':>8} {'views':>6} {'read s':>8} {'cameras s':>10} {'views/s':>8} {'speedup':>8} {'scene s':>8}")
+        for workers, r in results:
+            print(f"{workers:>8} {r.views:>6} {r.read:>8.2f} {r.cameras:>10.2f} {r.views / r.cameras:>8.1f} {results[0][1].cameras / r.cameras:>8.2f} {r.scene:>8.2f}")
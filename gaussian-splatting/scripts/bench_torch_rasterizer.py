@@ -0,0 +1,108 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+"""
+Throughput of the PyTorch rasterizer (gaussian_renderer/torch_rasterizer.py) on random scenes:
+milliseconds per frame for the forward pass and for forward + backward, against the number of
+Gaussians and the image size. With a GPU and diff_gaussian_rasterization installed, the CUDA
+rasterizer is timed on the same scenes for comparison.
+
+    python scripts/bench_torch_rasterizer.py --gaussians 1000 10000 100000 --resolutions 160x90 320x180
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import math
+import time
+from argparse import ArgumentParser
+import numpy as np
+import torch
+from gaussian_renderer import torch_rasterizer
+from utils.graphics_utils import getWorld2View2, getProjectionMatrix
+
+def make_scene(n, width, height, device, seed=0):
+    fovx = math.radians(60.0)
+    fovy = 2 * math.atan(math.tan(fovx * 0.5) * height / width)
+    view = torch.tensor(getWorld2View2(np.eye(3), np.zeros(3))).transpose(0, 1).float()
+    proj = getProjectionMatrix(znear=0.01, zfar=100.0, fovX=fovx, fovY=fovy).transpose(0, 1)
+    settings = dict(
+        image_height=height, image_width=width, tanfovx=math.tan(fovx * 0.5), tanfovy=math.tan(fovy * 0.5),
+        bg=torch.zeros(3, device=device), scale_modifier=1.0,
+        viewmatrix=view.to(device), projmatrix=(view @ proj).to(device), sh_degree=3,
+        campos=view.inverse()[3, :3].to(device), prefiltered=False, debug=False, antialiasing=False)
+
+    g = torch.Generator().manual_seed(seed)
+    z = torch.rand(n, generator=g) * 8 + 2
+    xy = (torch.rand(n, 2, generator=g) * 2 - 1) * z[:, None] * 0.6
+    inputs = dict(
+        means3D=torch.cat((xy, z[:, None]), dim=1),
+        opacities=torch.rand(n, 1, generator=g),
+        shs=torch.randn(n, 16, 3, generator=g) * 0.2,
+        scales=torch.exp(torch.rand(n, 3, generator=g) * 2 - 5),
+        rotations=torch.nn.functional.normalize(torch.randn(n, 4, generator=g)),
+    )
+    return settings, {k: v.to(device).requires_grad_(True) for k, v in inputs.items()}
+
+def time_backend(backend, settings, inputs, iters, backward):
+    rasterizer = backend.GaussianRasterizer(backend.GaussianRasterizationSettings(**settings))
+    device = inputs["means3D"].device
+
+    def run():
+        means2D = torch.zeros_like(inputs["means3D"], requires_grad=True)
+        color, radii, invdepth = rasterizer(means2D=means2D, **inputs)
+        if backward:
+            (color.sum() + invdepth.sum()).backward()
+        return radii
+
+    radii = run()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.perf_counter()
+    for _ in range(iters):
+        run()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    elapsed = (time.perf_counter() - start) / iters
+    peak = torch.cuda.max_memory_allocated() / 2**20 if device.type == "cuda" else float("nan")
+    return elapsed, int((radii > 0).sum()), peak
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="PyTorch rasterizer throughput")
+    parser.add_argument("--gaussians", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--resolutions", nargs="+", type=str, default=["160x90", "320x180"])
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--iters", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    backends = [("torch", torch_rasterizer)]
+    if args.device == "cuda":
+        try:
+            import diff_gaussian_rasterization
+            backends.append(("cuda", diff_gaussian_rasterization))
+        except ImportError:
+            pass
+
+    print(f"device {args.device}, {torch.get_num_threads()} threads, CHUNK_ELEMENTS {torch_rasterizer.CHUNK_ELEMENTS}")
+    print(f"{'backend':>8} {'gaussians':>10} {'size':>10} {'visible':>9} {'fwd ms':>10} {'fwd+bwd ms':>11} {'frames/s':>9} {'peak MB':>9}")
+    for resolution in args.resolutions:
+        width, height = (int(v) for v in resolution.split("x"))
+        for n in args.gaussians:
+            settings, inputs = make_scene(n, width, height, args.device)
+            for name, backend in backends:
+                forward, visible, _ = time_backend(backend, settings, inputs, args.iters, backward=False)
+                both, _, peak = time_backend(backend, settings, inputs, args.iters, backward=True)
+                print(f"{name:>8} {n:>10} {resolution:>10} {visible:>9} {forward * 1000:>10.1f} {both * 1000:>11.1f} {1 / forward:>9.2f} {peak:>9.1f}")
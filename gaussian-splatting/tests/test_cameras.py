@@ -0,0 +1,66 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from scene.cameras import Camera
+
+WIDTH, HEIGHT = 20, 12
+DEVICES = ["cpu"] + (["cuda"] if torch.cuda.is_available() else [])
+
+def make_camera(image, compact_data, resolution=(WIDTH, HEIGHT), **kwargs):
+    return Camera(resolution, 0, np.eye(3), np.zeros(3), 1.0, 1.0, None, image, None, "view", 0,
+                  data_device="cpu", compact_data=compact_data, **kwargs)
+
+def make_image(channels, seed=0, size=(WIDTH, HEIGHT)):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (size[1], size[0], channels), dtype=np.uint8)
+    # Include the extremes of the 8-bit range
+    pixels[0, 0], pixels[0, 1] = 0, 255
+    return pixels
+
+@pytest.mark.parametrize("channels", [3, 4])
+@pytest.mark.parametrize("source", ["pil", "resized_pil", "array"])
+@pytest.mark.parametrize("test_view", [None, False, True])
+def test_compact_camera_matches_float_camera(channels, source, test_view):
+    if source == "array":
+        # As loaded from the dataset cache, already at the camera's resolution
+        image = make_image(channels)
+    else:
+        size = (2 * WIDTH + 3, 2 * HEIGHT + 1) if source == "resized_pil" else (WIDTH, HEIGHT)
+        image = Image.fromarray(make_image(channels, size=size))
+    kwargs = {} if test_view is None else dict(train_test_exp=True, is_test_view=True, is_test_dataset=test_view)
+
+    floats, compact = make_camera(image, False, **kwargs), make_camera(image, True, **kwargs)
+    stored = compact.load_data()
+    assert stored["original_image"].dtype == torch.uint8
+    assert stored["alpha_mask"].dtype == torch.uint8
+
+    for name in ("original_image", "alpha_mask"):
+        expected = getattr(floats, name)
+        assert expected.dtype == torch.float32
+        assert torch.equal(getattr(compact, name), expected), name
+        assert torch.equal(compact.as_float(name, stored[name]), expected), name
+        # A float camera stores the float tensors themselves
+        assert floats.as_float(name, floats.load_data()[name]) is floats.load_data()[name]
+    if test_view is not None:
+        assert not compact.alpha_mask.all() and compact.alpha_mask.any()
+
+@pytest.mark.parametrize("device", DEVICES)
+def test_compact_images_convert_identically_on_the_device(device):
+    image = Image.fromarray(make_image(4, seed=1))
+    floats, compact = make_camera(image, False), make_camera(image, True)
+    for name in ("original_image", "alpha_mask"):
+        moved = compact.as_float(name, compact.load_data()[name].to(device))
+        assert moved.device.type == device
+        assert torch.equal(moved.cpu(), getattr(floats, name)), name
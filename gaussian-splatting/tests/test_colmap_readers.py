@@ -0,0 +1,224 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import os
+import numpy as np
+import pytest
+from scene import colmap_loader
+from utils import read_write_model
+from utils.read_write_model import read_next_bytes
+
+# Enough points for the track gather to span several 1 << 16 blocks
+NUM_POINTS = 70000
+
+def original_read_images_binary(path_to_model_file, Image):
+    """The per-element struct reader the bulk readers replaced."""
+    images = {}
+    with open(path_to_model_file, "rb") as fid:
+        num_reg_images = read_next_bytes(fid, 8, "Q")[0]
+        for _ in range(num_reg_images):
+            binary_image_properties = read_next_bytes(
+                fid, num_bytes=64, format_char_sequence="idddddddi"
+            )
+            image_id = binary_image_properties[0]
+            qvec = np.array(binary_image_properties[1:5])
+            tvec = np.array(binary_image_properties[5:8])
+            camera_id = binary_image_properties[8]
+            image_name = ""
+            current_char = read_next_bytes(fid, 1, "c")[0]
+            while current_char != b"\x00":  # look for the ASCII 0 entry
+                image_name += current_char.decode("utf-8")
+                current_char = read_next_bytes(fid, 1, "c")[0]
+            num_points2D = read_next_bytes(
+                fid, num_bytes=8, format_char_sequence="Q"
+            )[0]
+            x_y_id_s = read_next_bytes(
+                fid,
+                num_bytes=24 * num_points2D,
+                format_char_sequence="ddq" * num_points2D,
+            )
+            xys = np.column_stack(
+                [
+                    tuple(map(float, x_y_id_s[0::3])),
+                    tuple(map(float, x_y_id_s[1::3])),
+                ]
+            )
+            point3D_ids = np.array(tuple(map(int, x_y_id_s[2::3])))
+            images[image_id] = Image(
+                id=image_id,
+                qvec=qvec,
+                tvec=tvec,
+                camera_id=camera_id,
+                name=image_name,
+                xys=xys,
+                point3D_ids=point3D_ids,
+            )
+    return images
+
+def original_read_points3D_binary(path_to_model_file):
+    """utils/read_write_model.py before the bulk reader."""
+    points3D = {}
+    with open(path_to_model_file, "rb") as fid:
+        num_points = read_next_bytes(fid, 8, "Q")[0]
+        for _ in range(num_points):
+            binary_point_line_properties = read_next_bytes(
+                fid, num_bytes=43, format_char_sequence="QdddBBBd"
+            )
+            point3D_id = binary_point_line_properties[0]
+            xyz = np.array(binary_point_line_properties[1:4])
+            rgb = np.array(binary_point_line_properties[4:7])
+            error = np.array(binary_point_line_properties[7])
+            track_length = read_next_bytes(
+                fid, num_bytes=8, format_char_sequence="Q"
+            )[0]
+            track_elems = read_next_bytes(
+                fid,
+                num_bytes=8 * track_length,
+                format_char_sequence="ii" * track_length,
+            )
+            image_ids = np.array(tuple(map(int, track_elems[0::2])))
+            point2D_idxs = np.array(tuple(map(int, track_elems[1::2])))
+            points3D[point3D_id] = read_write_model.Point3D(
+                id=point3D_id,
+                xyz=xyz,
+                rgb=rgb,
+                error=error,
+                image_ids=image_ids,
+                point2D_idxs=point2D_idxs,
+            )
+    return points3D
+
+def original_loader_read_points3D_binary(path_to_model_file):
+    """scene/colmap_loader.py before the bulk reader."""
+    with open(path_to_model_file, "rb") as fid:
+        num_points = read_next_bytes(fid, 8, "Q")[0]
+
+        xyzs = np.empty((num_points, 3))
+        rgbs = np.empty((num_points, 3))
+        errors = np.empty((num_points, 1))
+
+        for p_id in range(num_points):
+            binary_point_line_properties = read_next_bytes(
+                fid, num_bytes=43, format_char_sequence="QdddBBBd")
+            xyz = np.array(binary_point_line_properties[1:4])
+            rgb = np.array(binary_point_line_properties[4:7])
+            error = np.array(binary_point_line_properties[7])
+            track_length = read_next_bytes(
+                fid, num_bytes=8, format_char_sequence="Q")[0]
+            track_elems = read_next_bytes(
+                fid, num_bytes=8*track_length,
+                format_char_sequence="ii"*track_length)
+            xyzs[p_id] = xyz
+            rgbs[p_id] = rgb
+            errors[p_id] = error
+    return xyzs, rgbs, errors
+
+def assert_identical(actual, expected, where="result"):
+    """Same types, dtypes, shapes, values and dict order."""
+    assert type(actual) is type(expected), where
+    if isinstance(expected, dict):
+        assert list(actual.keys()) == list(expected.keys()), where
+        for key in expected:
+            assert_identical(actual[key], expected[key], "{}[{}]".format(where, key))
+    elif isinstance(expected, tuple):
+        assert len(actual) == len(expected), where
+        names = getattr(expected, "_fields", range(len(expected)))
+        for name, a, e in zip(names, actual, expected):
+            assert_identical(a, e, "{}.{}".format(where, name))
+    elif isinstance(expected, np.ndarray):
+        assert actual.dtype == expected.dtype, "{}: {} != {}".format(where, actual.dtype, expected.dtype)
+        assert actual.shape == expected.shape, where
+        assert np.array_equal(actual, expected), where
+    else:
+        assert actual == expected, where
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    path = tmp_path_factory.mktemp("sparse")
+
+    cameras = {1: read_write_model.Camera(id=1, model="PINHOLE", width=640, height=480, params=np.array([500.0, 510.0, 320.0, 240.0])),
+               3: read_write_model.Camera(id=3, model="SIMPLE_RADIAL", width=320, height=200, params=np.array([300.0, 160.0, 100.0, 0.01]))}
+
+    images = {}
+    for i, image_id in enumerate(rng.permutation(np.arange(1, 41)).tolist()):
+        # Every fourth image has no 2D points
+        num_points2D = 0 if i % 4 == 0 else int(rng.choice([1, 7, 300]))
+        images[image_id] = read_write_model.Image(
+            id=image_id, qvec=rng.normal(size=4), tvec=rng.normal(size=3), camera_id=1 if i % 3 else 3,
+            name="dir {}/frame_{:04d}.{}".format(i % 2, image_id, "jpg" if i % 5 else "JPEG"),
+            xys=rng.uniform(-10, 700, size=(num_points2D, 2)),
+            point3D_ids=rng.integers(-1, NUM_POINTS, size=num_points2D))
+
+    points3D = {}
+    ids = rng.choice(2**40, size=NUM_POINTS, replace=False) + 1
+    # Many empty tracks, and some long ones
+    lengths = rng.choice([0, 0, 1, 2, 3, 12], size=NUM_POINTS)
+    for point3D_id, length in zip(ids.tolist(), lengths.tolist()):
+        points3D[point3D_id] = read_write_model.Point3D(
+            id=point3D_id, xyz=rng.normal(size=3) * 10, rgb=rng.integers(0, 256, size=3),
+            error=float(rng.exponential()), image_ids=rng.integers(1, 41, size=length),
+            point2D_idxs=rng.integers(0, 300, size=length))
+
+    read_write_model.write_model(cameras, images, points3D, str(path), ext=".bin")
+    # A model without any point
+    empty = path / "empty"
+    empty.mkdir()
+    read_write_model.write_images_binary({}, str(empty / "images.bin"))
+    read_write_model.write_points3D_binary({}, str(empty / "points3D.bin"))
+    return path
+
+@pytest.fixture(scope="module")
+def expected_images(model_dir):
+    return original_read_images_binary(os.path.join(model_dir, "images.bin"), read_write_model.Image)
+
+@pytest.fixture(scope="module")
+def expected_points3D(model_dir):
+    return original_read_points3D_binary(os.path.join(model_dir, "points3D.bin"))
+
+def test_read_write_model_images(model_dir, expected_images):
+    assert any(len(image.point3D_ids) == 0 for image in expected_images.values())
+    assert_identical(read_write_model.read_images_binary(os.path.join(model_dir, "images.bin")), expected_images)
+
+def test_read_write_model_points3D(model_dir, expected_points3D):
+    assert any(len(point.image_ids) == 0 for point in expected_points3D.values())
+    assert_identical(read_write_model.read_points3D_binary(os.path.join(model_dir, "points3D.bin")), expected_points3D)
+
+def test_read_model(model_dir, expected_images, expected_points3D):
+    cameras, images, points3D = read_write_model.read_model(str(model_dir), ext=".bin")
+    assert_identical(images, expected_images)
+    assert_identical(points3D, expected_points3D)
+    assert sorted(cameras) == [1, 3]
+
+def test_colmap_loader(model_dir):
+    images_path = os.path.join(model_dir, "images.bin")
+    assert_identical(colmap_loader.read_extrinsics_binary(images_path),
+                     original_read_images_binary(images_path, colmap_loader.Image))
+    points_path = os.path.join(model_dir, "points3D.bin")
+    assert_identical(colmap_loader.read_points3D_binary(points_path), original_loader_read_points3D_binary(points_path))
+
+def test_empty_model(model_dir):
+    empty = os.path.join(model_dir, "empty")
+    assert_identical(read_write_model.read_images_binary(os.path.join(empty, "images.bin")), {})
+    assert_identical(read_write_model.read_points3D_binary(os.path.join(empty, "points3D.bin")), {})
+    points_path = os.path.join(empty, "points3D.bin")
+    assert_identical(colmap_loader.read_points3D_binary(points_path), original_loader_read_points3D_binary(points_path))
+
+def test_track_arrays(model_dir, expected_points3D):
+    path = os.path.join(model_dir, "points3D.bin")
+    arrays = read_write_model.read_points3D_binary_arrays(path)
+    without_tracks = read_write_model.read_points3D_binary_arrays(path, tracks=False)
+    assert "track" not in without_tracks
+    for key in ("ids", "xyz", "rgb", "error", "track_offsets"):
+        assert np.array_equal(arrays[key], without_tracks[key])
+    assert np.array_equal(arrays["track_offsets"], np.cumsum([0] + [len(p.image_ids) for p in expected_points3D.values()]))
+    assert np.array_equal(arrays["track"]["image_id"], np.concatenate([p.image_ids for p in expected_points3D.values()]))
+    assert np.array_equal(arrays["track"]["point2D_idx"], np.concatenate([p.point2D_idxs for p in expected_points3D.values()]))
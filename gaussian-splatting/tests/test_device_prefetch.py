@@ -0,0 +1,130 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import random
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from scene.cameras import Camera
+from utils.camera_utils import ViewpointSampler
+from utils.device_prefetch import DevicePrefetcher, VIEW_TENSORS
+
+WIDTH, HEIGHT = 12, 8
+DEVICES = ["cpu"] + (["cuda"] if torch.cuda.is_available() else [])
+
+def make_cameras(n, compact_data=False, seed=0):
+    rng = np.random.default_rng(seed)
+    cameras = []
+    for i in range(n):
+        image = Image.fromarray(rng.integers(0, 256, (HEIGHT, WIDTH, 4), dtype=np.uint8))
+        invdepthmap = rng.random((HEIGHT, WIDTH), dtype=np.float32) if i % 2 else None
+        cameras.append(Camera((WIDTH, HEIGHT), i, np.eye(3), np.zeros(3), 1.0, 1.0, None, image, invdepthmap,
+                              "view{}".format(i), i, data_device="cpu", compact_data=compact_data))
+    return cameras
+
+def sampled(cameras, views, seed, prefetch=0):
+    random.seed(seed)
+    sampler = ViewpointSampler(cameras, prefetch=prefetch)
+    try:
+        return [sampler.next() for _ in range(views)]
+    finally:
+        sampler.close()
+
+@pytest.mark.parametrize("prefetch", [0, 3])
+def test_sampler_visits_every_view_once_per_epoch(prefetch):
+    cameras = make_cameras(7)
+    order = sampled(cameras, 4 * len(cameras), seed=1, prefetch=prefetch)
+    epochs = [order[i:i + len(cameras)] for i in range(0, len(order), len(cameras))]
+    for epoch in epochs:
+        assert sorted(camera.uid for camera in epoch) == list(range(len(cameras)))
+    # Each epoch is drawn anew
+    assert len({tuple(camera.uid for camera in epoch) for epoch in epochs}) > 1
+
+def test_sampler_matches_popping_random_views():
+    cameras = make_cameras(5)
+    random.seed(2)
+    expected = []
+    for _ in range(3):
+        stack = cameras.copy()
+        while stack:
+            expected.append(stack.pop(random.randint(0, len(stack) - 1)))
+    assert sampled(cameras, len(expected), seed=2) == expected
+
+@pytest.mark.parametrize("device", DEVICES)
+@pytest.mark.parametrize("depth", [0, 1, 3])
+@pytest.mark.parametrize("compact_data", [False, True])
+def test_prefetcher_returns_the_views_of_the_sampler_in_order(device, depth, compact_data):
+    cameras = make_cameras(5, compact_data)
+    views = 3 * len(cameras) + 1
+    expected = sampled(cameras, views, seed=3)
+
+    random.seed(3)
+    sampler = ViewpointSampler(cameras)
+    prefetcher = DevicePrefetcher(sampler, device, depth=depth)
+    batches = []
+    try:
+        for camera in expected:
+            got, tensors = prefetcher.next()
+            assert got is camera
+            # Copies made on arrival, compared once later batches have been staged
+            batches.append((camera, tensors, {k: None if t is None else t.clone() for k, t in tensors.items()}))
+    finally:
+        prefetcher.close()
+        sampler.close()
+
+    for camera, tensors, arrived in batches:
+        assert set(tensors) == set(VIEW_TENSORS)
+        for name in VIEW_TENSORS:
+            value = getattr(camera, name)
+            if name in VIEW_TENSORS[2:] and not camera.depth_reliable or value is None:
+                assert tensors[name] is None
+                continue
+            assert tensors[name].device.type == device
+            assert tensors[name].dtype == value.dtype
+            assert torch.equal(tensors[name].cpu(), value)
+            if device == "cpu" and not compact_data:
+                # Nothing to move or convert: the stored tensor itself
+                assert tensors[name] is camera.load_data()[name]
+            # Staging later views did not write into the tensors of this one
+            assert torch.equal(tensors[name], arrived[name])
+
+class FakeEvent:
+    def __init__(self, done):
+        self.done = done
+
+    def query(self):
+        return self.done
+
+def test_pinned_slots_are_not_reused_while_a_copy_reads_them():
+    prefetcher = DevicePrefetcher(None, "cpu", depth=0)
+    first = prefetcher._pinned_slot("original_image", 64)
+    # A copy out of the first slot is in flight
+    first[1] = FakeEvent(done=False)
+    second = prefetcher._pinned_slot("original_image", 64)
+    assert second is not first
+    assert second[0].data_ptr() != first[0].data_ptr()
+    assert first[1] is not None and second[1] is None
+
+    # Other tensors have their own slots
+    other = prefetcher._pinned_slot("alpha_mask", 64)
+    assert other is not first and other is not second
+
+    # Once the copy has completed, the first slot is handed out again, grown if needed
+    second[1] = FakeEvent(done=False)
+    first[1].done = True
+    buffer = first[0]
+    assert prefetcher._pinned_slot("original_image", 32) is first
+    assert first[0] is buffer and first[1] is None
+    first[1] = FakeEvent(done=True)
+    assert prefetcher._pinned_slot("original_image", 128) is first
+    assert first[0].numel() >= 128
+    assert len(prefetcher._pinned["original_image"]) == 2
@@ -0,0 +1,338 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import math
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import torch
+from torch import nn
+from PIL import Image
+from gaussian_renderer import render
+from scene import gaussian_store
+from scene.cameras import Camera
+from scene.gaussian_model import GaussianModel
+from scene.gaussian_store import owned_tensor
+
+GROUPS = ("xyz", "f_dc", "f_rest", "opacity", "scaling", "rotation")
+
+TRAINING_ARGS = SimpleNamespace(
+    percent_dense=0.01, position_lr_init=0.00016, position_lr_final=0.0000016, position_lr_delay_mult=0.01,
+    position_lr_max_steps=30_000, feature_lr=0.0025, opacity_lr=0.025, scaling_lr=0.005, rotation_lr=0.001,
+    exposure_lr_init=0.01, exposure_lr_final=0.001, exposure_lr_delay_steps=0, exposure_lr_delay_mult=0.0,
+    iterations=30_000, features_rest_moments="float32")
+
+class CatMaskGaussianModel(GaussianModel):
+    """GaussianModel with the torch.cat / boolean-mask optimizer updates that GaussianStore replaced."""
+
+    def replace_tensor_to_optimizer(self, tensor, name):
+        optimizable_tensors = {}
+        for group in self.optimizer.param_groups:
+            if group["name"] == name:
+                stored_state = self.optimizer.state.get(group['params'][0], None)
+                stored_state["exp_avg"] = torch.zeros_like(tensor)
+                stored_state["exp_avg_sq"] = torch.zeros_like(tensor)
+
+                del self.optimizer.state[group['params'][0]]
+                group["params"][0] = nn.Parameter(tensor.requires_grad_(True))
+                self.optimizer.state[group['params'][0]] = stored_state
+
+                optimizable_tensors[group["name"]] = group["params"][0]
+        return optimizable_tensors
+
+    def _prune_optimizer(self, mask):
+        optimizable_tensors = {}
+        for group in self.optimizer.param_groups:
+            stored_state = self.optimizer.state.get(group['params'][0], None)
+            if stored_state is not None:
+                stored_state["exp_avg"] = stored_state["exp_avg"][mask]
+                stored_state["exp_avg_sq"] = stored_state["exp_avg_sq"][mask]
+
+                del self.optimizer.state[group['params'][0]]
+                group["params"][0] = nn.Parameter((group["params"][0][mask].requires_grad_(True)))
+                self.optimizer.state[group['params'][0]] = stored_state
+
+                optimizable_tensors[group["name"]] = group["params"][0]
+            else:
+                group["params"][0] = nn.Parameter(group["params"][0][mask].requires_grad_(True))
+                optimizable_tensors[group["name"]] = group["params"][0]
+        return optimizable_tensors
+
+    def cat_tensors_to_optimizer(self, tensors_dict):
+        optimizable_tensors = {}
+        for group in self.optimizer.param_groups:
+            assert len(group["params"]) == 1
+            extension_tensor = tensors_dict[group["name"]]
+            stored_state = self.optimizer.state.get(group['params'][0], None)
+            if stored_state is not None:
+
+                stored_state["exp_avg"] = torch.cat((stored_state["exp_avg"], torch.zeros_like(extension_tensor)), dim=0)
+                stored_state["exp_avg_sq"] = torch.cat((stored_state["exp_avg_sq"], torch.zeros_like(extension_tensor)), dim=0)
+
+                del self.optimizer.state[group['params'][0]]
+                group["params"][0] = nn.Parameter(torch.cat((group["params"][0], extension_tensor), dim=0).requires_grad_(True))
+                self.optimizer.state[group['params'][0]] = stored_state
+
+                optimizable_tensors[group["name"]] = group["params"][0]
+            else:
+                group["params"][0] = nn.Parameter(torch.cat((group["params"][0], extension_tensor), dim=0).requires_grad_(True))
+                optimizable_tensors[group["name"]] = group["params"][0]
+
+        return optimizable_tensors
+
+    def densify_and_prune(self, max_grad, min_opacity, extent, max_screen_size, radii):
+        # Split sources pruned right after the split, then a second prune
+        grads = self.xyz_gradient_accum / self.denom
+        grads[grads.isnan()] = 0.0
+
+        self.tmp_radii = radii
+        self.densify_and_clone(grads, max_grad, extent)
+        self.densify_and_split(grads, max_grad, extent)
+
+        prune_mask = (self.get_opacity < min_opacity).squeeze()
+        if max_screen_size:
+            big_points_vs = self.max_radii2D > max_screen_size
+            big_points_ws = self.get_scaling.max(dim=1).values > 0.1 * extent
+            prune_mask = torch.logical_or(torch.logical_or(prune_mask, big_points_vs), big_points_ws)
+        self.prune_points(prune_mask)
+        self.tmp_radii = None
+
+def make_model(cls, n=400, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    model = cls(3)
+    model.active_sh_degree = 3
+    model.spatial_lr_scale = 1.0
+    model._xyz = nn.Parameter(torch.randn(n, 3, generator=g))
+    model._features_dc = nn.Parameter(torch.randn(n, 1, 3, generator=g))
+    model._features_rest = nn.Parameter(torch.randn(n, 15, 3, generator=g) * 0.1)
+    # A spread of opacities below and above the pruning threshold
+    model._opacity = nn.Parameter(torch.randn(n, 1, generator=g) * 3)
+    # Small and large Gaussians, so that both clone and split select rows
+    model._scaling = nn.Parameter(torch.randn(n, 3, generator=g) - 4.5)
+    model._rotation = nn.Parameter(torch.randn(n, 4, generator=g))
+    model._exposure = nn.Parameter(torch.eye(3, 4)[None])
+    model.max_radii2D = torch.zeros(n)
+    model.training_setup(TRAINING_ARGS)
+    return model
+
+def train_steps(models, steps, seed):
+    g = torch.Generator().manual_seed(seed)
+    n = models[0].get_xyz.shape[0]
+    for _ in range(steps):
+        grads = {group["name"]: torch.randn(group["params"][0].shape, generator=g) for group in models[0].optimizer.param_groups}
+        for model in models:
+            for group in model.optimizer.param_groups:
+                group["params"][0].grad = grads[group["name"]].clone()
+            model.optimizer.step()
+            model.optimizer.zero_grad(set_to_none=True)
+    # Densification statistics
+    accum = torch.rand(n, 1, generator=g) * 0.0004
+    denom = torch.randint(0, 3, (n, 1), generator=g).float()
+    radii = torch.randint(0, 30, (n,), generator=g)
+    for model in models:
+        model.xyz_gradient_accum = accum.clone()
+        model.denom = denom.clone()
+        model.max_radii2D = radii.float()
+    return radii
+
+def assert_same_state(new, old):
+    assert len(new.optimizer.param_groups) == len(old.optimizer.param_groups)
+    for new_group, old_group in zip(new.optimizer.param_groups, old.optimizer.param_groups):
+        name = new_group["name"]
+        assert name == old_group["name"]
+        new_param, old_param = new_group["params"][0], old_group["params"][0]
+        assert isinstance(new_param, nn.Parameter) and new_param.requires_grad
+        assert new_param is getattr(new, {"xyz": "_xyz", "f_dc": "_features_dc", "f_rest": "_features_rest",
+                                          "opacity": "_opacity", "scaling": "_scaling", "rotation": "_rotation"}[name])
+        assert torch.equal(new_param, old_param), name
+        new_state, old_state = new.optimizer.state[new_param], old.optimizer.state[old_param]
+        assert sorted(new_state) == sorted(old_state)
+        for field in new_state:
+            assert torch.equal(new_state[field], old_state[field]), "{} {}".format(name, field)
+    for field in ("xyz_gradient_accum", "denom", "max_radii2D"):
+        assert torch.equal(getattr(new, field), getattr(old, field)), field
+
+@pytest.mark.parametrize("compact_chunk", [gaussian_store.COMPACT_CHUNK, 7])
+def test_store_matches_cat_and_mask(monkeypatch, compact_chunk):
+    monkeypatch.setattr(gaussian_store, "COMPACT_CHUNK", compact_chunk)
+    new, old = make_model(GaussianModel), make_model(CatMaskGaussianModel)
+    assert_same_state(new, old)
+    train_steps((new, old), steps=1, seed=99)
+    assert sorted(new.optimizer.state[new._xyz]) == ["exp_avg", "exp_avg_sq", "step"]
+
+    sizes = [new.get_xyz.shape[0]]
+    for round in range(4):
+        radii = train_steps((new, old), steps=3, seed=round)
+        for model in (new, old):
+            torch.manual_seed(100 + round)
+            model.densify_and_prune(0.0002, 0.005, 1.0, 20, radii)
+        assert_same_state(new, old)
+        sizes.append(new.get_xyz.shape[0])
+
+        if round == 1:
+            for model in (new, old):
+                model.reset_opacity()
+            assert_same_state(new, old)
+
+    # Rows were added and removed, and the buffers grew past their first capacity
+    assert len(set(sizes)) > 2
+    assert new.store.capacity("xyz") > sizes[0] * gaussian_store.GROWTH
+
+    train_steps((new, old), steps=2, seed=10)
+    assert_same_state(new, old)
+
+def test_split_prune_row_order():
+    """Merged split + prune keeps the surviving rows in the order of split, then prune."""
+    new, old = make_model(GaussianModel), make_model(CatMaskGaussianModel)
+    radii = train_steps((new, old), steps=2, seed=0)
+    # Tag every row with its index so that the order is visible in the parameters
+    tags = torch.arange(new.get_xyz.shape[0], dtype=torch.float32)
+    for model in (new, old):
+        with torch.no_grad():
+            model._xyz[:, 0] = tags
+    grads = new.xyz_gradient_accum / new.denom
+    grads[grads.isnan()] = 0.0
+    for model in (new, old):
+        torch.manual_seed(0)
+        model.tmp_radii = radii
+        model.densify_and_clone(grads, 0.0002, 1.0)
+        if model is new:
+            split_filter = model.densify_and_split(grads, 0.0002, 1.0, defer_prune=True)
+            assert split_filter.any()
+            prune_mask = (model.get_opacity < 0.005).squeeze()
+            model.prune_points(torch.logical_or(prune_mask, split_filter))
+        else:
+            model.densify_and_split(grads, 0.0002, 1.0)
+            model.prune_points((model.get_opacity < 0.005).squeeze())
+    assert torch.equal(new._xyz[:, 0], old._xyz[:, 0])
+    assert_same_state(new, old)
+
+def test_store_owned_tensor_and_widen():
+    model = make_model(GaussianModel, n=50)
+    model.store.append({name: torch.zeros((3,) + model.optimizer.param_groups[i]["params"][0].shape[1:])
+                        for i, name in enumerate(GROUPS)})
+    xyz = model.optimizer.param_groups[0]["params"][0]
+    # A view into the capacity buffer; owned_tensor copies only its rows
+    assert xyz.untyped_storage().nbytes() > xyz.numel() * xyz.element_size()
+    owned = owned_tensor(xyz)
+    assert isinstance(owned, nn.Parameter) and torch.equal(owned, xyz)
+    assert owned.untyped_storage().nbytes() == owned.numel() * owned.element_size()
+
+    rest = model.optimizer.param_groups[2]["params"][0]
+    widened = model.store.widen("f_rest", 20)["f_rest"]
+    assert widened.shape == (53, 20, 3)
+    assert torch.equal(widened[:, :15], rest) and not widened[:, 15:].any()
+
+def test_bfloat16_features_rest_moments():
+    """N steps with bfloat16 f_rest moments stay close to the same steps with float32 moments."""
+    masked_model = lambda sh_degree: GaussianModel(sh_degree, optimizer_type="masked_adam")
+    fp32, bf16 = make_model(masked_model), make_model(masked_model)
+    bf16.training_setup(SimpleNamespace(**dict(vars(TRAINING_ARGS), features_rest_moments="bfloat16")))
+    start = fp32._features_rest.detach().clone()
+    n = start.shape[0]
+    g = torch.Generator().manual_seed(0)
+    for _ in range(100):
+        visible = torch.rand(n, generator=g) < 0.7
+        noise = {group["name"]: torch.randn(group["params"][0].shape, generator=g) * 0.1 for group in fp32.optimizer.param_groups}
+        for model in (fp32, bf16):
+            for group in model.optimizer.param_groups:
+                # Gradient of a quadratic pulling every parameter to zero, plus noise
+                group["params"][0].grad = group["params"][0].detach() + noise[group["name"]]
+            model.optimizer.step(visible, n)
+            model.optimizer.zero_grad(set_to_none=True)
+
+    state = bf16.optimizer.state[bf16._features_rest]
+    assert state["exp_avg"].dtype == state["exp_avg_sq"].dtype == torch.bfloat16
+    assert bf16._features_rest.dtype == torch.float32
+    # The other groups keep float32 moments and follow the same steps exactly
+    for name in ("_xyz", "_features_dc", "_opacity", "_scaling", "_rotation"):
+        assert torch.equal(getattr(bf16, name), getattr(fp32, name)), name
+    moved = (fp32._features_rest - start).abs()
+    drift = (bf16._features_rest - fp32._features_rest).abs()
+    assert moved.mean() > 1e-3
+    assert drift.mean() < 0.01 * moved.mean()
+    assert drift.max() < 0.05 * moved.max()
+    torch.testing.assert_close(state["exp_avg"].float(), fp32.optimizer.state[fp32._features_rest]["exp_avg"], rtol=0.02, atol=1e-3)
+
+def render_step(model, camera, separate_sh):
+    pipe = SimpleNamespace(torch_rasterizer=True, debug=False, antialiasing=False,
+                           compute_cov3D_python=False, convert_SHs_python=False)
+    out = render(camera, model, pipe, torch.zeros(3), separate_sh=separate_sh)
+    out["render"].square().mean().backward()
+    visible = out["radii"] > 0
+    assert visible.any()
+    if isinstance(model.optimizer, torch.optim.Adam):
+        model.optimizer.step()
+    else:
+        model.optimizer.step(visible, visible.shape[0])
+    model.optimizer.zero_grad(set_to_none=True)
+
+@pytest.mark.parametrize("optimizer_type", ["default", "masked_adam"])
+@pytest.mark.parametrize("separate_sh", [False, True])
+def test_sh_degree_zero_step_then_widen(optimizer_type, separate_sh):
+    n = 24
+    g = torch.Generator().manual_seed(0)
+    model = GaussianModel(3, optimizer_type)
+    assert model.active_sh_degree == 0
+    # As allocated by create_from_pcd: band 1 exists from the start, so no tensor is (N, 0, 3)
+    assert model._sh_rest_size() == 3
+    model.spatial_lr_scale = 1.0
+    model._xyz = nn.Parameter(torch.cat((torch.rand(n, 2, generator=g) - 0.5, 2 + torch.rand(n, 1, generator=g)), dim=1))
+    model._features_dc = nn.Parameter(torch.rand(n, 1, 3, generator=g))
+    model._features_rest = nn.Parameter(torch.zeros(n, 3, 3))
+    model._opacity = nn.Parameter(torch.zeros(n, 1))
+    model._scaling = nn.Parameter(torch.full((n, 3), -2.5))
+    model._rotation = nn.Parameter(torch.tensor([[1.0, 0.0, 0.0, 0.0]]).repeat(n, 1))
+    model._exposure = nn.Parameter(torch.eye(3, 4)[None])
+    model.max_radii2D = torch.zeros(n)
+    model.training_setup(TRAINING_ARGS)
+
+    image = Image.fromarray(np.zeros((24, 32, 3), dtype=np.uint8))
+    fov = math.radians(60.0)
+    camera = Camera((32, 24), 0, np.eye(3), np.zeros(3), fov, fov * 24 / 32, None, image, None, "view", 0, data_device="cpu")
+
+    # Degree 0: the SH rest bands take no part in the colors and stay zero
+    xyz = model.get_xyz.detach().clone()
+    render_step(model, camera, separate_sh)
+    assert not torch.equal(model.get_xyz, xyz)
+    assert not model._features_rest.any()
+    assert model.optimizer.state[model._features_rest]["exp_avg"].shape == (n, 3, 3)
+
+    model.oneupSHdegree()
+    assert model._features_rest.shape == (n, 3, 3)
+    render_step(model, camera, separate_sh)
+    band1 = model._features_rest.detach().clone()
+    assert band1.any()
+
+    model.oneupSHdegree()
+    rest = model.optimizer.param_groups[2]["params"][0]
+    assert rest is model._features_rest and rest.shape == (n, 8, 3)
+    assert torch.equal(rest[:, :3], band1) and not rest[:, 3:].any()
+    state = model.optimizer.state[rest]
+    assert state["exp_avg"].shape == state["exp_avg_sq"].shape == (n, 8, 3)
+    assert not state["exp_avg"][:, 3:].any()
+    render_step(model, camera, separate_sh)
+    assert model._features_rest[:, 3:].any()
+
+def test_restore_widens_zero_width_features_rest():
+    model = make_model(GaussianModel, n=30)
+    model.active_sh_degree = 0
+    # A checkpoint from before band 1 was always allocated
+    model._features_rest = nn.Parameter(torch.zeros(30, 0, 3))
+    model.training_setup(TRAINING_ARGS)
+    checkpoint = model.capture()
+    restored = GaussianModel(3)
+    restored._exposure = model._exposure
+    restored.restore(checkpoint, TRAINING_ARGS)
+    assert restored._features_rest.shape == (30, 3, 3)
+    assert restored.optimizer.param_groups[2]["params"][0] is restored._features_rest
+    train_steps((restored,), steps=1, seed=0)
+    assert restored.optimizer.state[restored._features_rest]["exp_avg"].shape == (30, 3, 3)
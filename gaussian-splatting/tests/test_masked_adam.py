@@ -0,0 +1,199 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import pytest
+import torch
+from torch import nn
+from utils import masked_adam
+from utils.masked_adam import MaskedAdam
+
+SHAPES = {"xyz": (3,), "f_rest": (15, 3)}
+LR = {"xyz": 0.01, "f_rest": 0.0025 / 20.0}
+
+def make_params(n, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    return {name: torch.randn((n,) + shape, generator=g) for name, shape in SHAPES.items()}
+
+def make_optimizer(cls, params, moment_dtype=None):
+    groups = [{"params": [nn.Parameter(t.clone())], "lr": LR[name], "name": name} for name, t in params.items()]
+    if moment_dtype is not None:
+        groups[1]["moment_dtype"] = moment_dtype
+    return cls(groups, lr=0.0, eps=1e-15)
+
+def set_grads(optimizer, g):
+    for group in optimizer.param_groups:
+        param = group["params"][0]
+        param.grad = torch.randn(param.shape, generator=g)
+
+def copy_grads(src, dst):
+    for a, b in zip(src.param_groups, dst.param_groups):
+        b["params"][0].grad = a["params"][0].grad.clone()
+
+def visibility_steps(n, steps, seed):
+    g = torch.Generator().manual_seed(seed)
+    masks = torch.rand(steps, n, generator=g) < 0.5
+    # One row is never visible, one always
+    masks[:, 0] = False
+    masks[:, 1] = True
+    return masks
+
+@pytest.fixture(params=["in_place", "gather"])
+def masked_path(request, monkeypatch):
+    """Every masked step runs in place over all rows, or gathers rows with a capacity from the previous step."""
+    if request.param == "in_place":
+        monkeypatch.setattr(masked_adam, "GATHER_FRACTION", 0.0)
+    else:
+        # With a small capacity, the steps with more visible rows than the previous one overflow it
+        monkeypatch.setattr(masked_adam, "GATHER_FRACTION", 1.0)
+        monkeypatch.setattr(masked_adam, "MIN_CAPACITY", 1)
+    return request.param
+
+@pytest.mark.parametrize("masked", [False, True])
+def test_matches_dense_adam_when_all_rows_are_visible(masked, masked_path):
+    n = 64
+    params = make_params(n)
+    dense, sparse = make_optimizer(torch.optim.Adam, params), make_optimizer(MaskedAdam, params)
+    g = torch.Generator().manual_seed(1)
+    for _ in range(20):
+        set_grads(dense, g)
+        copy_grads(dense, sparse)
+        dense.step()
+        if masked:
+            sparse.step(torch.ones(n, dtype=torch.bool), n)
+        else:
+            sparse.step()
+
+    for d, s in zip(dense.param_groups, sparse.param_groups):
+        d_param, s_param = d["params"][0], s["params"][0]
+        torch.testing.assert_close(s_param, d_param, rtol=1e-5, atol=1e-5)
+        d_state, s_state = dense.state[d_param], sparse.state[s_param]
+        torch.testing.assert_close(s_state["exp_avg"], d_state["exp_avg"], rtol=1e-5, atol=1e-6)
+        torch.testing.assert_close(s_state["exp_avg_sq"], d_state["exp_avg_sq"], rtol=1e-5, atol=1e-6)
+        assert torch.equal(s_state["step"], torch.full((n,), float(d_state["step"])))
+
+def test_per_row_bias_correction(masked_path):
+    """Each row follows a dense Adam that only steps in the iterations where the row is visible."""
+    n, steps = 16, 12
+    params = make_params(n)
+    sparse = make_optimizer(MaskedAdam, params)
+    # One single-row dense Adam per row
+    rows = [make_optimizer(torch.optim.Adam, {name: t[i:i + 1] for name, t in params.items()}) for i in range(n)]
+    masks = visibility_steps(n, steps, seed=2)
+    g = torch.Generator().manual_seed(3)
+    for mask in masks:
+        set_grads(sparse, g)
+        sparse.step(mask, n)
+        for i in mask.nonzero().squeeze(1).tolist():
+            for group, row_group in zip(sparse.param_groups, rows[i].param_groups):
+                row_group["params"][0].grad = group["params"][0].grad[i:i + 1].clone()
+            rows[i].step()
+
+    for gi, group in enumerate(sparse.param_groups):
+        param = group["params"][0]
+        state = sparse.state[param]
+        assert torch.equal(state["step"], masks.sum(dim=0).float())
+        for i in range(n):
+            row_param = rows[i].param_groups[gi]["params"][0]
+            torch.testing.assert_close(param[i:i + 1], row_param, rtol=1e-5, atol=1e-5)
+            if masks[:, i].any():
+                row_state = rows[i].state[row_param]
+                torch.testing.assert_close(state["exp_avg"][i:i + 1], row_state["exp_avg"], rtol=1e-5, atol=1e-6)
+                torch.testing.assert_close(state["exp_avg_sq"][i:i + 1], row_state["exp_avg_sq"], rtol=1e-5, atol=1e-6)
+
+@pytest.mark.parametrize("moment_dtype", [None, torch.bfloat16])
+def test_invisible_rows_are_untouched(moment_dtype, masked_path):
+    n = 32
+    sparse = make_optimizer(MaskedAdam, make_params(n), moment_dtype)
+    masks = visibility_steps(n, 6, seed=4)
+    g = torch.Generator().manual_seed(5)
+    for mask in masks:
+        set_grads(sparse, g)
+        before = [(group["params"][0].clone(), {k: v.clone() for k, v in sparse.state[group["params"][0]].items()})
+                  for group in sparse.param_groups]
+        sparse.step(mask, n)
+        hidden = ~mask
+        for group, (param_before, state_before) in zip(sparse.param_groups, before):
+            param = group["params"][0]
+            assert torch.equal(param[hidden], param_before[hidden])
+            assert not torch.equal(param[mask], param_before[mask])
+            for field, value in state_before.items():
+                assert sparse.state[param][field].dtype == value.dtype
+                assert torch.equal(sparse.state[param][field][hidden], value[hidden]), field
+
+    # A row that was never visible keeps its initial values and zero moments
+    for group in sparse.param_groups:
+        state = sparse.state[group["params"][0]]
+        assert state["step"][0] == 0
+        assert not state["exp_avg"][0].any() and not state["exp_avg_sq"][0].any()
+        assert torch.isfinite(group["params"][0]).all()
+    assert sparse.param_groups[1]["params"][0].dtype == torch.float32
+    if moment_dtype is not None:
+        assert sparse.state[sparse.param_groups[1]["params"][0]]["exp_avg"].dtype == moment_dtype
+
+def test_masked_step_does_not_read_the_mask_on_the_host(monkeypatch, masked_path):
+    n = 32
+    sparse = make_optimizer(MaskedAdam, make_params(n))
+    g = torch.Generator().manual_seed(6)
+    masks = visibility_steps(n, 3, seed=7)
+
+    def host_read(*args, **kwargs):
+        raise AssertionError("host-device sync in MaskedAdam.step")
+    for name in ("nonzero", "item", "tolist", "numpy"):
+        monkeypatch.setattr(torch.Tensor, name, host_read)
+    monkeypatch.setattr(torch, "nonzero", host_read)
+    for mask in masks:
+        set_grads(sparse, g)
+        sparse.step(mask, n)
+    # An empty mask is a no-op as well
+    set_grads(sparse, g)
+    before = sparse.param_groups[0]["params"][0].clone()
+    sparse.step(torch.zeros(n, dtype=torch.bool), n)
+    monkeypatch.undo()
+    assert torch.equal(sparse.param_groups[0]["params"][0], before)
+
+def test_masked_step_gathers_the_visible_rows(monkeypatch):
+    monkeypatch.setattr(masked_adam, "MIN_CAPACITY", 1)
+    monkeypatch.setattr(masked_adam, "GATHER_FRACTION", 0.5)
+    n = 400
+    sparse = make_optimizer(MaskedAdam, make_params(n))
+    reference = make_optimizer(MaskedAdam, make_params(n))
+    gathered = []
+    gather = sparse._gather
+    monkeypatch.setattr(sparse, "_gather", lambda rows: (gathered.append(rows.shape[0]), gather(rows))[1])
+
+    g = torch.Generator().manual_seed(8)
+    ratios = [1.0, 0.05, 0.05, 0.5, 0.25, 0.25, 1.0]
+    calls = []
+    for ratio in ratios:
+        mask = torch.rand(n, generator=g) < ratio
+        set_grads(sparse, g)
+        copy_grads(sparse, reference)
+        start = len(gathered)
+        sparse.step(mask, n)
+        calls.append((int(mask.sum()), gathered[start:]))
+        # Without an estimate from the previous step, the step runs in place over every row
+        reference._last_visible = None
+        reference.step(mask, n)
+
+    # No estimate yet, or many rows visible in the previous step: in place
+    assert calls[0][1] == [] and calls[1][1] == [] and calls[4][1] == []
+    # Then the capacity follows the previous step: a few rows at 5% visibility ...
+    assert calls[2][1][0] < n // 10 and calls[2][1][-1] < n // 10
+    assert calls[5][1][0] < n // 2
+    # ... and a second pass for the rows beyond it when more become visible
+    assert len(calls[3][1]) == 2 and sum(calls[3][1]) == calls[3][0]
+    assert len(calls[6][1]) == 2 and sum(calls[6][1]) == n
+
+    for group, ref_group in zip(sparse.param_groups, reference.param_groups):
+        param, ref_param = group["params"][0], ref_group["params"][0]
+        torch.testing.assert_close(param, ref_param, rtol=1e-6, atol=1e-6)
+        for field in ("exp_avg", "exp_avg_sq", "step"):
+            torch.testing.assert_close(sparse.state[param][field], reference.state[ref_param][field], rtol=1e-5, atol=1e-8)
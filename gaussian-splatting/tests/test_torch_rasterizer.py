@@ -0,0 +1,285 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import math
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import torch
+from torch import nn
+from PIL import Image
+from gaussian_renderer import torch_rasterizer, render
+from gaussian_renderer.torch_rasterizer import GaussianRasterizationSettings, GaussianRasterizer, BLOCK_X, BLOCK_Y
+from scene.cameras import Camera
+from scene.gaussian_model import GaussianModel
+from utils.graphics_utils import getWorld2View2, getProjectionMatrix
+from utils.sh_utils import eval_sh
+
+WIDTH, HEIGHT = 40, 24
+FOV = math.radians(60.0)
+
+def make_settings(dtype=torch.float64, device="cpu", antialiasing=False, sh_degree=0, bg=(0.2, 0.4, 0.6)):
+    view = torch.tensor(getWorld2View2(np.eye(3), np.array([0.1, -0.2, 0.0]))).transpose(0, 1)
+    proj = getProjectionMatrix(znear=0.01, zfar=100.0, fovX=FOV, fovY=FOV * HEIGHT / WIDTH).transpose(0, 1)
+    full = view.unsqueeze(0).bmm(proj.to(view.dtype).unsqueeze(0)).squeeze(0)
+    return GaussianRasterizationSettings(
+        image_height=HEIGHT, image_width=WIDTH,
+        tanfovx=math.tan(FOV * 0.5), tanfovy=math.tan(FOV * HEIGHT / WIDTH * 0.5),
+        bg=torch.tensor(bg, dtype=dtype, device=device), scale_modifier=1.0,
+        viewmatrix=view.to(device, dtype), projmatrix=full.to(device, dtype),
+        sh_degree=sh_degree, campos=view.inverse()[3, :3].to(device, dtype),
+        prefiltered=False, debug=False, antialiasing=antialiasing)
+
+def make_gaussians(n=24, dtype=torch.float64, device="cpu", seed=0, opaque=False):
+    g = torch.Generator().manual_seed(seed)
+    z = torch.rand(n, generator=g) * 4 + 2
+    xy = (torch.rand(n, 2, generator=g) * 2 - 1) * z[:, None] * 0.6
+    means = torch.cat((xy, z[:, None]), dim=1)
+    # One Gaussian behind the camera, one at the near plane and one far outside the frustum
+    means[0] = torch.tensor([0.0, 0.0, -1.0])
+    means[1] = torch.tensor([0.0, 0.1, 0.1])
+    means[2] = torch.tensor([50.0, 0.0, 3.0])
+    tensors = dict(
+        means3D=means,
+        opacities=torch.rand(n, 1, generator=g) * 0.9 + 0.05,
+        scales=torch.exp(torch.rand(n, 3, generator=g) * 1.5 - 3.5),
+        rotations=nn.functional.normalize(torch.randn(n, 4, generator=g)),
+        colors=torch.rand(n, 3, generator=g),
+    )
+    if opaque:
+        # Large, nearly opaque Gaussians: most pixels stop blending early
+        tensors["opacities"] = tensors["opacities"] * 0.05 + 0.94
+        tensors["scales"] = tensors["scales"] * 8
+    return {k: v.to(device, dtype).requires_grad_(True) for k, v in tensors.items()}
+
+def rasterize(settings, gaussians, **overrides):
+    means2D = torch.zeros_like(gaussians["means3D"], requires_grad=True)
+    inputs = dict(means3D=gaussians["means3D"], means2D=means2D, opacities=gaussians["opacities"],
+                  colors_precomp=gaussians["colors"], scales=gaussians["scales"], rotations=gaussians["rotations"])
+    inputs.update(overrides)
+    color, radii, invdepth = GaussianRasterizer(settings)(**inputs)
+    return color, radii, invdepth, means2D
+
+def reference_rasterize(settings, means3D, means2D, opacities, colors, scales, rotations):
+    """
+    Direct transcription of the CUDA rasterizer: preprocessing one Gaussian at a time, then for
+    every pixel a front-to-back walk over the depth-sorted Gaussians whose tile rectangle covers
+    the pixel's tile, with the same skip and early-termination rules. No tiling, no padding.
+    """
+    view, proj = settings.viewmatrix, settings.projmatrix
+    W, H = settings.image_width, settings.image_height
+    grid_x, grid_y = (W + BLOCK_X - 1) // BLOCK_X, (H + BLOCK_Y - 1) // BLOCK_Y
+    focal_x, focal_y = W / (2.0 * settings.tanfovx), H / (2.0 * settings.tanfovy)
+
+    radii = torch.zeros(means3D.shape[0], dtype=torch.int32)
+    splats = []
+    for i in range(means3D.shape[0]):
+        p_view = means3D[i] @ view[:3, :3] + view[3, :3]
+        if p_view[2] <= 0.2:
+            continue
+        p_hom = torch.cat((means3D[i], means3D.new_ones(1))) @ proj
+        p_proj = p_hom[:3] / (p_hom[3] + 0.0000001)
+
+        r, x, y, z = rotations[i]
+        R = torch.stack((1 - 2 * (y * y + z * z), 2 * (x * y - r * z), 2 * (x * z + r * y),
+                         2 * (x * y + r * z), 1 - 2 * (x * x + z * z), 2 * (y * z - r * x),
+                         2 * (x * z - r * y), 2 * (y * z + r * x), 1 - 2 * (x * x + y * y))).view(3, 3)
+        s = scales[i] * settings.scale_modifier
+        sigma = R @ torch.diag(s * s) @ R.T
+
+        tz = p_view[2]
+        limx, limy = 1.3 * settings.tanfovx, 1.3 * settings.tanfovy
+        tx = torch.clamp(p_view[0] / tz, -limx, limx) * tz
+        ty = torch.clamp(p_view[1] / tz, -limy, limy) * tz
+        zero = tz * 0
+        J = torch.stack((focal_x / tz, zero, -(focal_x * tx) / (tz * tz),
+                         zero, focal_y / tz, -(focal_y * ty) / (tz * tz))).view(2, 3)
+        T = J @ view[:3, :3].T
+        cov = T @ sigma @ T.T
+
+        a, b, c = cov[0, 0] + 0.3, cov[0, 1], cov[1, 1] + 0.3
+        det = a * c - b * b
+        if det == 0:
+            continue
+        opacity = opacities[i, 0]
+        if settings.antialiasing:
+            det_cov = (a - 0.3) * (c - 0.3) - b * b
+            opacity = opacity * torch.sqrt(torch.clamp_min(det_cov / det, 0.000025))
+        conic = (c / det, -b / det, a / det)
+        mid = 0.5 * (a + c).item()
+        lambda1 = mid + math.sqrt(max(0.1, mid * mid - det.item()))
+        radius = math.ceil(3.0 * math.sqrt(lambda1))
+        px = ((p_proj[0] + means2D[i, 0] + 1.0) * W - 1.0) * 0.5
+        py = ((p_proj[1] + means2D[i, 1] + 1.0) * H - 1.0) * 0.5
+        rect = (min(grid_x, max(0, math.floor((px.item() - radius) / BLOCK_X))),
+                min(grid_y, max(0, math.floor((py.item() - radius) / BLOCK_Y))),
+                min(grid_x, max(0, math.floor((px.item() + radius + BLOCK_X - 1) / BLOCK_X))),
+                min(grid_y, max(0, math.floor((py.item() + radius + BLOCK_Y - 1) / BLOCK_Y))))
+        if (rect[2] - rect[0]) * (rect[3] - rect[1]) == 0:
+            continue
+        radii[i] = radius
+        splats.append((tz.item(), i, px, py, conic, opacity, colors[i], 1.0 / tz, rect))
+
+    pix_y, pix_x = torch.meshgrid(torch.arange(H, dtype=means3D.dtype), torch.arange(W, dtype=means3D.dtype), indexing="ij")
+    tile_x, tile_y = pix_x.long() // BLOCK_X, pix_y.long() // BLOCK_Y
+    T = torch.ones(H, W, dtype=means3D.dtype)
+    color = torch.zeros(3, H, W, dtype=means3D.dtype)
+    invdepth = torch.zeros(H, W, dtype=means3D.dtype)
+    done = torch.zeros(H, W, dtype=torch.bool)
+    for _, _, px, py, conic, opacity, rgb, inv_z, rect in sorted(splats, key=lambda s: (s[0], s[1])):
+        in_tile = (tile_x >= rect[0]) & (tile_x < rect[2]) & (tile_y >= rect[1]) & (tile_y < rect[3])
+        d_x, d_y = px - pix_x, py - pix_y
+        power = -0.5 * (conic[0] * d_x * d_x + conic[2] * d_y * d_y) - conic[1] * d_x * d_y
+        alpha = torch.clamp_max(opacity * torch.exp(torch.clamp_max(power, 0.0)), 0.99)
+        active = in_tile & ~done & (power <= 0) & (alpha >= 1.0 / 255.0)
+        test_T = T * (1 - alpha)
+        stop = active & (test_T < 0.0001)
+        done = done | stop
+        active = active & ~stop
+        weight = torch.where(active, alpha * T, torch.zeros_like(T))
+        color = color + weight * rgb[:, None, None]
+        invdepth = invdepth + weight * inv_z
+        T = torch.where(active, test_T, T)
+    color = color + T * settings.bg[:, None, None]
+    return color, radii, invdepth[None]
+
+def grads(outputs, inputs):
+    color, invdepth = outputs
+    g = torch.Generator().manual_seed(1)
+    loss = (color * torch.rand(color.shape, generator=g, dtype=color.dtype)).sum() + (invdepth * 0.5).sum()
+    return torch.autograd.grad(loss, inputs, allow_unused=True)
+
+@pytest.mark.parametrize("antialiasing,opaque", [(False, False), (True, False), (False, True)])
+def test_matches_sequential_reference(antialiasing, opaque):
+    settings = make_settings(antialiasing=antialiasing)
+    gaussians = make_gaussians(n=48 if opaque else 24, opaque=opaque)
+    color, radii, invdepth, means2D = rasterize(settings, gaussians)
+    ref_means2D = torch.zeros_like(means2D, requires_grad=True)
+    ref_color, ref_radii, ref_invdepth = reference_rasterize(settings, gaussians["means3D"], ref_means2D, gaussians["opacities"],
+                                                             gaussians["colors"], gaussians["scales"], gaussians["rotations"])
+
+    assert torch.equal(radii, ref_radii)
+    assert radii[:3].tolist() == [0, 0, 0]
+    assert (radii > 0).sum() > 10
+    torch.testing.assert_close(color, ref_color, rtol=1e-10, atol=1e-12)
+    torch.testing.assert_close(invdepth, ref_invdepth, rtol=1e-10, atol=1e-12)
+
+    inputs = [gaussians[k] for k in ("means3D", "opacities", "scales", "rotations", "colors")]
+    for name, g, ref_g in zip(["means3D", "opacities", "scales", "rotations", "colors", "means2D"],
+                              grads((color, invdepth), inputs + [means2D]),
+                              grads((ref_color, ref_invdepth), inputs + [ref_means2D])):
+        assert g is not None and g.abs().sum() > 0, name
+        torch.testing.assert_close(g, ref_g, rtol=1e-8, atol=1e-10, msg=name)
+
+def test_chunking_does_not_change_result(monkeypatch):
+    settings = make_settings()
+    gaussians = make_gaussians(n=64)
+    color, radii, invdepth, means2D = rasterize(settings, gaussians)
+    inputs = list(gaussians.values()) + [means2D]
+    expected = grads((color, invdepth), inputs)
+
+    # One tile per chunk
+    monkeypatch.setattr(torch_rasterizer, "CHUNK_ELEMENTS", 1)
+    chunked = rasterize(settings, gaussians, means2D=means2D)
+    assert torch.equal(chunked[1], radii)
+    torch.testing.assert_close(chunked[0], color, rtol=0, atol=1e-14)
+    torch.testing.assert_close(chunked[2], invdepth, rtol=0, atol=1e-14)
+    for g, ref_g in zip(grads((chunked[0], chunked[2]), inputs), expected):
+        torch.testing.assert_close(g, ref_g, rtol=0, atol=1e-12)
+
+def test_chunk_ranges_respect_bound(monkeypatch):
+    monkeypatch.setattr(torch_rasterizer, "CHUNK_ELEMENTS", 4 * BLOCK_X * BLOCK_Y)
+    counts = [0, 1, 3, 0, 2, 5, 1, 1, 0]
+    chunks = list(torch_rasterizer._tile_chunks(counts))
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(counts)
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    for start, end in chunks:
+        assert end - start == 1 or (end - start) * BLOCK_X * BLOCK_Y * max(counts[start:end]) <= torch_rasterizer.CHUNK_ELEMENTS
+
+def test_sh_and_covariance_inputs_match_precomputed():
+    settings = make_settings(sh_degree=2)
+    gaussians = make_gaussians()
+    n = gaussians["means3D"].shape[0]
+    shs = torch.randn(n, 9, 3, dtype=torch.float64, generator=torch.Generator().manual_seed(2)) * 0.3
+    dirs = nn.functional.normalize(gaussians["means3D"] - settings.campos)
+    colors = torch.clamp_min(eval_sh(2, shs.transpose(1, 2), dirs) + 0.5, 0.0)
+
+    expected = rasterize(settings, gaussians, colors_precomp=colors)
+    from_shs = rasterize(settings, gaussians, colors_precomp=None, shs=shs)
+    from_dc = rasterize(settings, gaussians, colors_precomp=None, dc=shs[:, :1], shs=shs[:, 1:])
+    for out in (from_shs, from_dc):
+        torch.testing.assert_close(out[0], expected[0])
+        assert torch.equal(out[1], expected[1])
+
+    cov = torch_rasterizer._covariance_3d(gaussians["scales"], gaussians["rotations"])
+    cov3D = torch.stack((cov[:, 0, 0], cov[:, 0, 1], cov[:, 0, 2], cov[:, 1, 1], cov[:, 1, 2], cov[:, 2, 2]), dim=1)
+    from_cov = rasterize(settings, gaussians, colors_precomp=colors, scales=None, rotations=None, cov3D_precomp=cov3D)
+    torch.testing.assert_close(from_cov[0], expected[0])
+    assert torch.equal(from_cov[1], expected[1])
+
+def test_requires_exactly_one_color_and_shape_input():
+    settings = make_settings()
+    gaussians = make_gaussians()
+    with pytest.raises(Exception):
+        rasterize(settings, gaussians, colors_precomp=None)
+    with pytest.raises(Exception):
+        rasterize(settings, gaussians, cov3D_precomp=torch.zeros(24, 6, dtype=torch.float64))
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs a GPU")
+def test_matches_cuda_rasterizer():
+    diff_gaussian_rasterization = pytest.importorskip("diff_gaussian_rasterization")
+    settings = make_settings(dtype=torch.float32, device="cuda", antialiasing=True)
+    gaussians = make_gaussians(n=256, dtype=torch.float32, device="cuda")
+    color, radii, invdepth, means2D = rasterize(settings, gaussians)
+
+    cuda_means2D = torch.zeros_like(means2D, requires_grad=True)
+    cuda_color, cuda_radii, cuda_invdepth = diff_gaussian_rasterization.GaussianRasterizer(settings)(
+        means3D=gaussians["means3D"], means2D=cuda_means2D, opacities=gaussians["opacities"],
+        colors_precomp=gaussians["colors"], scales=gaussians["scales"], rotations=gaussians["rotations"])
+
+    assert torch.equal(radii, cuda_radii)
+    torch.testing.assert_close(color, cuda_color, rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(invdepth, cuda_invdepth, rtol=1e-4, atol=1e-4)
+    inputs = list(gaussians.values())
+    for g, ref_g in zip(grads((color, invdepth), inputs + [means2D]), grads((cuda_color, cuda_invdepth), inputs + [cuda_means2D])):
+        torch.testing.assert_close(g, ref_g, rtol=1e-3, atol=1e-4)
+
+def test_render_on_cpu():
+    gaussians = make_gaussians(dtype=torch.float32)
+    pc = GaussianModel(3)
+    pc.active_sh_degree = 1
+    pc._xyz = nn.Parameter(gaussians["means3D"].detach().clone())
+    pc._features_dc = nn.Parameter(torch.rand(24, 1, 3))
+    pc._features_rest = nn.Parameter(torch.randn(24, 3, 3) * 0.1)
+    pc._opacity = nn.Parameter(torch.logit(gaussians["opacities"].detach()))
+    pc._scaling = nn.Parameter(torch.log(gaussians["scales"].detach()))
+    pc._rotation = nn.Parameter(gaussians["rotations"].detach().clone())
+
+    image = Image.fromarray(np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8))
+    camera = Camera((WIDTH, HEIGHT), 0, np.eye(3), np.array([0.1, -0.2, 0.0]), FOV, FOV * HEIGHT / WIDTH, None,
+                    image, None, "view", 0, data_device="cpu")
+
+    pipe = SimpleNamespace(torch_rasterizer=False, debug=False, antialiasing=False,
+                           compute_cov3D_python=False, convert_SHs_python=False)
+    bg = torch.zeros(3)
+    out = render(camera, pc, pipe, bg)
+    assert out["render"].shape == (3, HEIGHT, WIDTH)
+    assert out["depth"].shape == (1, HEIGHT, WIDTH)
+    out["render"].sum().backward()
+    assert out["viewspace_points"].grad is not None
+    assert pc._xyz.grad is not None and pc._features_rest.grad.abs().sum() > 0
+
+    # The Python SH and covariance paths of render() give the same image
+    separate = render(camera, pc, pipe, bg, separate_sh=True)["render"]
+    pipe_python = SimpleNamespace(**{**vars(pipe), "compute_cov3D_python": True, "convert_SHs_python": True})
+    python = render(camera, pc, pipe_python, bg)["render"]
+    torch.testing.assert_close(separate, out["render"])
+    torch.testing.assert_close(python, out["render"], rtol=1e-4, atol=1e-5)
@@ -11,7 +11,10 @@
 
 import os
 import torch
-from random import randint
+from utils.camera_utils import ViewpointSampler
+from utils.device_prefetch import DevicePrefetcher
+from utils.sync_counter import SyncCounter
+from utils.profiling import Profiler
 from utils.loss_utils import l1_loss, ssim
 from gaussian_renderer import render, network_gui
 import sys
@@ -20,6 +23,7 @@ from utils.general_utils import safe_state, get_expon_lr_func
 import uuid
 from tqdm import tqdm
 from utils.image_utils import psnr
+from utils.progress_utils import ProgressWriter
 from argparse import ArgumentParser, Namespace
 from arguments import ModelParams, PipelineParams, OptimizationParams
 try:
@@ -40,13 +44,17 @@ try:
 except:
     SPARSE_ADAM_AVAILABLE = False
 
-def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from):
+# Iterations between reads of the logged losses back to the host
+LOG_INTERVAL = 10
+
+def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from, progress_file=None, count_syncs=False, profile_file=""):
 
     if not SPARSE_ADAM_AVAILABLE and opt.optimizer_type == "sparse_adam":
-        sys.exit(f"Trying to use sparse adam but it is not installed, please install the correct rasterizer using pip install [3dgs_accel].")
+        print("Sparse adam from the accelerated rasterizer is not installed (pip install [3dgs_accel]), falling back to masked_adam.")
 
     first_iter = 0
     tb_writer = prepare_output_and_logger(dataset)
+    progress = ProgressWriter(progress_file if progress_file is not None else os.path.join(dataset.model_path, "progress.json"))
     gaussians = GaussianModel(dataset.sh_degree, opt.optimizer_type)
     scene = Scene(dataset, gaussians)
     gaussians.training_setup(opt)
@@ -57,35 +65,43 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
     bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
     background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
 
-    iter_start = torch.cuda.Event(enable_timing = True)
-    iter_end = torch.cuda.Event(enable_timing = True)
-
-    use_sparse_adam = opt.optimizer_type == "sparse_adam" and SPARSE_ADAM_AVAILABLE 
+    use_sparse_adam = opt.optimizer_type in ("sparse_adam", "masked_adam")
     depth_l1_weight = get_expon_lr_func(opt.depth_l1_weight_init, opt.depth_l1_weight_final, max_steps=opt.iterations)
 
-    viewpoint_stack = scene.getTrainCameras().copy()
-    viewpoint_indices = list(range(len(viewpoint_stack)))
-    ema_loss_for_log = 0.0
-    ema_Ll1depth_for_log = 0.0
+    viewpoint_sampler = ViewpointSampler(scene.getTrainCameras(), prefetch=dataset.prefetch_views if dataset.lazy_images else 0)
+    data_prefetcher = DevicePrefetcher(viewpoint_sampler, "cuda", depth=dataset.prefetch_depth)
+    # Loss EMAs and tensorboard scalars stay on the GPU and are read back every LOG_INTERVAL iterations
+    ema_loss_for_log = torch.zeros((), device="cuda")
+    ema_Ll1depth_for_log = torch.zeros((), device="cuda")
+    scalar_log = ScalarLog(tb_writer, LOG_INTERVAL)
+    sync_counter = None
+    if count_syncs:
+        sync_counter = SyncCounter()
+        sync_counter.start()
+    profiler = Profiler(profile_file, tb_writer)
 
     progress_bar = tqdm(range(first_iter, opt.iterations), desc="Training progress")
     first_iter += 1
     for iteration in range(first_iter, opt.iterations + 1):
-        if network_gui.conn == None:
-            network_gui.try_connect()
-        while network_gui.conn != None:
-            try:
-                net_image_bytes = None
-                custom_cam, do_training, pipe.convert_SHs_python, pipe.compute_cov3D_python, keep_alive, scaling_modifer = network_gui.receive()
-                if custom_cam != None:
-                    net_image = render(custom_cam, gaussians, pipe, background, scaling_modifier=scaling_modifer, use_trained_exp=dataset.train_test_exp, separate_sh=SPARSE_ADAM_AVAILABLE)["render"]
-                    net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
-                network_gui.send(net_image_bytes, dataset.source_path)
-                if do_training and ((iteration < int(opt.iterations)) or not keep_alive):
-                    break
-            except Exception as e:
-                network_gui.conn = None
-
+        profiler.step(iteration)
+        with profiler.span("network_gui"):
+            if network_gui.conn == None:
+                network_gui.try_connect()
+            while network_gui.conn != None:
+                try:
+                    net_image_bytes = None
+                    custom_cam, do_training, pipe.convert_SHs_python, pipe.compute_cov3D_python, keep_alive, scaling_modifer = network_gui.receive()
+                    if custom_cam != None:
+                        net_image = render(custom_cam, gaussians, pipe, background, scaling_modifier=scaling_modifer, use_trained_exp=dataset.train_test_exp, separate_sh=SPARSE_ADAM_AVAILABLE)["render"]
+                        net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
+                    network_gui.send(net_image_bytes, dataset.source_path)
+                    if do_training and ((iteration < int(opt.iterations)) or not keep_alive):
+                        break
+                except Exception as e:
+                    network_gui.conn = None
+
+        iter_start = torch.cuda.Event(enable_timing = True)
+        iter_end = torch.cuda.Event(enable_timing = True)
         iter_start.record()
 
         gaussians.update_learning_rate(iteration)
@@ -95,12 +111,8 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
             gaussians.oneupSHdegree()
 
         # Pick a random Camera
-        if not viewpoint_stack:
-            viewpoint_stack = scene.getTrainCameras().copy()
-            viewpoint_indices = list(range(len(viewpoint_stack)))
-        rand_idx = randint(0, len(viewpoint_indices) - 1)
-        viewpoint_cam = viewpoint_stack.pop(rand_idx)
-        vind = viewpoint_indices.pop(rand_idx)
+        with profiler.span("data_fetch"):
+            viewpoint_cam, view_data = data_prefetcher.next()
 
         # Render
         if (iteration - 1) == debug_from:
@@ -108,86 +120,123 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
 
         bg = torch.rand((3), device="cuda") if opt.random_background else background
 
-        render_pkg = render(viewpoint_cam, gaussians, pipe, bg, use_trained_exp=dataset.train_test_exp, separate_sh=SPARSE_ADAM_AVAILABLE)
-        image, viewspace_point_tensor, visibility_filter, radii = render_pkg["render"], render_pkg["viewspace_points"], render_pkg["visibility_filter"], render_pkg["radii"]
-
-        if viewpoint_cam.alpha_mask is not None:
-            alpha_mask = viewpoint_cam.alpha_mask.cuda()
-            image *= alpha_mask
-
-        # Loss
-        gt_image = viewpoint_cam.original_image.cuda()
-        Ll1 = l1_loss(image, gt_image)
-        if FUSED_SSIM_AVAILABLE:
-            ssim_value = fused_ssim(image.unsqueeze(0), gt_image.unsqueeze(0))
-        else:
-            ssim_value = ssim(image, gt_image)
-
-        loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim_value)
-
-        # Depth regularization
-        Ll1depth_pure = 0.0
-        if depth_l1_weight(iteration) > 0 and viewpoint_cam.depth_reliable:
-            invDepth = render_pkg["depth"]
-            mono_invdepth = viewpoint_cam.invdepthmap.cuda()
-            depth_mask = viewpoint_cam.depth_mask.cuda()
-
-            Ll1depth_pure = torch.abs((invDepth  - mono_invdepth) * depth_mask).mean()
-            Ll1depth = depth_l1_weight(iteration) * Ll1depth_pure 
-            loss += Ll1depth
-            Ll1depth = Ll1depth.item()
-        else:
-            Ll1depth = 0
-
-        loss.backward()
+        with profiler.span("render"):
+            render_pkg = render(viewpoint_cam, gaussians, pipe, bg, use_trained_exp=dataset.train_test_exp, separate_sh=SPARSE_ADAM_AVAILABLE)
+            image, viewspace_point_tensor, visibility_filter, radii = render_pkg["render"], render_pkg["viewspace_points"], render_pkg["visibility_filter"], render_pkg["radii"]
+
+        with profiler.span("loss"):
+            if view_data["alpha_mask"] is not None:
+                alpha_mask = view_data["alpha_mask"]
+                image *= alpha_mask
+
+            # Loss
+            gt_image = view_data["original_image"]
+            Ll1 = l1_loss(image, gt_image)
+            if FUSED_SSIM_AVAILABLE:
+                ssim_value = fused_ssim(image.unsqueeze(0), gt_image.unsqueeze(0))
+            else:
+                ssim_value = ssim(image, gt_image)
+
+            loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim_value)
+
+            # Depth regularization
+            Ll1depth_pure = 0.0
+            depth_weight = depth_l1_weight(iteration)
+            if depth_weight > 0 and viewpoint_cam.depth_reliable:
+                invDepth = render_pkg["depth"]
+                mono_invdepth = view_data["invdepthmap"]
+                depth_mask = view_data["depth_mask"]
+
+                Ll1depth_pure = torch.abs((invDepth  - mono_invdepth) * depth_mask).mean()
+                Ll1depth = depth_weight * Ll1depth_pure 
+                loss += Ll1depth
+                Ll1depth = Ll1depth.detach()
+            else:
+                Ll1depth = 0
+
+        with profiler.span("backward"):
+            loss.backward()
 
         iter_end.record()
 
         with torch.no_grad():
             # Progress bar
-            ema_loss_for_log = 0.4 * loss.item() + 0.6 * ema_loss_for_log
+            ema_loss_for_log = 0.4 * loss.detach() + 0.6 * ema_loss_for_log
             ema_Ll1depth_for_log = 0.4 * Ll1depth + 0.6 * ema_Ll1depth_for_log
 
-            if iteration % 10 == 0:
-                progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}", "Depth Loss": f"{ema_Ll1depth_for_log:.{7}f}"})
-                progress_bar.update(10)
+            if iteration % LOG_INTERVAL == 0 or iteration == opt.iterations:
+                ema_loss_value, ema_Ll1depth_value = torch.stack([ema_loss_for_log, ema_Ll1depth_for_log]).tolist()
+            if iteration % LOG_INTERVAL == 0:
+                postfix = {"Loss": f"{ema_loss_value:.{7}f}", "Depth Loss": f"{ema_Ll1depth_value:.{7}f}"}
+                if sync_counter is not None:
+                    postfix["Syncs/it"] = f"{sync_counter.take() / LOG_INTERVAL:.1f}"
+                progress_bar.set_postfix(postfix)
+                progress_bar.update(LOG_INTERVAL)
+                rate = progress_bar.format_dict.get("rate")
+                progress.update(stage="train", iteration=iteration, total=opt.iterations, points=gaussians.get_xyz.shape[0],
+                                ema_loss=ema_loss_value, its_per_sec=rate,
+                                eta_sec=(opt.iterations - iteration) / rate if rate else None,
+                                percent=round(100.0 * iteration / opt.iterations, 1))
             if iteration == opt.iterations:
                 progress_bar.close()
+                progress.update(force=True, stage="train", iteration=iteration, total=opt.iterations,
+                                points=gaussians.get_xyz.shape[0], ema_loss=ema_loss_value, eta_sec=0, percent=100.0)
 
             # Log and save
-            training_report(tb_writer, iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render, (pipe, background, 1., SPARSE_ADAM_AVAILABLE, None, dataset.train_test_exp), dataset.train_test_exp)
+            scalar_log.add(iteration, Ll1, loss, iter_start, iter_end)
+            if iteration in testing_iterations or iteration == opt.iterations:
+                scalar_log.flush()
+            if iteration in testing_iterations:
+                with profiler.span("report"):
+                    training_report(tb_writer, iteration, l1_loss, testing_iterations, scene, render, (pipe, background, 1., SPARSE_ADAM_AVAILABLE, None, dataset.train_test_exp), dataset.train_test_exp)
             if (iteration in saving_iterations):
                 print("\n[ITER {}] Saving Gaussians".format(iteration))
-                scene.save(iteration)
+                with profiler.span("save"):
+                    scene.save(iteration)
 
             # Densification
             if iteration < opt.densify_until_iter:
-                # Keep track of max radii in image-space for pruning
-                gaussians.max_radii2D[visibility_filter] = torch.max(gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
-                gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
+                with profiler.span("densification_stats"):
+                    # Keep track of max radii in image-space for pruning
+                    # torch.where instead of boolean-mask indexing, which would sync to count the mask
+                    gaussians.max_radii2D = torch.where(visibility_filter, torch.max(gaussians.max_radii2D, radii), gaussians.max_radii2D)
+                    gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
 
                 if iteration > opt.densify_from_iter and iteration % opt.densification_interval == 0:
                     size_threshold = 20 if iteration > opt.opacity_reset_interval else None
-                    gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold, radii)
+                    with profiler.span("densify_and_prune"):
+                        gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold, radii)
                 
                 if iteration % opt.opacity_reset_interval == 0 or (dataset.white_background and iteration == opt.densify_from_iter):
                     gaussians.reset_opacity()
 
             # Optimizer step
             if iteration < opt.iterations:
-                gaussians.exposure_optimizer.step()
-                gaussians.exposure_optimizer.zero_grad(set_to_none = True)
-                if use_sparse_adam:
-                    visible = radii > 0
-                    gaussians.optimizer.step(visible, radii.shape[0])
-                    gaussians.optimizer.zero_grad(set_to_none = True)
-                else:
-                    gaussians.optimizer.step()
-                    gaussians.optimizer.zero_grad(set_to_none = True)
+                with profiler.span("optimizer_step"):
+                    gaussians.exposure_optimizer.step()
+                    gaussians.exposure_optimizer.zero_grad(set_to_none = True)
+                    if use_sparse_adam:
+                        visible = radii > 0
+                        gaussians.optimizer.step(visible, radii.shape[0])
+                        gaussians.optimizer.zero_grad(set_to_none = True)
+                    else:
+                        gaussians.optimizer.step()
+                        gaussians.optimizer.zero_grad(set_to_none = True)
+                    # The fused sparse adam kernel updates the parameters without bumping their versions
+                    gaussians.invalidate_activations()
 
             if (iteration in checkpoint_iterations):
                 print("\n[ITER {}] Saving Checkpoint".format(iteration))
-                torch.save((gaussians.capture(), iteration), scene.model_path + "/chkpnt" + str(iteration) + ".pth")
+                with profiler.span("save"):
+                    torch.save((gaussians.capture(), iteration), scene.model_path + "/chkpnt" + str(iteration) + ".pth")
+
+    profiler.close()
+    data_prefetcher.close()
+    viewpoint_sampler.close()
+    if sync_counter is not None:
+        sync_counter.stop()
+        print("\n[Sync counter] {} host-device syncs in {} iterations ({:.2f}/it)".format(
+            sync_counter.total, opt.iterations - first_iter + 1, sync_counter.total / max(opt.iterations - first_iter + 1, 1)))
 
 def prepare_output_and_logger(args):    
     if not args.model_path:
@@ -211,12 +260,36 @@ def prepare_output_and_logger(args):
         print("Tensorboard not available: not logging progress")
     return tb_writer
 
-def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_iterations, scene : Scene, renderFunc, renderArgs, train_test_exp):
-    if tb_writer:
-        tb_writer.add_scalar('train_loss_patches/l1_loss', Ll1.item(), iteration)
-        tb_writer.add_scalar('train_loss_patches/total_loss', loss.item(), iteration)
-        tb_writer.add_scalar('iter_time', elapsed, iteration)
-
+class ScalarLog:
+    """
+    Buffers the per-iteration training scalars for tensorboard on the GPU and writes
+    them every `interval` iterations with a single device-to-host copy.
+    """
+
+    def __init__(self, tb_writer, interval):
+        self.tb_writer = tb_writer
+        self.interval = interval
+        self._pending = []
+
+    def add(self, iteration, Ll1, loss, iter_start, iter_end):
+        if not self.tb_writer:
+            return
+        self._pending.append((iteration, torch.stack([Ll1.detach(), loss.detach()]), iter_start, iter_end))
+        if len(self._pending) >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        values = torch.stack([p[1] for p in self._pending]).tolist()
+        for (iteration, _, iter_start, iter_end), (l1, total) in zip(self._pending, values):
+            iter_end.synchronize()
+            self.tb_writer.add_scalar('train_loss_patches/l1_loss', l1, iteration)
+            self.tb_writer.add_scalar('train_loss_patches/total_loss', total, iteration)
+            self.tb_writer.add_scalar('iter_time', iter_start.elapsed_time(iter_end), iteration)
+        self._pending = []
+
+def training_report(tb_writer, iteration, l1_loss, testing_iterations, scene : Scene, renderFunc, renderArgs, train_test_exp):
     # Report test and samples of training set
     if iteration in testing_iterations:
         torch.cuda.empty_cache()
@@ -249,9 +322,11 @@ def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_i
         if tb_writer:
             tb_writer.add_histogram("scene/opacity_histogram", scene.gaussians.get_opacity, iteration)
             tb_writer.add_scalar('total_points', scene.gaussians.get_xyz.shape[0], iteration)
+            cache_stats = scene.gaussians.activation_cache_stats
+            tb_writer.add_scalar('activation_cache/hit_rate', cache_stats["hits"] / max(1, cache_stats["hits"] + cache_stats["misses"]), iteration)
         torch.cuda.empty_cache()
 
-if __name__ == "__main__":
+def get_parser():
     # Set up command line argument parser
     parser = ArgumentParser(description="Training script parameters")
     lp = ModelParams(parser)
@@ -267,6 +342,13 @@ if __name__ == "__main__":
     parser.add_argument('--disable_viewer', action='store_true', default=False)
     parser.add_argument("--checkpoint_iterations", nargs="+", type=int, default=[])
     parser.add_argument("--start_checkpoint", type=str, default = None)
+    parser.add_argument("--progress_file", type=str, default = None)
+    parser.add_argument("--count_syncs", action="store_true", default=False)
+    parser.add_argument("--profile_file", type=str, default="")
+    return parser, lp, op, pp
+
+if __name__ == "__main__":
+    parser, lp, op, pp = get_parser()
     args = parser.parse_args(sys.argv[1:])
     args.save_iterations.append(args.iterations)
     
@@ -279,7 +361,7 @@ if __name__ == "__main__":
     if not args.disable_viewer:
         network_gui.init(args.ip, args.port)
     torch.autograd.set_detect_anomaly(args.detect_anomaly)
-    training(lp.extract(args), op.extract(args), pp.extract(args), args.test_iterations, args.save_iterations, args.checkpoint_iterations, args.start_checkpoint, args.debug_from)
+    training(lp.extract(args), op.extract(args), pp.extract(args), args.test_iterations, args.save_iterations, args.checkpoint_iterations, args.start_checkpoint, args.debug_from, args.progress_file, args.count_syncs, args.profile_file)
 
     # All done
     print("\nTraining complete.")
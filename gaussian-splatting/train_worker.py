@@ -0,0 +1,142 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+# Long-lived training worker: imports the training stack once and then runs
+# train.py jobs read from stdin, one JSON object per line:
+#
+#   {"job_id": "...", "args": ["-s", "...", "-m", "..."], "log_file": "..."}
+#
+# "args" are ordinary train.py command line arguments. While a job runs, the
+# process stdout/stderr (file descriptors 1 and 2, so native extensions and
+# tqdm are captured too) are redirected into "log_file". Replies are written
+# as JSON lines to the original stdout:
+#
+#   {"event": "ready", "pid": ..., "import_sec": ...}                  once
+#   {"event": "done", "job_id": ..., "exit_code": ..., "elapsed_sec": ...}  per job
+#
+# A job that fails leaves CUDA and module state in an unknown condition, so
+# the worker exits after reporting it and the caller starts a fresh one.
+
+import os
+import sys
+import time
+_START = time.time()
+
+# Keep a private handle on the original stdout for the protocol and send any
+# stray output (import warnings, prints between jobs) to stderr instead.
+_PROTOCOL = os.fdopen(os.dup(1), "w", buffering=1)
+_STDERR_FD = os.dup(2)
+os.dup2(2, 1)
+sys.stdout.reconfigure(line_buffering=True)
+
+import gc
+import json
+import traceback
+from argparse import ArgumentParser
+import torch
+from train import get_parser, training
+from gaussian_renderer import network_gui
+from utils.general_utils import safe_state
+import utils.camera_utils as camera_utils
+
+IMPORT_SEC = time.time() - _START
+
+def send(message):
+    _PROTOCOL.write(json.dumps(message) + "\n")
+    _PROTOCOL.flush()
+
+def reset_job_state():
+    # Drop any viewer client connected during the previous job; the listening
+    # socket itself is bound once per worker and reused.
+    if network_gui.conn is not None:
+        try:
+            network_gui.conn.close()
+        except Exception:
+            pass
+    network_gui.conn = None
+    network_gui.addr = None
+    camera_utils.WARNED = False
+
+def run_job(job):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    stdout = sys.stdout
+    log_fd = os.open(job["log_file"], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+
+    exit_code = 0
+    try:
+        # Inside the try: invalid arguments exit with code 2 (printed to the job log)
+        # instead of ending the worker without a reply
+        parser, lp, op, pp = get_parser()
+        args = parser.parse_args(job["args"])
+        args.save_iterations.append(args.iterations)
+
+        reset_job_state()
+        print("Optimizing " + args.model_path)
+
+        # Initialize system state (RNG) exactly as a fresh train.py process would
+        safe_state(args.quiet)
+        torch.autograd.set_detect_anomaly(args.detect_anomaly)
+        training(lp.extract(args), op.extract(args), pp.extract(args), args.test_iterations, args.save_iterations, args.checkpoint_iterations, args.start_checkpoint, args.debug_from, args.progress_file, args.count_syncs, args.profile_file)
+
+        print("\nTraining complete.")
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            if e.code is not None:
+                print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        # safe_state() wraps sys.stdout; undo it so the next job does not nest wrappers
+        sys.stdout.flush()
+        sys.stdout = stdout
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(_STDERR_FD, 1)
+        os.dup2(_STDERR_FD, 2)
+        reset_job_state()
+        torch.autograd.set_detect_anomaly(False)
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    return exit_code
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Long-lived training worker")
+    parser.add_argument('--ip', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=6009)
+    parser.add_argument('--disable_viewer', action='store_true', default=False)
+    worker_args = parser.parse_args(sys.argv[1:])
+
+    if not worker_args.disable_viewer:
+        try:
+            network_gui.init(worker_args.ip, worker_args.port)
+        except OSError as e:
+            print(f"[Warning] Viewer disabled, could not listen on {worker_args.ip}:{worker_args.port}: {e}", file=sys.stderr)
+
+    send({"event": "ready", "pid": os.getpid(), "import_sec": IMPORT_SEC})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        job = json.loads(line)
+        start = time.time()
+        exit_code = run_job(job)
+        send({"event": "done", "job_id": job.get("job_id"), "exit_code": exit_code, "elapsed_sec": time.time() - start})
+        if exit_code != 0:
+            break
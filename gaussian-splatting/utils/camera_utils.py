@@ -11,13 +11,18 @@
 
 from scene.cameras import Camera
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from random import randint
 from utils.graphics_utils import fov2focal
+from utils.image_cache import ViewPrefetcher
 from PIL import Image
 import cv2
 
 WARNED = False
 
-def loadCam(args, id, cam_info, resolution_scale, is_nerf_synthetic, is_test_dataset):
+def loadViewData(cam_info, is_nerf_synthetic):
     image = Image.open(cam_info.image_path)
 
     if cam_info.depth_path != "":
@@ -38,10 +43,13 @@ def loadCam(args, id, cam_info, resolution_scale, is_nerf_synthetic, is_test_dat
             raise
     else:
         invdepthmap = None
-        
-    orig_w, orig_h = image.size
+
+    return image, invdepthmap
+
+def viewResolution(args, orig_size, resolution_scale):
+    orig_w, orig_h = orig_size
     if args.resolution in [1, 2, 4, 8]:
-        resolution = round(orig_w/(resolution_scale * args.resolution)), round(orig_h/(resolution_scale * args.resolution))
+        return round(orig_w/(resolution_scale * args.resolution)), round(orig_h/(resolution_scale * args.resolution))
     else:  # should be a type that converts to float
         if args.resolution == -1:
             if orig_w > 1600:
@@ -58,21 +66,92 @@ def loadCam(args, id, cam_info, resolution_scale, is_nerf_synthetic, is_test_dat
     
 
         scale = float(global_down) * float(resolution_scale)
-        resolution = (int(orig_w / scale), int(orig_h / scale))
+        return (int(orig_w / scale), int(orig_h / scale))
+
+def loadCam(args, id, cam_info, resolution_scale, is_nerf_synthetic, is_test_dataset, image_cache=None, dataset_cache=None):
+    image_loader = partial(loadViewData, cam_info, is_nerf_synthetic)
+    if dataset_cache is not None:
+        key = dataset_cache.key(cam_info, args.resolution, resolution_scale, is_nerf_synthetic)
+        if not dataset_cache.has(key):
+            image, invdepthmap = image_loader()
+            resolution = viewResolution(args, image.size, resolution_scale)
+            # Same resize calls as Camera, so cached views match freshly decoded ones
+            dataset_cache.store(key, np.array(image.resize(resolution)),
+                                None if invdepthmap is None else cv2.resize(invdepthmap, resolution))
+        # Memory-mapped and already resized
+        image_loader = partial(dataset_cache.load, key)
+        image, invdepthmap = image_loader()
+        resolution = (image.shape[1], image.shape[0])
+        if image_cache is not None:
+            image, invdepthmap = None, None
+    elif image_cache is None:
+        image, invdepthmap = image_loader()
+        resolution = viewResolution(args, image.size, resolution_scale)
+    else:
+        # Lazy camera: only read the image header here
+        image, invdepthmap = None, None
+        with Image.open(cam_info.image_path) as header:
+            resolution = viewResolution(args, header.size, resolution_scale)
 
     return Camera(resolution, colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T, 
                   FoVx=cam_info.FovX, FoVy=cam_info.FovY, depth_params=cam_info.depth_params,
                   image=image, invdepthmap=invdepthmap,
                   image_name=cam_info.image_name, uid=id, data_device=args.data_device,
-                  train_test_exp=args.train_test_exp, is_test_dataset=is_test_dataset, is_test_view=cam_info.is_test)
+                  train_test_exp=args.train_test_exp, is_test_dataset=is_test_dataset, is_test_view=cam_info.is_test,
+                  image_loader=image_loader, image_cache=image_cache, has_depth=cam_info.depth_path != "",
+                  compact_data=args.compact_data)
+
+def cameraList_from_camInfos(cam_infos, resolution_scale, args, is_nerf_synthetic, is_test_dataset, image_cache=None, dataset_cache=None):
+    def load(item):
+        id, c = item
+        return loadCam(args, id, c, resolution_scale, is_nerf_synthetic, is_test_dataset, image_cache, dataset_cache)
+
+    workers = min(args.load_workers, len(cam_infos))
+    if workers <= 1:
+        return [load(item) for item in enumerate(cam_infos)]
+
+    # PIL decoding/resizing and cv2 release the GIL; map() keeps the input order
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(load, enumerate(cam_infos)))
+
+class ViewpointSampler:
+    """
+    Hands out training cameras in the same order as popping a random entry off a
+    fresh copy of the camera list until it is empty (same draws from `random`).
+    Each pass is drawn up front, so that the next `prefetch` views can be loaded
+    in the background for lazy cameras.
+    """
+
+    def __init__(self, cameras, prefetch=0):
+        self.cameras = cameras
+        self.prefetch = prefetch
+        self._order = deque()
+        self._seq = 0
+        self._prefetcher = ViewPrefetcher() if prefetch > 0 else None
 
-def cameraList_from_camInfos(cam_infos, resolution_scale, args, is_nerf_synthetic, is_test_dataset):
-    camera_list = []
+    def _refill(self):
+        stack = list(range(len(self.cameras)))
+        while stack:
+            self._order.append(stack.pop(randint(0, len(stack) - 1)))
+        if self._prefetcher is not None:
+            # order[0] is handed out right away, order[k] is the (k + 1)-th next view
+            for k in range(1, min(self.prefetch, len(self._order))):
+                self._prefetcher.schedule(self._seq + 1 + k, self.cameras[self._order[k]])
 
-    for id, c in enumerate(cam_infos):
-        camera_list.append(loadCam(args, id, c, resolution_scale, is_nerf_synthetic, is_test_dataset))
+    def next(self):
+        if not self._order:
+            self._refill()
+        self._seq += 1
+        camera = self.cameras[self._order.popleft()]
+        if self._prefetcher is not None:
+            self._prefetcher.advance(self._seq)
+            if len(self._order) >= self.prefetch:
+                self._prefetcher.schedule(self._seq + self.prefetch, self.cameras[self._order[self.prefetch - 1]])
+        return camera
 
-    return camera_list
+    def close(self):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
 
 def camera_to_JSON(id, camera : Camera):
     Rt = np.zeros((4, 4))
@@ -0,0 +1,73 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import hashlib
+import os
+import uuid
+import numpy as np
+
+# Bump when the layout or the preprocessing of cached views changes
+CACHE_VERSION = 1
+
+class DatasetCache:
+    """
+    On-disk cache of decoded and resized views: per view, the resized image as a
+    uint8 .npy and the resized inverse depth (if any) as a float32 .npy, both
+    memory-mapped on load. Entries are keyed by the image / depth paths and their
+    mtimes plus the resolution settings, so changed inputs get new entries.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, cam_info, resolution, resolution_scale, is_nerf_synthetic):
+        h = hashlib.sha1("v{}\n".format(CACHE_VERSION).encode())
+        for path in (cam_info.image_path, cam_info.depth_path):
+            if path:
+                st = os.stat(path)
+                h.update("{}\0{}\0{}\n".format(os.path.abspath(path), st.st_mtime_ns, st.st_size).encode())
+            else:
+                h.update(b"-\n")
+        h.update("{}\0{!r}\0{}\n".format(resolution, float(resolution_scale), bool(is_nerf_synthetic)).encode())
+        return h.hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key[:2], key)
+        return base + ".image.npy", base + ".depth.npy"
+
+    def has(self, key):
+        # The image is written last, so its presence marks a complete entry
+        return os.path.exists(self._paths(key)[0])
+
+    def load(self, key):
+        """
+        Return (image, invdepthmap) as memory maps; invdepthmap is None for views without depth.
+        The depth map is copy-on-write, so in-place edits by the caller never reach the file.
+        """
+        image_path, depth_path = self._paths(key)
+        image = np.load(image_path, mmap_mode="r")
+        invdepthmap = np.load(depth_path, mmap_mode="c") if os.path.exists(depth_path) else None
+        return image, invdepthmap
+
+    def store(self, key, image, invdepthmap):
+        image_path, depth_path = self._paths(key)
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        if invdepthmap is not None:
+            self._save(depth_path, np.ascontiguousarray(invdepthmap, dtype=np.float32))
+        self._save(image_path, np.ascontiguousarray(image))
+
+    @staticmethod
+    def _save(path, array):
+        tmp = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
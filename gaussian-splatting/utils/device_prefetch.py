@@ -0,0 +1,105 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import torch
+
+# Per-view tensors used by the training loss
+VIEW_TENSORS = ("original_image", "alpha_mask", "invdepthmap", "depth_mask")
+
+class DevicePrefetcher:
+    """
+    Draws training views from a sampler `depth` views ahead and stages their tensors
+    on `device` from a background thread. On CUDA, host tensors go through pinned
+    memory and are copied asynchronously on a side stream, which the consuming stream
+    waits on; on other devices staging is a plain .to(). depth=0 stages synchronously.
+    The tensors are moved as stored by the camera (8-bit for compact cameras) and
+    converted to float on the device. The pinned staging buffers are reused once the
+    copy that last read them has completed.
+    """
+
+    def __init__(self, sampler, device, depth=2):
+        self.sampler = sampler
+        self.device = torch.device(device)
+        self.depth = depth
+        self._stream = torch.cuda.Stream(device=self.device) if self.device.type == "cuda" and depth > 0 else None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="device-prefetch") if depth > 0 else None
+        self._pending = deque()
+        # name -> [pinned byte buffer, event of the last copy out of it]; only used by the staging thread
+        self._pinned = {}
+
+    def next(self):
+        """Return (camera, tensors) for the next view; tensors maps VIEW_TENSORS names to tensors on device (or None)."""
+        if self._executor is None:
+            camera = self.sampler.next()
+            return camera, self._stage(camera)[0]
+        while len(self._pending) <= self.depth:
+            camera = self.sampler.next()
+            self._pending.append((camera, self._executor.submit(self._stage, camera)))
+        camera, future = self._pending.popleft()
+        tensors, event = future.result()
+        if event is not None:
+            stream = torch.cuda.current_stream(self.device)
+            stream.wait_event(event)
+            for t in tensors.values():
+                if t is not None:
+                    # Allocated on the side stream, now used on the consuming one
+                    t.record_stream(stream)
+        return camera, tensors
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._pending.clear()
+
+    def _stage(self, camera):
+        names = VIEW_TENSORS if camera.depth_reliable else VIEW_TENSORS[:2]
+        tensors = dict.fromkeys(VIEW_TENSORS)
+        stored = camera.load_data()
+        if self._stream is None:
+            for name in names:
+                t = stored[name]
+                tensors[name] = camera.as_float(name, None if t is None else t.to(self.device))
+            return tensors, None
+
+        slots = []
+        with torch.cuda.stream(self._stream):
+            for name in names:
+                t = stored[name]
+                if t is not None and t.device.type == "cpu":
+                    slot = self._pinned_slot(name, t.numel() * t.element_size())
+                    staging = slot[0][:t.numel() * t.element_size()].view(t.dtype).view(t.shape)
+                    staging.copy_(t)
+                    t = staging.to(self.device, non_blocking=True)
+                    slots.append(slot)
+                elif t is not None:
+                    t = t.to(self.device)
+                tensors[name] = camera.as_float(name, t)
+            event = torch.cuda.Event()
+            event.record(self._stream)
+        for slot in slots:
+            slot[1] = event
+        return tensors, event
+
+    def _pinned_slot(self, name, nbytes):
+        """A pinned buffer of at least nbytes for `name` that no pending copy reads from."""
+        pool = self._pinned.setdefault(name, [])
+        for slot in pool:
+            if slot[1] is None or slot[1].query():
+                break
+        else:
+            slot = [None, None]
+            pool.append(slot)
+        if slot[0] is None or slot[0].numel() < nbytes:
+            slot[0] = torch.empty(nbytes, dtype=torch.uint8, pin_memory=torch.cuda.is_available())
+        slot[1] = None
+        return slot
@@ -0,0 +1,106 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import queue
+import threading
+from collections import OrderedDict
+
+def _nbytes(value):
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if hasattr(value, "element_size"):
+        return value.element_size() * value.nelement()
+    return 0
+
+class ImageCache:
+    """
+    Byte-budgeted LRU cache for the tensors of lazily loaded cameras.
+    The most recently used entry is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key, load):
+        """Return the cached value for key, calling load() on a miss. Concurrent misses on one key load once."""
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                event = self._loading.get(key)
+                if event is None:
+                    event = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is loading this key; retry once it is done
+            event.wait()
+
+        try:
+            value = load()
+            size = _nbytes(value)
+            with self._lock:
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.budget_bytes and len(self._entries) > 1:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+            return value
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+
+class ViewPrefetcher:
+    """
+    Loads the data of upcoming training views on a background thread.
+    Views are scheduled with the sequence number at which they will be consumed;
+    views whose turn has already passed are skipped.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._consumed = 0
+        self._thread = threading.Thread(target=self._run, name="view-prefetch", daemon=True)
+        self._thread.start()
+
+    def schedule(self, seq, camera):
+        self._queue.put((seq, camera))
+
+    def advance(self, seq):
+        self._consumed = seq
+
+    def close(self):
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            seq, camera = item
+            if seq <= self._consumed:
+                continue
+            try:
+                camera.load_data()
+            except Exception as e:
+                print(f"[Prefetch] Failed to load {camera.image_name}: {e}")
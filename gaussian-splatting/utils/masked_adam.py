@@ -0,0 +1,197 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import math
+import torch
+
+# Rows gathered per masked step, relative to the visible rows of the previous step
+CAPACITY_HEADROOM = 1.25
+MIN_CAPACITY = 1024
+# Above this fraction of visible rows, gathering and scattering them costs more than updating
+# every row in place with a zero step for the hidden ones (see scripts/bench_masked_adam.py)
+GATHER_FRACTION = 0.5
+
+class MaskedAdam(torch.optim.Optimizer):
+    """
+    Pure PyTorch counterpart of the rasterizer's SparseGaussianAdam, with the same
+    step(visibility, N) interface: only the rows of the per-Gaussian parameters whose
+    visibility is True (radii > 0) are updated, the other rows keep their values and
+    moments. step() without a mask updates every row, like a dense Adam.
+    When few rows are visible, a masked step gathers them, updates them and scatters them
+    back, so its cost follows the number of visible rows. Otherwise it updates every row in
+    place, with per-row coefficients that leave the hidden rows unchanged.
+    Each row keeps its own step count ("step" has one entry per row), so the bias
+    correction of a row only counts the iterations in which it was updated.
+    Rows whose moments are reset (new Gaussians, reset opacity) restart at step 0.
+    A param group may set "moment_dtype" (e.g. torch.bfloat16) to store its moments
+    in reduced precision; the update itself is computed in the parameter's dtype.
+    Runs on any device.
+    """
+
+    def __init__(self, params, lr=1e-3, betas=(0.9, 0.999), eps=1e-8):
+        defaults = dict(lr=lr, betas=betas, eps=eps)
+        super().__init__(params, defaults)
+        # Visible rows of the last masked step, read back without waiting for the device
+        self._last_visible = None
+        self._count_host = None
+        # Gathered rows of the masked steps, reused so that a step does not fault in fresh memory
+        self._buffers = {}
+
+    def _state(self, group):
+        param = group["params"][0]
+        rows = param.shape[0]
+        moment_dtype = group.get("moment_dtype") or param.dtype
+        state = self.state[param]
+        if len(state) == 0:
+            state["step"] = torch.zeros(rows, dtype=torch.float32, device=param.device)
+            state["exp_avg"] = torch.zeros_like(param, dtype=moment_dtype, memory_format=torch.preserve_format)
+            state["exp_avg_sq"] = torch.zeros_like(param, dtype=moment_dtype, memory_format=torch.preserve_format)
+        else:
+            if state["step"].dim() == 0:
+                # State of a dense Adam (e.g. from a checkpoint): every row took the same steps
+                state["step"] = state["step"].to(device=param.device, dtype=torch.float32).expand(rows).clone()
+            for field in ("exp_avg", "exp_avg_sq"):
+                # load_state_dict casts the state to the parameter's dtype
+                if state[field].dtype != moment_dtype:
+                    state[field] = state[field].to(moment_dtype)
+        return state
+
+    def _buffer(self, key, rows, like, dtype=None):
+        dtype = dtype or like.dtype
+        buf = self._buffers.get(key)
+        if buf is None or buf.shape[0] < rows or buf.shape[1:] != like.shape[1:] or buf.dtype != dtype or buf.device != like.device:
+            buf = torch.empty((math.ceil(rows * CAPACITY_HEADROOM),) + like.shape[1:], dtype=dtype, device=like.device)
+            self._buffers[key] = buf
+        return buf[:rows]
+
+    @staticmethod
+    def _adam(group, param, grad, exp_avg, exp_avg_sq, step, visible=None, denom=None):
+        """
+        One Adam update, in place, of rows stored as (rows, values) tensors of the parameter's
+        dtype. With `visible`, the rows where it is False keep their values, moments and step.
+        """
+        beta1, beta2 = group["betas"]
+        if visible is None:
+            exp_avg.lerp_(grad, 1 - beta1)
+            exp_avg_sq.mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+            step.add_(1)
+            step_size = group["lr"] / (1 - torch.pow(beta1, step))
+            bias_correction2_sqrt = (1 - torch.pow(beta2, step)).sqrt_()
+        else:
+            # Hidden rows: moments weighted by 1 against 0 for the gradient, and a zero step size
+            weight = visible.to(param.dtype).unsqueeze(1)
+            exp_avg.lerp_(grad, weight * (1 - beta1))
+            scaled = grad * (weight * (1 - beta2)) if denom is None else torch.mul(grad, weight * (1 - beta2), out=denom)
+            exp_avg_sq.mul_(1 - weight * (1 - beta2)).addcmul_(scaled, grad)
+            step.add_(visible)
+            step_size = torch.where(visible, group["lr"] / (1 - torch.pow(beta1, step)), 0.0)
+            bias_correction2_sqrt = torch.where(visible, 1 - torch.pow(beta2, step), 1.0).sqrt_()
+        # lr / bias_correction1 * exp_avg / (sqrt(exp_avg_sq) / bias_correction2_sqrt + eps),
+        # where a zero step size makes the denominator infinite and the update zero
+        denom = exp_avg_sq.sqrt() if denom is None else torch.sqrt(exp_avg_sq, out=denom)
+        denom.div_(bias_correction2_sqrt.unsqueeze(1)).add_(group["eps"]).div_(step_size.unsqueeze(1))
+        param.addcdiv_(exp_avg, denom, value=-1)
+
+    def _step_in_place(self, visible=None):
+        """Update every row of every group, the hidden ones with a zero step."""
+        for i, group in enumerate(self.param_groups):
+            param = group["params"][0]
+            if param.grad is None:
+                continue
+            state = self._state(group)
+            rows = param.shape[0]
+            grad = param.grad.reshape(rows, -1)
+            moments = [state[field].view(rows, -1) for field in ("exp_avg", "exp_avg_sq")]
+            updates = [m.to(param.dtype) for m in moments]
+            self._adam(group, param.view(rows, -1), grad, *updates, state["step"], visible, self._buffer((i, "denom"), rows, grad))
+            for moment, update in zip(moments, updates):
+                if moment is not update:
+                    moment.copy_(update)
+
+    def _gather(self, rows):
+        """Update copies of the rows `rows` of every group; returns the state tensors and their updated rows."""
+        n = rows.shape[0]
+        updated = []
+        for i, group in enumerate(self.param_groups):
+            param = group["params"][0]
+            if param.grad is None:
+                continue
+            state = self._state(group)
+            targets = [t.view(t.shape[0], -1) for t in (param, state["exp_avg"], state["exp_avg_sq"])] + [state["step"]]
+            values = [torch.index_select(t, 0, rows, out=self._buffer((i, field), n, t)) for field, t in enumerate(targets)]
+            grad = param.grad.reshape(param.shape[0], -1)
+            grad = torch.index_select(grad, 0, rows, out=self._buffer((i, "grad"), n, grad))
+            # Moments stored in reduced precision are updated in the parameter's dtype
+            moments = [v if v.dtype == param.dtype else self._buffer((i, field, "update"), n, v, param.dtype).copy_(v)
+                       for field, v in ((1, values[1]), (2, values[2]))]
+            self._adam(group, values[0], grad, *moments, values[3], denom=self._buffer((i, "denom"), n, grad))
+            for value, moment in zip(values[1:3], moments):
+                if value is not moment:
+                    value.copy_(moment)
+            updated.append((targets, values))
+        return updated
+
+    @staticmethod
+    def _scatter(updated, rows):
+        """Write back the first len(rows) updated rows of every group."""
+        for targets, values in updated:
+            for target, value in zip(targets, values):
+                target.index_copy_(0, rows, value[:rows.shape[0]])
+
+    @torch.no_grad()
+    def step(self, visibility=None, N=None):
+        for group in self.param_groups:
+            assert len(group["params"]) == 1, "more than one tensor in group"
+            assert N is None or group["params"][0].shape[0] == N, "parameter rows do not match the visibility mask"
+
+        if visibility is None:
+            self._step_in_place()
+            return
+
+        visibility = visibility.to(self.param_groups[0]["params"][0].device)
+        rows = visibility.shape[0]
+        count = visibility.sum()
+        # The count of this step is copied back while the update is queued, and read once
+        # it is, so the device keeps working while the host waits for it
+        if self._count_host is None:
+            self._count_host = torch.empty((), dtype=torch.int64, pin_memory=count.is_cuda)
+        self._count_host.copy_(count, non_blocking=True)
+        event = torch.cuda.Event() if count.is_cuda else None
+        if event is not None:
+            event.record()
+
+        # Rows to gather, sized from the previous step
+        capacity = rows if self._last_visible is None else min(rows, max(MIN_CAPACITY, math.ceil(self._last_visible * CAPACITY_HEADROOM)))
+        if capacity > GATHER_FRACTION * rows:
+            self._step_in_place(visibility)
+            if event is not None:
+                event.synchronize()
+            self._last_visible = int(self._count_host)
+            return
+
+        # Row indices with the visible rows first, then the hidden ones: a partition by prefix
+        # sums, so that the number of visible rows stays on the device
+        visible = visibility.to(torch.int64)
+        before = visible.cumsum(0)
+        index = torch.arange(rows, device=visibility.device)
+        position = torch.where(visibility, before - 1, count + index - before)
+        order = torch.empty_like(index).scatter_(0, position, index)
+
+        # Only the visible rows among the first `capacity` are scattered back
+        updated = self._gather(order[:capacity])
+        if event is not None:
+            event.synchronize()
+        self._last_visible = int(self._count_host)
+        self._scatter(updated, order[:min(capacity, self._last_visible)])
+        if self._last_visible > capacity:
+            # More rows became visible than the capacity allows: update the rest as well
+            rest = order[capacity:self._last_visible]
+            self._scatter(self._gather(rest), rest)
@@ -0,0 +1,155 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import numpy as np
+
+# Rows per block when streaming a PLY body; bounds the host memory used by a save
+CHUNK_ROWS = 1 << 18
+
+_PLY_TYPES = {
+    'i1': 'char', 'u1': 'uchar', 'i2': 'short', 'u2': 'ushort',
+    'i4': 'int', 'u4': 'uint', 'f4': 'float', 'f8': 'double',
+}
+# PLY type names (including the sized aliases) to numpy type strings
+_NUMPY_TYPES = dict((v, k) for k, v in _PLY_TYPES.items())
+_NUMPY_TYPES.update({'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+                     'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8'})
+
+def ply_dtype(properties):
+    """Little-endian structured dtype for a list of (name, numpy type string) properties."""
+    return np.dtype([(name, '<' + np.dtype(t).str[1:]) for name, t in properties])
+
+def ply_header(count, properties, element='vertex'):
+    lines = ['ply', 'format binary_little_endian 1.0', 'element {} {}'.format(element, count)]
+    for name, t in properties:
+        lines.append('property {} {}'.format(_PLY_TYPES[np.dtype(t).str[1:]], name))
+    lines.append('end_header')
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+def write_ply(path, properties, count, chunks, element='vertex'):
+    """
+    Write a binary little-endian PLY with a single element, streaming the body.
+
+    properties: list of (name, numpy type string), e.g. [('x', 'f4'), ('red', 'u1')]
+    count:      number of rows
+    chunks:     iterable of row blocks, in order. Each block is either a structured
+                array with the property layout, or (when all properties share one
+                type) a 2D array of shape (rows, len(properties)).
+    """
+    dtype = ply_dtype(properties)
+    uniform = len(set(dtype[i] for i in range(len(dtype)))) == 1
+    written = 0
+    with open(path, 'wb') as f:
+        f.write(ply_header(count, properties, element))
+        for block in chunks:
+            if block.dtype.names is None:
+                assert uniform and block.ndim == 2 and block.shape[1] == len(properties), "unexpected PLY block shape"
+                block = np.ascontiguousarray(block, dtype=dtype[0])
+            else:
+                block = np.ascontiguousarray(block.astype(dtype, copy=False))
+            block.tofile(f)
+            written += block.shape[0]
+    assert written == count, "PLY body has {} rows, header says {}".format(written, count)
+
+def read_ply_header(f):
+    """
+    Parse a PLY header from an open binary file.
+    Returns (format, elements, body_offset) where elements is a list of
+    (name, count, properties) and properties a list of (name, numpy type string),
+    or (name, None) for list properties.
+    """
+    magic = f.readline().strip()
+    if magic != b'ply':
+        raise ValueError("not a PLY file")
+    fmt, elements = None, []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("unterminated PLY header")
+        tokens = line.decode('ascii').split()
+        if not tokens or tokens[0] in ('comment', 'obj_info'):
+            continue
+        if tokens[0] == 'end_header':
+            break
+        if tokens[0] == 'format':
+            fmt = tokens[1]
+        elif tokens[0] == 'element':
+            elements.append((tokens[1], int(tokens[2]), []))
+        elif tokens[0] == 'property':
+            if tokens[1] == 'list':
+                elements[-1][2].append((tokens[-1], None))
+            else:
+                elements[-1][2].append((tokens[2], _NUMPY_TYPES[tokens[1]]))
+    return fmt, elements, f.tell()
+
+def read_ply(path, element='vertex'):
+    """
+    Memory-map one element of a binary PLY as a structured array (no copy).
+    Elements stored before it must have fixed-size rows. Raises ValueError for
+    layouts this reader does not handle (ascii files, list properties), so that
+    callers can fall back to plyfile.
+    """
+    with open(path, 'rb') as f:
+        fmt, elements, offset = read_ply_header(f)
+    byte_order = {'binary_little_endian': '<', 'binary_big_endian': '>'}.get(fmt)
+    if byte_order is None:
+        raise ValueError("unsupported PLY format: {}".format(fmt))
+    for name, count, properties in elements:
+        if any(t is None for _, t in properties):
+            raise ValueError("list properties are not supported")
+        dtype = np.dtype([(p, byte_order + t) for p, t in properties])
+        if name == element:
+            if count == 0:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+        offset += dtype.itemsize * count
+    raise ValueError("PLY has no element '{}'".format(element))
+
+def ply_columns(rows, names, dtype=np.float32):
+    """Gather the named fields of a structured array into a contiguous (N, len(names)) array with one copy."""
+    fields = rows.dtype.fields
+    if all(fields[n][0] == np.dtype(dtype) for n in rows.dtype.names) and rows.flags.c_contiguous:
+        # All fields share the target type: view the records as a 2D matrix and pick columns
+        matrix = rows.view(dtype).reshape(rows.shape[0], len(rows.dtype.names))
+        index = [rows.dtype.names.index(n) for n in names]
+        return np.ascontiguousarray(matrix[:, index], dtype=dtype)
+    out = np.empty((rows.shape[0], len(names)), dtype=dtype)
+    for i, n in enumerate(names):
+        out[:, i] = rows[n]
+    return out
+
+def _sorted_fields(names, prefix):
+    return sorted([n for n in names if n.startswith(prefix)], key=lambda x: int(x.split('_')[-1]))
+
+# Parameter groups of a Gaussian splat PLY, in GaussianModel.construct_list_of_attributes order
+GAUSSIAN_GROUPS = ('xyz', 'features_dc', 'features_rest', 'opacity', 'scaling', 'rotation')
+
+def load_gaussian_arrays(path, groups=GAUSSIAN_GROUPS):
+    """
+    Load the requested parameter groups of a Gaussian splat PLY as float32 arrays
+    of shape (N, k), e.g. groups=('xyz', 'opacity') for a quick preview. Each group
+    costs one copy out of the memory-mapped file.
+    """
+    try:
+        rows = read_ply(path)
+    except ValueError:
+        from plyfile import PlyData
+        rows = PlyData.read(path)['vertex'].data
+    names = rows.dtype.names
+    fields = {
+        'xyz': ['x', 'y', 'z'],
+        'features_dc': _sorted_fields(names, 'f_dc_'),
+        'features_rest': _sorted_fields(names, 'f_rest_'),
+        'opacity': ['opacity'],
+        'scaling': _sorted_fields(names, 'scale_'),
+        'rotation': _sorted_fields(names, 'rot'),
+    }
+    return {g: ply_columns(rows, fields[g]) for g in groups}
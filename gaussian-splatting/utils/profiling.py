@@ -0,0 +1,137 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+import torch
+
+_NULL_SPAN = nullcontext()
+
+class _Span:
+    __slots__ = ("profiler", "name", "iteration", "host_start", "host_end", "gpu_start", "gpu_end")
+
+    def __init__(self, profiler, name, iteration):
+        self.profiler = profiler
+        self.name = name
+        self.iteration = iteration
+        self.gpu_start = self.gpu_end = None
+
+    def __enter__(self):
+        if self.profiler.use_cuda:
+            self.gpu_start = torch.cuda.Event(enable_timing=True)
+            self.gpu_start.record()
+        self.host_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.host_end = time.perf_counter()
+        if self.profiler.use_cuda:
+            self.gpu_end = torch.cuda.Event(enable_timing=True)
+            self.gpu_end.record()
+        self.profiler._pending.append(self)
+        return False
+
+class Profiler:
+    """
+    Named spans for the training loop, e.g. `with profiler.span("render"): ...`.
+    Each span records host wall time and, on CUDA, the GPU time between two events
+    recorded on the current stream. Spans are collected every `flush_every` iterations
+    (the only time the profiler synchronizes), averaged into tensorboard scalars under
+    profile/, and written by close() as a Chrome trace (chrome://tracing, Perfetto)
+    with one host and one GPU track plus a per-span summary.
+    A disabled profiler hands out a shared no-op context manager.
+    """
+
+    def __init__(self, trace_path="", tb_writer=None, flush_every=100):
+        self.enabled = bool(trace_path)
+        self.trace_path = trace_path
+        self.tb_writer = tb_writer
+        self.flush_every = flush_every
+        self.use_cuda = self.enabled and torch.cuda.is_available()
+        self.iteration = 0
+        self._pending = []
+        self._events = []
+        self._totals = defaultdict(lambda: [0, 0.0, 0.0])  # name -> [count, host ms, gpu ms]
+        if self.enabled:
+            self._host_base = time.perf_counter()
+            self._gpu_base = None
+            if self.use_cuda:
+                self._gpu_base = torch.cuda.Event(enable_timing=True)
+                self._gpu_base.record()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, self.iteration)
+
+    def step(self, iteration):
+        """Mark the start of an iteration; flushes the collected spans every flush_every iterations."""
+        if not self.enabled:
+            return
+        self.iteration = iteration
+        if iteration % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        if not self.enabled or not self._pending:
+            return
+        if self.use_cuda:
+            torch.cuda.synchronize()
+        window = defaultdict(lambda: [0, 0.0, 0.0])
+        for s in self._pending:
+            host_ms = (s.host_end - s.host_start) * 1e3
+            event = {"name": s.name, "ph": "X", "pid": 0, "tid": "host",
+                     "ts": (s.host_start - self._host_base) * 1e6, "dur": host_ms * 1e3,
+                     "args": {"iteration": s.iteration}}
+            self._events.append(event)
+            gpu_ms = 0.0
+            if s.gpu_start is not None:
+                gpu_ms = s.gpu_start.elapsed_time(s.gpu_end)
+                self._events.append({"name": s.name, "ph": "X", "pid": 0, "tid": "gpu",
+                                     "ts": self._gpu_base.elapsed_time(s.gpu_start) * 1e3, "dur": gpu_ms * 1e3,
+                                     "args": {"iteration": s.iteration}})
+            for acc in (window[s.name], self._totals[s.name]):
+                acc[0] += 1
+                acc[1] += host_ms
+                acc[2] += gpu_ms
+        self._pending = []
+        if self.tb_writer:
+            for name, (count, host_ms, gpu_ms) in window.items():
+                self.tb_writer.add_scalar("profile/{}_host_ms".format(name), host_ms / count, self.iteration)
+                if self.use_cuda:
+                    self.tb_writer.add_scalar("profile/{}_gpu_ms".format(name), gpu_ms / count, self.iteration)
+
+    def summary(self):
+        """Per-span totals: {name: {"count", "host_ms", "gpu_ms", "mean_host_ms", "mean_gpu_ms"}}."""
+        return {name: {"count": count, "host_ms": host_ms, "gpu_ms": gpu_ms,
+                       "mean_host_ms": host_ms / count, "mean_gpu_ms": gpu_ms / count}
+                for name, (count, host_ms, gpu_ms) in self._totals.items()}
+
+    def close(self):
+        """Flush, write the trace file and print the per-span breakdown."""
+        if not self.enabled:
+            return
+        self.flush()
+        summary = self.summary()
+        if os.path.dirname(self.trace_path):
+            os.makedirs(os.path.dirname(self.trace_path), exist_ok=True)
+        with open(self.trace_path, "w") as f:
+            json.dump({"traceEvents": self._events, "displayTimeUnit": "ms", "otherData": {"summary": summary}}, f)
+        total_gpu = sum(v["gpu_ms"] for v in summary.values()) or 1.0
+        total_host = sum(v["host_ms"] for v in summary.values()) or 1.0
+        print("\n[Profile] {:<22} {:>8} {:>12} {:>7} {:>12} {:>7}".format("span", "count", "host ms/it", "host%", "gpu ms/it", "gpu%"))
+        for name, v in sorted(summary.items(), key=lambda kv: -max(kv[1]["gpu_ms"], kv[1]["host_ms"])):
+            print("[Profile] {:<22} {:>8} {:>12.3f} {:>6.1f}% {:>12.3f} {:>6.1f}%".format(
+                name, v["count"], v["mean_host_ms"], 100 * v["host_ms"] / total_host, v["mean_gpu_ms"], 100 * v["gpu_ms"] / total_gpu))
+        print("[Profile] Trace written to {}".format(self.trace_path))
@@ -0,0 +1,41 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import os
+import json
+import time
+
+class ProgressWriter:
+    """
+    Machine-readable progress channel: keeps a dict of progress fields and
+    atomically rewrites it as JSON to `path`, at most once every `min_interval`
+    seconds unless forced. An empty path disables writing.
+    """
+    def __init__(self, path, min_interval=2.0):
+        self.path = path
+        self.min_interval = min_interval
+        self.state = {}
+        self._last_write = 0.0
+
+    def update(self, force=False, **fields):
+        self.state.update(fields)
+        now = time.time()
+        if not self.path or (not force and now - self._last_write < self.min_interval):
+            return
+        self._last_write = now
+        self.state["ts"] = now
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[Warning] Could not write progress to {self.path}: {e}")
@@ -244,6 +244,120 @@ def read_images_text(path):
     return images
 
 
+# Fixed-width parts of the binary records, see Reconstruction::Write*Binary
+IMAGE_BINARY_DTYPE = np.dtype(
+    [("id", "<i4"), ("qvec", "<f8", (4,)), ("tvec", "<f8", (3,)), ("camera_id", "<i4")]
+)
+POINT2D_BINARY_DTYPE = np.dtype([("xy", "<f8", (2,)), ("point3D_id", "<i8")])
+POINT3D_BINARY_DTYPE = np.dtype(
+    [
+        ("id", "<u8"),
+        ("xyz", "<f8", (3,)),
+        ("rgb", "u1", (3,)),
+        ("error", "<f8"),
+        ("track_length", "<u8"),
+    ]
+)
+TRACK_ELEM_BINARY_DTYPE = np.dtype([("image_id", "<i4"), ("point2D_idx", "<i4")])
+
+_unpack_uint64 = struct.Struct("<Q").unpack_from
+
+
+def _gather_rows(data, starts, size, chunk=1 << 16):
+    """Copy the `size`-byte rows beginning at byte offsets `starts` of the
+    uint8 buffer `data` into an (N, size) uint8 array, in bounded blocks."""
+    out = np.empty((len(starts), size), dtype=np.uint8)
+    cols = np.arange(size)
+    for begin in range(0, len(starts), chunk):
+        block = starts[begin : begin + chunk]
+        out[begin : begin + len(block)] = data[block[:, None] + cols]
+    return out
+
+
+def iter_images_binary(path_to_model_file):
+    """Decode images.bin from a single in-memory buffer.
+    Yields the fields of each image in `BaseImage` order; the 2D points of an
+    image are decoded with one numpy view instead of per-element unpacking.
+    """
+    with open(path_to_model_file, "rb") as fid:
+        buf = fid.read()
+    num_reg_images = _unpack_uint64(buf, 0)[0]
+    pos = 8
+    for _ in range(num_reg_images):
+        props = np.frombuffer(buf, dtype=IMAGE_BINARY_DTYPE, count=1, offset=pos)[0]
+        name_end = buf.index(b"\x00", pos + IMAGE_BINARY_DTYPE.itemsize)
+        image_name = buf[pos + IMAGE_BINARY_DTYPE.itemsize : name_end].decode("utf-8")
+        num_points2D = _unpack_uint64(buf, name_end + 1)[0]
+        points2D = np.frombuffer(
+            buf, dtype=POINT2D_BINARY_DTYPE, count=num_points2D, offset=name_end + 9
+        )
+        pos = name_end + 9 + POINT2D_BINARY_DTYPE.itemsize * num_points2D
+        yield (
+            int(props["id"]),
+            props["qvec"].copy(),
+            props["tvec"].copy(),
+            int(props["camera_id"]),
+            image_name,
+            np.array(points2D["xy"], dtype=np.float64),
+            # np.array(()) is float64: keep the type the per-element reader returned
+            np.array(points2D["point3D_id"], dtype=np.int64 if num_points2D else np.float64),
+        )
+
+
+def read_points3D_binary_arrays(path_to_model_file, tracks=True):
+    """Decode points3D.bin into flat arrays.
+    :return: dict with "ids" (N,) uint64, "xyz" (N, 3) float64, "rgb" (N, 3)
+    uint8, "error" (N,) float64 and "track_offsets" (N + 1,) int64. With
+    tracks=True it also holds "track", a (M,) TRACK_ELEM_BINARY_DTYPE array;
+    the track of point i is track[track_offsets[i]:track_offsets[i + 1]].
+    The start of each record is found by a Python loop over the points; the
+    records and tracks are then decoded with numpy.
+    """
+    with open(path_to_model_file, "rb") as fid:
+        buf = fid.read()
+    data = np.frombuffer(buf, dtype=np.uint8)
+    num_points = _unpack_uint64(buf, 0)[0]
+    record_size = POINT3D_BINARY_DTYPE.itemsize
+    # A record starts after the track of the previous one, so the starts are found by
+    # a sequential scan, one struct read per point. numpy would have to test every byte
+    # offset as a possible record start: on 1M points (205 MB) that takes about 3 s,
+    # against about 0.5 s for this loop. Everything else is gathered
+    starts = np.empty(num_points, dtype=np.int64)
+    lengths = np.empty(num_points, dtype=np.int64)
+    pos = 8
+    for i in range(num_points):
+        track_length = _unpack_uint64(buf, pos + record_size - 8)[0]
+        starts[i] = pos
+        lengths[i] = track_length
+        pos += record_size + 8 * track_length
+    records = _gather_rows(data, starts, record_size).view(POINT3D_BINARY_DTYPE)[:, 0]
+    offsets = np.zeros(num_points + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    arrays = {
+        "ids": records["id"],
+        "xyz": np.ascontiguousarray(records["xyz"]),
+        "rgb": np.ascontiguousarray(records["rgb"]),
+        "error": np.ascontiguousarray(records["error"]),
+        "track_offsets": offsets,
+    }
+    if tracks:
+        track = np.empty(offsets[-1], dtype=TRACK_ELEM_BINARY_DTYPE)
+        chunk = 1 << 16
+        for begin in range(0, num_points, chunk):
+            block = slice(begin, min(begin + chunk, num_points))
+            first, last = offsets[begin], offsets[block.stop]
+            # Byte offset of every track element of this block of points
+            elem_starts = np.repeat(
+                starts[block] + record_size - 8 * (offsets[block] - first),
+                lengths[block],
+            ) + 8 * np.arange(last - first)
+            track[first:last] = _gather_rows(data, elem_starts, 8).view(
+                TRACK_ELEM_BINARY_DTYPE
+            )[:, 0]
+        arrays["track"] = track
+    return arrays
+
+
 def read_images_binary(path_to_model_file):
     """
     see: src/colmap/scene/reconstruction.cc
@@ -251,45 +365,9 @@ def read_images_binary(path_to_model_file):
         void Reconstruction::WriteImagesBinary(const std::string& path)
     """
     images = {}
-    with open(path_to_model_file, "rb") as fid:
-        num_reg_images = read_next_bytes(fid, 8, "Q")[0]
-        for _ in range(num_reg_images):
-            binary_image_properties = read_next_bytes(
-                fid, num_bytes=64, format_char_sequence="idddddddi"
-            )
-            image_id = binary_image_properties[0]
-            qvec = np.array(binary_image_properties[1:5])
-            tvec = np.array(binary_image_properties[5:8])
-            camera_id = binary_image_properties[8]
-            image_name = ""
-            current_char = read_next_bytes(fid, 1, "c")[0]
-            while current_char != b"\x00":  # look for the ASCII 0 entry
-                image_name += current_char.decode("utf-8")
-                current_char = read_next_bytes(fid, 1, "c")[0]
-            num_points2D = read_next_bytes(
-                fid, num_bytes=8, format_char_sequence="Q"
-            )[0]
-            x_y_id_s = read_next_bytes(
-                fid,
-                num_bytes=24 * num_points2D,
-                format_char_sequence="ddq" * num_points2D,
-            )
-            xys = np.column_stack(
-                [
-                    tuple(map(float, x_y_id_s[0::3])),
-                    tuple(map(float, x_y_id_s[1::3])),
-                ]
-            )
-            point3D_ids = np.array(tuple(map(int, x_y_id_s[2::3])))
-            images[image_id] = Image(
-                id=image_id,
-                qvec=qvec,
-                tvec=tvec,
-                camera_id=camera_id,
-                name=image_name,
-                xys=xys,
-                point3D_ids=point3D_ids,
-            )
+    for fields in iter_images_binary(path_to_model_file):
+        image = Image(*fields)
+        images[image.id] = image
     return images
 
 
@@ -392,35 +470,26 @@ def read_points3D_binary(path_to_model_file):
         void Reconstruction::ReadPoints3DBinary(const std::string& path)
         void Reconstruction::WritePoints3DBinary(const std::string& path)
     """
+    arrays = read_points3D_binary_arrays(path_to_model_file)
+    xyzs = arrays["xyz"]
+    rgbs = arrays["rgb"].astype(np.int64)
+    errors = arrays["error"]
+    all_image_ids = arrays["track"]["image_id"].astype(np.int64)
+    all_point2D_idxs = arrays["track"]["point2D_idx"].astype(np.int64)
+    offsets = arrays["track_offsets"].tolist()
+    # np.array(()) is float64: keep the type the per-element reader returned
+    no_track = np.empty(0, dtype=np.float64)
     points3D = {}
-    with open(path_to_model_file, "rb") as fid:
-        num_points = read_next_bytes(fid, 8, "Q")[0]
-        for _ in range(num_points):
-            binary_point_line_properties = read_next_bytes(
-                fid, num_bytes=43, format_char_sequence="QdddBBBd"
-            )
-            point3D_id = binary_point_line_properties[0]
-            xyz = np.array(binary_point_line_properties[1:4])
-            rgb = np.array(binary_point_line_properties[4:7])
-            error = np.array(binary_point_line_properties[7])
-            track_length = read_next_bytes(
-                fid, num_bytes=8, format_char_sequence="Q"
-            )[0]
-            track_elems = read_next_bytes(
-                fid,
-                num_bytes=8 * track_length,
-                format_char_sequence="ii" * track_length,
-            )
-            image_ids = np.array(tuple(map(int, track_elems[0::2])))
-            point2D_idxs = np.array(tuple(map(int, track_elems[1::2])))
-            points3D[point3D_id] = Point3D(
-                id=point3D_id,
-                xyz=xyz,
-                rgb=rgb,
-                error=error,
-                image_ids=image_ids,
-                point2D_idxs=point2D_idxs,
-            )
+    for i, point3D_id in enumerate(arrays["ids"].tolist()):
+        begin, end = offsets[i], offsets[i + 1]
+        points3D[point3D_id] = Point3D(
+            id=point3D_id,
+            xyz=xyzs[i],
+            rgb=rgbs[i],
+            error=np.array(errors[i]),
+            image_ids=all_image_ids[begin:end] if end > begin else no_track.copy(),
+            point2D_idxs=all_point2D_idxs[begin:end] if end > begin else no_track.copy(),
+        )
     return points3D
 
 
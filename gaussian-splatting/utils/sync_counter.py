@@ -0,0 +1,53 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import warnings
+import torch
+
+class SyncCounter:
+    """
+    Counts host-device synchronizations (.item(), boolean-mask indexing, device-to-host
+    copies, ...) through torch.cuda.set_sync_debug_mode("warn"), whose warnings are
+    counted instead of printed. Meant for debugging, the warning machinery is not free.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self._since_take = 0
+        self._catcher = None
+
+    def start(self):
+        self._catcher = warnings.catch_warnings()
+        self._catcher.__enter__()
+        # Every occurrence, not just the first one per call site
+        warnings.filterwarnings("always", message=".*synchronizing CUDA operation")
+        self._showwarning = warnings.showwarning
+        warnings.showwarning = self._on_warning
+        torch.cuda.set_sync_debug_mode("warn")
+
+    def stop(self):
+        if self._catcher is None:
+            return
+        torch.cuda.set_sync_debug_mode("default")
+        self._catcher.__exit__(None, None, None)
+        self._catcher = None
+
+    def take(self):
+        """Number of syncs since the previous call."""
+        count, self._since_take = self._since_take, 0
+        return count
+
+    def _on_warning(self, message, category, filename, lineno, file=None, line=None):
+        if "synchronizing CUDA operation" in str(message):
+            self.total += 1
+            self._since_take += 1
+        else:
+            self._showwarning(message, category, filename, lineno, file, line)